@@ -0,0 +1,54 @@
+## IMPORT STATEMENTS
+
+# Os, shutil and tempfile used for giving the tests their own data directory
+import os
+import shutil
+import tempfile
+# Unittest used for the shared test case
+import unittest
+
+
+## TEST DATA DIRECTORY
+## tsamashup reads TSA_MASHUP_DATA_DIR when it is first imported, so this runs before any test imports it. The tests
+## get a copy of apcp.xml, and the index, caches and wait time store they write never touch the program directory.
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="tsamashup-tests-")
+shutil.copy(os.path.join(PROJECT_DIR, "apcp.xml"), TEST_DATA_DIR)
+os.environ["TSA_MASHUP_DATA_DIR"] = TEST_DATA_DIR
+
+
+## UPSTREAM STATE
+
+def ResetUpstreamState():
+    """
+    Forgets every cached upstream response and origin alias and closes every circuit breaker, so each test starts
+    from a cold process.
+    """
+    from tsamashup import cache, upstream, geo
+    from tsamashup.breaker import CircuitBreaker
+    for ttlCache in [cache.tsa_cache, cache.distance_cache, cache.last_travel_times]:
+        with ttlCache.lock:
+            ttlCache.entries.clear()
+    with geo.origin_aliases.lock:
+        geo.origin_aliases.aliases.clear()
+        geo.origin_aliases.coordinates.clear()
+    for name in upstream.upstream_breakers:
+        upstream.upstream_breakers[name] = CircuitBreaker(name)
+
+class ReplayTestCase(unittest.TestCase):
+    """
+    Runs each test against a fresh synthetic replay server, see tsamashup.replay.StartReplay.
+    """
+    fixtures = None
+    synthetic = True
+
+    def setUp(self):
+        from tsamashup.replay import StartReplay
+        ResetUpstreamState()
+        self.replay = StartReplay(self.fixtures, self.synthetic)
+
+    def tearDown(self):
+        self.replay.clearOutages()
+        self.replay.shutdown()
+        self.replay.server_close()
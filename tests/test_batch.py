@@ -0,0 +1,63 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# StringIO used for batch input files
+import StringIO
+
+from tests import ReplayTestCase
+from tsamashup.batch import LoadBatchTrips, BatchLeaveTimes
+from tsamashup.metadata import AirportMetadata
+from tsamashup.replay import SyntheticDistanceMatrix
+
+
+## BATCH MODE
+
+BATCH_CSV = """id,origin,airport,precheck,international,checkedBags,rentalCar,pessimistic,departure,arrival
+1,Cambridge MA,BOS,y,n,1,n,n,,
+2,Somerville MA,BOS,n,n,0,n,y,,2016-11-28T07:30
+3,Quincy MA,XXX,n,n,0,n,n,,
+4,Boston MA,BOS,n,n,0,n,n,tomorrow morning,
+5,Newton MA,BOS,n,n,0,n,n,,7:30
+"""
+
+class BatchTest(ReplayTestCase):
+    def testStatuses(self):
+        trips = LoadBatchTrips(StringIO.StringIO(BATCH_CSV))
+        results = BatchLeaveTimes(trips, "KEY", AirportMetadata())
+        self.assertEqual([result["id"] for result in results], ["1", "2", "3", "4", "5"])
+        self.assertEqual([result["status"] for result in results], ["OK", "OK", "UNKNOWN_AIRPORT", "BAD_TIME", "BAD_TIME"])
+        for result in results[:2]:
+            self.assertEqual(result["originAddress"], result["origin"] + ", USA")
+            self.assertTrue(result["totalTime"] > result["travelTime"] > 0)
+            self.assertTrue(result["advice"])
+        self.assertEqual(results[3]["totalTime"], None)
+
+    def testBadTimeMakesNoRequests(self):
+        trips = LoadBatchTrips(StringIO.StringIO(BATCH_CSV.splitlines()[0] + "\n" + BATCH_CSV.splitlines()[4] + "\n"))
+        results = BatchLeaveTimes(trips, "KEY", AirportMetadata())
+        self.assertEqual(results[0]["status"], "BAD_TIME")
+        self.assertEqual(sum(self.replay.counts.values()), 0)
+
+    def testBadOrigins(self):
+        trips = LoadBatchTrips(StringIO.StringIO("id,origin,airport\n1,,BOS\n2,Quincy MA|Braintree MA,BOS\n3,Quincy MA,BOS\n"))
+        self.assertEqual([trip.get("status") for trip in trips], ["BAD_ORIGIN", "BAD_ORIGIN", None])
+        results = BatchLeaveTimes(trips, "KEY", AirportMetadata())
+        self.assertEqual([result["status"] for result in results], ["BAD_ORIGIN", "BAD_ORIGIN", "OK"])
+        # the good origin gets its own travel time, not one shifted by the bad origin's extra place
+        self.assertEqual(results[2]["travelTime"], SyntheticDistanceMatrix(["Quincy MA"], ["BOS"])["rows"][0]["elements"][0]["duration"]["value"])
+        self.assertEqual(self.replay.counts["synthetic"], 2)
+
+        # trips built in Python without LoadBatchTrips are checked too
+        results = BatchLeaveTimes([dict(trips[2], origin="Quincy MA|Braintree MA")], "KEY", AirportMetadata())
+        self.assertEqual(results[0]["status"], "BAD_ORIGIN")
+
+    def testJSONL(self):
+        trips = LoadBatchTrips(StringIO.StringIO('{"id": 7, "origin": "Cambridge MA", "airport": "bos"}\n'), "jsonl")
+        self.assertEqual(trips[0].get("status"), None)
+        results = BatchLeaveTimes(trips, "KEY", AirportMetadata())
+        self.assertEqual(results[0]["status"], "OK")
+        self.assertEqual(results[0]["airport"], "BOS")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Threading and time used for concurrent callers and aging entries
+import threading
+import time
+
+from tsamashup.cache import TTLCache, SingleFlight
+
+
+## RESPONSE CACHES
+
+def WaitFor(condition, timeout=5):
+    """
+    :param condition: Function with no arguments, polled until it returns True
+    :return: Returns True if it did before the timeout
+    """
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+class TTLCacheTest(unittest.TestCase):
+    def age(self, cache, key, seconds):
+        """
+        Makes a cached entry seconds older.
+        """
+        value, storedAt = cache.entries[key]
+        cache.entries[key] = (value, storedAt - seconds)
+
+    def testHitsAndExpiry(self):
+        cache = TTLCache("test", 60)
+        loads = []
+        loader = lambda: loads.append(1) or len(loads)
+        self.assertEqual(cache.get("a", loader), 1)
+        self.assertEqual(cache.get("a", loader), 1)
+        self.assertEqual(cache.lookup("a"), 1)
+        self.age(cache, "a", 61)
+        self.assertEqual(cache.lookup("a"), None)
+        self.assertEqual(cache.get("a", loader), 2)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["staleHits"]), (2, 3, 0))
+
+    def testUncacheableNotKept(self):
+        cache = TTLCache("test", 60)
+        self.assertEqual(cache.get("a", lambda: "error", lambda value: value != "error"), "error")
+        self.assertEqual(cache.lookup("a"), None)
+
+    def testLeastRecentlyUsedEvicted(self):
+        cache = TTLCache("test", 60, maxEntries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.lookup("a")
+        cache.put("c", 3)
+        self.assertEqual(list(cache.entries), ["a", "c"])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def testStaleWhileRevalidate(self):
+        cache = TTLCache("test", 60, staleTTL=60)
+        cache.put("a", "old")
+        self.age(cache, "a", 90)
+        release = threading.Event()
+
+        def loader():
+            release.wait(5)
+            return "new"
+
+        # the stale value is returned at once, and a second stale hit doesn't start another refresh
+        self.assertEqual(cache.get("a", loader), "old")
+        self.assertEqual(cache.get("a", loader), "old")
+        self.assertEqual(cache.refreshing, set(["a"]))
+        release.set()
+        self.assertTrue(WaitFor(lambda: not cache.refreshing))
+        self.assertEqual(cache.lookup("a"), "new")
+        stats = cache.stats()
+        self.assertEqual((stats["staleHits"], stats["refreshes"], stats["refreshErrors"]), (2, 1, 0))
+
+    def testFailedRefreshKeepsStaleValue(self):
+        cache = TTLCache("test", 60, staleTTL=60)
+        cache.put("a", "old")
+        self.age(cache, "a", 90)
+
+        def loader():
+            raise IOError("down")
+
+        self.assertEqual(cache.get("a", loader), "old")
+        self.assertTrue(WaitFor(lambda: not cache.refreshing))
+        self.assertEqual(cache.stats()["refreshErrors"], 1)
+        self.assertEqual(cache.lastKnown("a", 120)[0], "old")
+        # past the stale window the loader is called on the request path
+        self.age(cache, "a", 60)
+        self.assertRaises(IOError, cache.get, "a", loader)
+
+    def testLastKnown(self):
+        cache = TTLCache("test", 60)
+        cache.put("a", 1)
+        self.age(cache, "a", 3600)
+        self.assertEqual(cache.lastKnown("a", 7200)[0], 1)
+        self.assertEqual(cache.lastKnown("a", 1800), None)
+        self.assertEqual(cache.lastKnown("b", 7200), None)
+
+class SingleFlightTest(unittest.TestCase):
+    def collapse(self, flight, func, callers=4):
+        """
+        Makes callers concurrent calls for one key, the first one holding the rest until they're all waiting on it.
+        :return: Returns each caller's (result, error) and the number of times func was called
+        """
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def leader():
+            calls.append(1)
+            release.wait(5)
+            return func()
+
+        def call():
+            try:
+                results.append((flight.do("key", leader), None))
+            except Exception, e:
+                results.append((None, e))
+
+        threads = [threading.Thread(target=call) for caller in range(callers)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(WaitFor(lambda: flight.stats()["collapsed"] == callers - 1))
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return results, len(calls)
+
+    def testConcurrentCallsShareResult(self):
+        flight = SingleFlight("test")
+        results, calls = self.collapse(flight, lambda: "value")
+        self.assertEqual(calls, 1)
+        self.assertEqual(results, [("value", None)] * 4)
+        self.assertEqual(flight.stats(), {"name": "test", "calls": 1, "collapsed": 3, "inflight": 0})
+
+    def testConcurrentCallsShareError(self):
+        flight = SingleFlight("test")
+        error = IOError("down")
+
+        def fail():
+            raise error
+
+        results, calls = self.collapse(flight, fail)
+        self.assertEqual(calls, 1)
+        self.assertEqual(results, [(None, error)] * 4)
+        # nothing is kept, so the next call is made again
+        self.assertEqual(flight.do("key", lambda: "again"), "again")
+
+if __name__ == "__main__":
+    unittest.main()
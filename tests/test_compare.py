@@ -0,0 +1,82 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+
+from tests import ReplayTestCase
+from tsamashup.compare import CompareAirports, AirportGrid, GreatCircleMiles
+from tsamashup.geo import origin_aliases
+from tsamashup.metadata import AirportMetadata
+from tsamashup.replay import SyntheticGeocode
+
+
+## COMPARISON MODE
+
+# Downtown Boston
+ORIGIN = "42.3601,-71.0589"
+
+class CompareTest(ReplayTestCase):
+    def testRanksNearbyAirports(self):
+        TSAairportDict = AirportMetadata()
+        results = CompareAirports(ORIGIN, "KEY", TSAairportDict, radius=60)
+        codes = [result["airport"] for result in results]
+        self.assertTrue("BOS" in codes)
+        self.assertEqual(sorted(codes), sorted(set(codes)))
+        self.assertEqual([result["status"] for result in results], ["OK"] * len(results))
+        totals = [result["totalTime"] for result in results]
+        self.assertEqual(totals, sorted(totals))
+        for code in codes:
+            airport = TSAairportDict[code]
+            self.assertTrue(GreatCircleMiles(42.3601, -71.0589, airport.latitude, airport.longitude) <= 60)
+        # one Distance Matrix request for every candidate, and one TSA request per candidate
+        self.assertEqual(self.replay.counts["synthetic"], len(codes) + 1)
+
+    def testNearAirport(self):
+        results = CompareAirports("Cambridge MA", "KEY", AirportMetadata(), near="bos", radius=30)
+        self.assertTrue("BOS" in [result["airport"] for result in results])
+        self.assertEqual(results[0]["origin"], "Cambridge MA")
+
+    def testNothingNearby(self):
+        # the middle of the Atlantic
+        self.assertEqual(CompareAirports("30.0,-40.0", "KEY", AirportMetadata(), radius=50), [])
+        self.assertEqual(self.replay.counts["synthetic"], 0)
+
+    def testAddressOrigin(self):
+        TSAairportDict = AirportMetadata()
+        location = SyntheticGeocode("Cambridge MA", TSAairportDict)["results"][0]["geometry"]["location"]
+        results = CompareAirports("Cambridge MA", "KEY", TSAairportDict, radius=150)
+        self.assertTrue(results)
+        for result in results:
+            airport = TSAairportDict[result["airport"]]
+            self.assertTrue(GreatCircleMiles(location["lat"], location["lng"], airport.latitude, airport.longitude) <= 150)
+        self.assertEqual(origin_aliases.locateCoordinates("cambridge, ma"), (location["lat"], location["lng"]))
+
+        # another spelling of the same place isn't geocoded again, and its travel times are cached too
+        synthetic = self.replay.counts["synthetic"]
+        self.assertEqual(len(CompareAirports("Cambridge, MA", "KEY", TSAairportDict, radius=150)), len(results))
+        self.assertEqual(self.replay.counts["synthetic"], synthetic)
+
+    def testBadCenter(self):
+        self.assertRaises(ValueError, CompareAirports, "Cambridge MA", "KEY", AirportMetadata(), near="XXX")
+
+    def testGridMatchesFullScan(self):
+        TSAairportDict = AirportMetadata()
+        grid = AirportGrid(TSAairportDict)
+        nearby = set(shortcode for miles, shortcode in grid.nearby(42.3601, -71.0589, 100))
+        scanned = set(airport.shortcode for airport in TSAairportDict.values()
+                      if GreatCircleMiles(42.3601, -71.0589, airport.latitude, airport.longitude) <= 100)
+        self.assertEqual(nearby, scanned)
+
+    def testGridWrapsAntimeridian(self):
+        TSAairportDict = AirportMetadata()
+        grid = AirportGrid(TSAairportDict)
+        # west of the antimeridian, about 150 miles from Adak across it
+        for lat, lon in [(51.9, 179.9), (13.5, -179.5), (89.5, 0.0)]:
+            nearby = set(shortcode for miles, shortcode in grid.nearby(lat, lon, 2000))
+            scanned = set(airport.shortcode for airport in TSAairportDict.values()
+                          if GreatCircleMiles(lat, lon, airport.latitude, airport.longitude) <= 2000)
+            self.assertEqual(nearby, scanned)
+        self.assertEqual([shortcode for miles, shortcode in grid.nearby(51.9, 179.9, 200)], ["ADK"])
+
+if __name__ == "__main__":
+    unittest.main()
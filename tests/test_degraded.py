@@ -0,0 +1,133 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# StringIO and time used for batch input and timing fallbacks
+import StringIO
+import time
+
+from tests import ReplayTestCase
+from tsamashup import cache, upstream
+from tsamashup.batch import LoadBatchTrips, BatchLeaveTimes
+from tsamashup.breaker import CircuitBreaker
+from tsamashup.metadata import AirportMetadata
+from tsamashup.upstream import GetTSAWaitTimes, UpstreamUnavailable, UpstreamAttemptTime
+
+
+## UPSTREAM OUTAGES
+
+BATCH_CSV = """id,origin,airport
+1,Cambridge MA,BOS
+2,Brooklyn NY,JFK
+3,Seattle WA,SEA
+4,Atlanta GA,ATL
+5,Denver CO,DEN
+"""
+
+# Short deadlines, so hanging upstreams cost the tests little time
+TEST_DEADLINE = 1.0
+
+def RunBatch(csv=BATCH_CSV):
+    return BatchLeaveTimes(LoadBatchTrips(StringIO.StringIO(csv)), "KEY", AirportMetadata())
+
+def ExpireCaches(age=3600):
+    """
+    Makes every cached TSA and Google response too old to be served, as if it was stored age seconds ago.
+    """
+    for ttlCache in [cache.tsa_cache, cache.distance_cache, cache.last_travel_times]:
+        with ttlCache.lock:
+            for key, (value, storedAt) in ttlCache.entries.items():
+                ttlCache.entries[key] = (value, storedAt - age)
+
+class DegradedTest(ReplayTestCase):
+    def setUp(self):
+        ReplayTestCase.setUp(self)
+        self.deadlines = upstream.UPSTREAM_DEADLINE
+        upstream.UPSTREAM_DEADLINE = dict(self.deadlines, tsa=TEST_DEADLINE, google=TEST_DEADLINE)
+        # hanging requests time out, and count against the breaker, before the estimates stop waiting for them
+        self.timeouts = upstream.UPSTREAM_TIMEOUT
+        upstream.UPSTREAM_TIMEOUT = dict(self.timeouts, tsa=(0.5, TEST_DEADLINE / 2), google=(0.5, TEST_DEADLINE / 2))
+
+    def tearDown(self):
+        upstream.UPSTREAM_DEADLINE = self.deadlines
+        upstream.UPSTREAM_TIMEOUT = self.timeouts
+        ReplayTestCase.tearDown(self)
+
+    def testAttemptsFitDeadline(self):
+        for name in self.deadlines:
+            self.assertTrue(UpstreamAttemptTime(name) <= self.deadlines[name], name)
+
+    def testLastKnownWaitTimes(self):
+        fresh = RunBatch()
+        self.assertEqual([result["status"] for result in fresh], ["OK"] * 5)
+        ExpireCaches()
+        self.replay.setOutage("tsa", 503)
+        results = RunBatch()
+        self.assertEqual([result["status"] for result in results], ["OK"] * 5)
+        for freshResult, result in zip(fresh, results):
+            self.assertEqual(result["stale"], "waitTime")
+            self.assertTrue(3600 <= result["waitAge"] < 3700)
+            self.assertEqual(result["waitTime"], freshResult["waitTime"])
+            self.assertEqual(result["travelAge"], None)
+
+    def testLastKnownTravelTimes(self):
+        fresh = RunBatch()
+        self.assertEqual([result["status"] for result in fresh], ["OK"] * 5)
+        ExpireCaches()
+        self.replay.setOutage("google", 500)
+        results = RunBatch()
+        self.assertEqual([result["status"] for result in results], ["OK"] * 5)
+        for freshResult, result in zip(fresh, results):
+            self.assertEqual(result["stale"], "travelTime")
+            self.assertTrue(3600 <= result["travelAge"] < 3700)
+            self.assertEqual(result["travelTime"], freshResult["travelTime"])
+
+    def testNothingKnown(self):
+        self.replay.setOutage("tsa", 503)
+        self.replay.setOutage("google", 503)
+        self.assertEqual([result["status"] for result in RunBatch()], ["TSA_UNAVAILABLE"] * 5)
+
+    def testHangingUpstreamTripsBreaker(self):
+        self.replay.setOutage("tsa", None, 30)
+        started = time.time()
+        results = RunBatch()
+        # the batch waits one deadline for every airport together, not one per airport
+        self.assertTrue(time.time() - started < TEST_DEADLINE + 1)
+        self.assertEqual([result["status"] for result in results], ["TSA_UNAVAILABLE"] * 5)
+        breaker = upstream.upstream_breakers["tsa"]
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(upstream.upstream_breakers["google"].state, CircuitBreaker.CLOSED)
+
+        # with the breaker open, TSA isn't called at all
+        self.replay.clearOutages()
+        started = time.time()
+        self.assertRaises(UpstreamUnavailable, GetTSAWaitTimes, "ORD")
+        self.assertTrue(time.time() - started < TEST_DEADLINE)
+        self.assertEqual(breaker.stats()["rejected"], 1)
+
+    def testWaitersCountOnce(self):
+        # every estimate for one airport waits on the same request, which counts against the breaker once
+        self.replay.setOutage("tsa", None, 30)
+        results = RunBatch("id,origin,airport\n" + "".join("{},Cambridge MA,BOS\n".format(num) for num in range(8)))
+        self.assertEqual([result["status"] for result in results], ["TSA_UNAVAILABLE"] * 8)
+        breaker = upstream.upstream_breakers["tsa"]
+        self.assertEqual(breaker.stats()["failures"], 1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def testBulkhead(self):
+        # fill every Google thread with a hanging request
+        self.replay.setOutage("google", None, 30)
+        for num in range(upstream.UPSTREAM_POOL_SIZE["google"]):
+            upstream.FetchAsync("google", upstream.FetchDistanceMatrix, ["Origin {}".format(num)], ["BOS"], "KEY")
+        started = time.time()
+        self.assertEqual(len(GetTSAWaitTimes("BOS").records), 25)
+        self.assertTrue(time.time() - started < TEST_DEADLINE)
+
+    def testDeadlineScalesWithPoolSize(self):
+        size = upstream.UPSTREAM_POOL_SIZE["google"]
+        now = time.time()
+        self.assertAlmostEqual(upstream.UpstreamDeadline("google", size) - now, TEST_DEADLINE, 1)
+        self.assertAlmostEqual(upstream.UpstreamDeadline("google", size + 1) - now, 2 * TEST_DEADLINE, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Datetime used for report and arrival times
+import datetime
+# Os, shutil and tempfile used for a scratch model file
+import os
+import shutil
+import tempfile
+
+from tsamashup import forecast
+from tsamashup.forecast import WaitTimeModel, ForecastModel
+from tsamashup.payloads import ParseTSAWaitTimes
+
+
+## WAIT TIME FORECAST
+
+# Monday morning, on the airport's local clock
+MONDAY = datetime.datetime(2016, 11, 28, 7, 0)
+
+def Feed(reports):
+    """
+    :param reports: List of (checkpoint, wait time increment, report datetime) tuples
+    :return: Returns the feed of a TSA Wait Times API response with those reports
+    """
+    return ParseTSAWaitTimes({"WaitTimes": [{"CheckpointIndex": str(chk), "WaitTime": str(wait),
+                           "Created_Datetime": created.strftime("%m/%d/%Y %I:%M:%S %p")} for chk, wait, created in reports]})
+
+def MondayFeed(slowWait=3):
+    """
+    :return: Returns a response with ten reports from each of two checkpoints between 7 and 8 AM on Monday, the
+    first checkpoint waiting slowWait increments and the second one increment
+    """
+    return Feed([(chk, slowWait if chk == 1 else 1, MONDAY + datetime.timedelta(minutes=num * 5))
+                 for chk in (1, 2) for num in range(10)])
+
+class WaitTimeModelTest(unittest.TestCase):
+    def testPredictsByCheckpointAndSlowest(self):
+        model = WaitTimeModel()
+        self.assertEqual(model.add("BOS", MondayFeed()), 20)
+        arrival = MONDAY + datetime.timedelta(minutes=30)
+        self.assertEqual(model.predict("BOS", 1, arrival), 1800)
+        self.assertEqual(model.predict("BOS", 2, arrival), 600)
+        self.assertEqual(model.predict("BOS", None, arrival), 1800)
+        self.assertEqual(model.predict("BOS", 3, arrival), None)
+        self.assertEqual(model.predict("JFK", None, arrival), None)
+        self.assertEqual(model.checkpoints("BOS"), [1, 2])
+
+    def testReportsCountedOnce(self):
+        model = WaitTimeModel()
+        model.add("BOS", MondayFeed())
+        model.predict("BOS", None, MONDAY)
+        tables = model.tables
+        self.assertEqual(model.add("BOS", MondayFeed()), 0)
+        # nothing new, so the tables aren't rebuilt
+        self.assertTrue(model.tables is tables)
+
+    def testQuietHoursBorrowReports(self):
+        model = WaitTimeModel()
+        model.add("BOS", MondayFeed())
+        # an hour away from the reports borrows them, and a quiet day falls back on the whole week
+        self.assertEqual(model.predict("BOS", 1, MONDAY + datetime.timedelta(hours=1)), 1800)
+        self.assertEqual(model.predict("BOS", 1, MONDAY + datetime.timedelta(days=3)), 1800)
+
+class ForecastModelTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.wait_model_fname = forecast.wait_model_fname
+        forecast.wait_model_fname = os.path.join(self.dirname, "waitmodel.npz")
+        del forecast.loaded_model[:]
+
+    def tearDown(self):
+        forecast.wait_model_fname = self.wait_model_fname
+        del forecast.loaded_model[:]
+        shutil.rmtree(self.dirname)
+
+    def train(self, slowWait):
+        model = WaitTimeModel()
+        model.add("BOS", MondayFeed(slowWait))
+        model.save(forecast.wait_model_fname)
+
+    def testNoModel(self):
+        self.assertEqual(ForecastModel(), None)
+
+    def testReloadsRetrainedModel(self):
+        self.train(3)
+        model = ForecastModel()
+        self.assertEqual(model.predict("BOS", None, MONDAY), 1800)
+        self.assertTrue(ForecastModel() is model)
+
+        self.train(5)
+        self.assertEqual(ForecastModel().predict("BOS", None, MONDAY), 3000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+
+from tests import ResetUpstreamState
+from tsamashup.geo import NormalizeOrigin, OriginAliases, OriginCell, ParseCoordinates, Geohash, origin_aliases
+
+
+## COORDINATES
+
+class CoordinatesTest(unittest.TestCase):
+    def testParseCoordinates(self):
+        self.assertEqual(ParseCoordinates("38.8977,-77.0365"), (38.8977, -77.0365))
+        self.assertEqual(ParseCoordinates(" 38.8977 , -77.0365 "), (38.8977, -77.0365))
+        self.assertEqual(ParseCoordinates("Washington, DC"), None)
+        self.assertEqual(ParseCoordinates("91,0"), None)
+        self.assertEqual(ParseCoordinates("1,2,3"), None)
+
+    def testGeohash(self):
+        self.assertEqual(Geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(Geohash(57.64911, 10.40744), "u4pruy")
+
+
+## ORIGIN NORMALIZATION
+
+class NormalizeOriginTest(unittest.TestCase):
+    def testSpellingsAgree(self):
+        for origin in ["Washington,DC", "washington, dc", "Washington DC", "Washington, D.C.", "Washington, DC, USA",
+                       "Washington DC United States"]:
+            self.assertEqual(NormalizeOrigin(origin), "washington dc")
+
+    def testStreetWordsAbbreviated(self):
+        self.assertEqual(NormalizeOrigin("1600 Pennsylvania Avenue Northwest, Washington, DC 20500, USA"),
+                         "1600 pennsylvania ave nw washington dc 20500")
+        self.assertEqual(NormalizeOrigin("O'Hare Drive, Suite #4"), "ohare dr ste #4")
+
+class OriginAliasesTest(unittest.TestCase):
+    def testLearnedSpellingsShareLocation(self):
+        aliases = OriginAliases()
+        self.assertEqual(aliases.locate("Washington,DC"), "washington dc")
+        aliases.learn("Washington,DC", "Washington, DC, USA")
+        aliases.learn("DC", "Washington, DC, USA", (38.9072, -77.0369))
+        self.assertEqual(aliases.locate("washington, dc"), "washington dc")
+        self.assertEqual(aliases.locate("DC"), "washington dc")
+        self.assertEqual(aliases.locateCoordinates("Washington DC"), (38.9072, -77.0369))
+        self.assertEqual(aliases.locateCoordinates("Boston"), None)
+        stats = aliases.stats()
+        self.assertEqual((stats["size"], stats["misses"], stats["evictions"]), (2, 2, 0))
+        self.assertTrue(stats["hits"] >= 3)
+
+    def testUnresolvedAddressIgnored(self):
+        aliases = OriginAliases()
+        aliases.learn("Nowhere", "")
+        self.assertEqual(aliases.stats()["size"], 0)
+
+    def testLeastRecentlyUsedEvicted(self):
+        aliases = OriginAliases(maxEntries=2)
+        aliases.learn("a", "A")
+        aliases.learn("b", "B")
+        aliases.locate("a")
+        aliases.learn("c", "C")
+        self.assertEqual(list(aliases.aliases), ["a", "c"])
+        self.assertEqual(aliases.stats()["evictions"], 1)
+
+class OriginCellTest(unittest.TestCase):
+    def setUp(self):
+        ResetUpstreamState()
+
+    def tearDown(self):
+        ResetUpstreamState()
+
+    def testNearbyCoordinatesShareCell(self):
+        self.assertEqual(OriginCell("38.8977,-77.0365"), "geohash:" + Geohash(38.8977, -77.0365))
+        self.assertEqual(OriginCell("38.8977,-77.0365"), OriginCell("38.8978,-77.0366"))
+        self.assertNotEqual(OriginCell("38.8977,-77.0365"), OriginCell("42.3601,-71.0589"))
+
+    def testAddressCellIsLocation(self):
+        self.assertEqual(OriginCell("Cambridge, MA"), "cambridge ma")
+        origin_aliases.learn("Cambridge, MA", "Cambridge, MA 02139, USA")
+        self.assertEqual(OriginCell("cambridge ma"), "cambridge ma 02139")
+
+if __name__ == "__main__":
+    unittest.main()
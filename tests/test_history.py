@@ -0,0 +1,128 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Datetime used for report times
+import datetime
+# Os, shutil and tempfile used for a scratch wait time store
+import os
+import shutil
+import tempfile
+# Time used for poll times
+import time
+
+from tests import ReplayTestCase
+from tsamashup.cache import tsa_cache
+from tsamashup.history import WaitTimeStore, WaitTimePoller, StoredTSAWaitTimes, ParseAirportList
+from tsamashup.payloads import ParseTSAWaitTimes
+
+
+## WAIT TIME STORE
+
+MONDAY = datetime.datetime(2016, 11, 28, 7, 0)
+
+def Feed(reports):
+    """
+    :param reports: List of (checkpoint, wait time increment, report datetime) tuples
+    :return: Returns the feed of a TSA Wait Times API response with those reports
+    """
+    return ParseTSAWaitTimes({"WaitTimes": [{"CheckpointIndex": str(chk), "WaitTime": str(wait),
+                           "Created_Datetime": created.strftime("%m/%d/%Y %I:%M:%S %p")} for chk, wait, created in reports]})
+
+class WaitTimeStoreTest(ReplayTestCase):
+    def setUp(self):
+        ReplayTestCase.setUp(self)
+        self.dir = tempfile.mkdtemp(prefix="tsamashup-history-")
+        self.store = WaitTimeStore(os.path.join(self.dir, "waittimes.db"), retention=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        ReplayTestCase.tearDown(self)
+
+    def testAppendSkipsStoredReports(self):
+        feed = Feed([(1, 2, MONDAY), (2, 1, MONDAY), (1, 3, MONDAY + datetime.timedelta(minutes=10))])
+        self.assertEqual(self.store.append("BOS", feed), 3)
+        self.assertEqual(self.store.append("BOS", feed), 0)
+        later = Feed([(1, 4, MONDAY + datetime.timedelta(minutes=20))])
+        self.assertEqual(self.store.append("BOS", later), 1)
+        self.assertEqual(self.store.stats(), {"airports": 1, "reports": 4})
+
+    def testDumpRoundTrip(self):
+        self.store.append("BOS", Feed([(1, 2, MONDAY), (2, 1, MONDAY + datetime.timedelta(minutes=10))]))
+        records = self.store.dump("BOS").records
+        self.assertEqual([(record.checkpoint, record.waitTime, record.created) for record in records],
+                         [(2, 1, MONDAY + datetime.timedelta(minutes=10)), (1, 2, MONDAY)])
+        self.assertEqual(len(self.store.dump("JFK").records), 0)
+
+    def testRetentionDropsOldReports(self):
+        self.store.append("BOS", Feed([(1, 2, MONDAY)]))
+        self.store.append("BOS", Feed([(1, 3, MONDAY + datetime.timedelta(hours=2))]))
+        self.assertEqual(self.store.stats()["reports"], 1)
+
+    def testLastPollWithoutDatabase(self):
+        self.assertEqual(self.store.lastPoll("BOS"), None)
+        self.assertFalse(os.path.exists(self.store.db_fname))
+
+    def testFreshStoreAnswersWithoutTSA(self):
+        self.store.append("BOS", Feed([(1, 2, MONDAY)]))
+        requests = self.replay.counts["synthetic"]
+        self.assertEqual(len(StoredTSAWaitTimes("BOS", self.store).records), 1)
+        self.assertEqual(self.replay.counts["synthetic"], requests)
+
+    def testStaleStoreRequestsTSA(self):
+        self.store.append("BOS", Feed([(1, 2, MONDAY)]), polledAt=time.time() - 3600)
+        requests = self.replay.counts["synthetic"]
+        StoredTSAWaitTimes("BOS", self.store, maxAge=900)
+        self.assertEqual(self.replay.counts["synthetic"], requests + 1)
+        # an airport that was never polled is requested too
+        StoredTSAWaitTimes("JFK", self.store)
+        self.assertEqual(self.replay.counts["synthetic"], requests + 2)
+
+
+## WAIT TIME POLLER
+
+class WaitTimePollerTest(ReplayTestCase):
+    def setUp(self):
+        ReplayTestCase.setUp(self)
+        self.dir = tempfile.mkdtemp(prefix="tsamashup-history-")
+        self.store = WaitTimeStore(os.path.join(self.dir, "waittimes.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        ReplayTestCase.tearDown(self)
+
+    def testPollStoresAndCaches(self):
+        poller = WaitTimePoller(self.store, ["BOS"])
+        poller.poll("BOS")
+        stats = poller.stats()
+        self.assertEqual(stats["polls"], 1)
+        self.assertTrue(stats["newReports"] > 0)
+        self.assertEqual(self.store.stats()["reports"], stats["newReports"])
+        self.assertTrue(tsa_cache.lookup("BOS") is not None)
+        # the same response again adds nothing
+        poller.poll("BOS")
+        self.assertEqual(poller.stats()["newReports"], stats["newReports"])
+
+    def testPollErrorsCounted(self):
+        self.replay.setOutage("tsa", 503)
+        poller = WaitTimePoller(self.store, ["BOS"])
+        poller.poll("BOS")
+        self.assertEqual(poller.stats()["pollErrors"], 1)
+        self.assertEqual(self.store.lastPoll("BOS"), None)
+
+    def testBudgetDefersPolls(self):
+        poller = WaitTimePoller(self.store, ["BOS", "JFK", "DCA"], budget=2)
+        for airportCode in poller.due:
+            poller.due[airportCode] = 0
+        poller.pollDue()
+        stats = poller.stats()
+        self.assertEqual(stats["polls"] + stats["pollErrors"], 2)
+        self.assertEqual(stats["deferred"], 1)
+        self.assertEqual(stats["budgetUsed"], 2)
+
+    def testParseAirportList(self):
+        self.assertEqual(ParseAirportList(" dca, IAD,,bwi "), ["DCA", "IAD", "BWI"])
+        self.assertEqual(ParseAirportList(None), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Os, shutil and tempfile used for a scratch copy of apcp.xml
+import os
+import shutil
+import tempfile
+
+from tsamashup import cli, metadata
+from tsamashup.metadata import OpenAirportIndex, TSAAirport, GetTSAMetadata, MetadataError
+
+
+## AIRPORT INDEX
+
+class AirportIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.xml_fname = os.path.join(self.dirname, "apcp.xml")
+        self.index_fname = os.path.join(self.dirname, "apcp.idx")
+        shutil.copy(metadata.airport_fname, self.xml_fname)
+        self.hashed = []
+        self.checksum = metadata.AirportMetadataChecksum
+        metadata.AirportMetadataChecksum = lambda fname: self.hashed.append(fname) or self.checksum(fname)
+
+    def tearDown(self):
+        metadata.AirportMetadataChecksum = self.checksum
+        shutil.rmtree(self.dirname)
+
+    def testUnchangedXMLIsNotHashed(self):
+        OpenAirportIndex(self.xml_fname, self.index_fname).close()
+        index = OpenAirportIndex(self.xml_fname, self.index_fname)
+        self.assertEqual(self.hashed, [])
+        self.assertEqual(index.size, os.path.getsize(self.xml_fname))
+        index.close()
+
+    def testTouchedXMLIsHashedOnce(self):
+        OpenAirportIndex(self.xml_fname, self.index_fname).close()
+        os.utime(self.xml_fname, (1000000000, 1000000000))
+        OpenAirportIndex(self.xml_fname, self.index_fname).close()
+        index = OpenAirportIndex(self.xml_fname, self.index_fname)
+        self.assertEqual(self.hashed, [self.xml_fname])
+        self.assertEqual(index.mtime, 1000000000)
+        index.close()
+
+    def testChangedXMLRebuildsIndex(self):
+        index = OpenAirportIndex(self.xml_fname, self.index_fname)
+        count = len(index)
+        index.close()
+        with open(self.xml_fname, "rb") as fobj:
+            data = fobj.read()
+        start = data.index("<airport>")
+        end = data.index("</airport>") + len("</airport>")
+        with open(self.xml_fname, "wb") as fobj:
+            fobj.write(data[:start] + data[end:])
+        index = OpenAirportIndex(self.xml_fname, self.index_fname)
+        self.assertEqual(len(index), count - 1)
+        self.assertEqual(len(self.hashed), 1)
+        index.close()
+
+    def testValuesMatchLookups(self):
+        index = OpenAirportIndex(self.xml_fname, self.index_fname)
+        airports = index.values()
+        self.assertEqual([airport.shortcode for airport in airports], sorted(index.keys()))
+        self.assertTrue(all(index[airport.shortcode] is airport for airport in airports))
+        index.close()
+
+    def testIndexMatchesParse(self):
+        parsed = dict((airport.shortcode, airport) for airport in (TSAAirport(element) for element in GetTSAMetadata().getroot()))
+        index = OpenAirportIndex(self.xml_fname, self.index_fname)
+        self.assertEqual(sorted(index.keys()), sorted(parsed))
+        for airport in index.values():
+            for name in TSAAirport.__slots__:
+                self.assertEqual(getattr(airport, name), getattr(parsed[airport.shortcode], name))
+        self.assertFalse("XXX" in index)
+        self.assertRaises(KeyError, index.__getitem__, "XXX")
+        index.close()
+
+class MissingMetadataTest(unittest.TestCase):
+    def setUp(self):
+        self.airport_fname = metadata.airport_fname
+        metadata.airport_fname = os.path.join(tempfile.gettempdir(), "missing", "apcp.xml")
+
+    def tearDown(self):
+        metadata.airport_fname = self.airport_fname
+
+    def testMissingXMLRaises(self):
+        self.assertRaises(MetadataError, GetTSAMetadata)
+
+    def testProgramExits(self):
+        main1 = cli.Main1
+        cli.Main1 = GetTSAMetadata
+        try:
+            self.assertRaises(SystemExit, cli.main, [])
+        finally:
+            cli.Main1 = main1
+
+if __name__ == "__main__":
+    unittest.main()
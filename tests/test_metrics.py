@@ -0,0 +1,74 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+
+from tsamashup.metrics import Instrumentation, Instrumented, Histogram, FormatSnapshot, instrumentation, LATENCY_BUCKETS
+
+
+## INSTRUMENTATION
+
+@Instrumented
+def Double(value):
+    if value is None:
+        raise ValueError("no value")
+    return value * 2
+
+class InstrumentedTest(unittest.TestCase):
+    def setUp(self):
+        self.enabled = instrumentation.enabled
+        self.calls = []
+        instrumentation.disable()
+        instrumentation.reset()
+        instrumentation.addHook(self.hook)
+
+    def tearDown(self):
+        instrumentation.removeHook(self.hook)
+        instrumentation.reset()
+        instrumentation.enabled = self.enabled
+
+    def hook(self, kind, name, value):
+        self.calls.append((kind, name))
+
+    def testDisabledRecordsNothing(self):
+        self.assertEqual(Double(2), 4)
+        self.assertRaises(ValueError, Double, None)
+        snapshot = instrumentation.snapshot()
+        self.assertEqual(snapshot["stages"], {})
+        self.assertEqual(snapshot["counters"], {})
+        self.assertEqual(self.calls, [])
+
+    def testEnabledRecordsTimesAndErrors(self):
+        instrumentation.enable()
+        self.assertEqual(Double.__name__, "Double")
+        self.assertEqual(Double(2), 4)
+        self.assertRaises(ValueError, Double, None)
+        snapshot = instrumentation.snapshot()
+        self.assertEqual(snapshot["stages"]["Double"]["count"], 2)
+        self.assertEqual(snapshot["counters"], {"errors.stage.Double.ValueError": 1})
+        self.assertEqual(self.calls, [("stage", "Double"), ("count", "errors.stage.Double.ValueError"), ("stage", "Double")])
+
+class InstrumentationTest(unittest.TestCase):
+    def testSnapshot(self):
+        metrics = Instrumentation(enabled=True)
+        metrics.observe("upstream", "tsa", 0.02)
+        metrics.observe("payload", "tsa", 2000)
+        metrics.count("cache.tsa.hits", 3)
+        metrics.count("cache.tsa.misses")
+        metrics.addSource("caches", lambda: [{"name": "google", "hits": 1, "misses": 1}])
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["upstreams"]["tsa"]["count"], 1)
+        self.assertEqual(snapshot["payloads"]["tsa"]["buckets"], [[4096, 1]])
+        self.assertEqual(snapshot["hitRatios"], {"cache.tsa": 0.75, "caches.google": 0.5})
+        self.assertTrue("count     cache.tsa.hits" in FormatSnapshot(snapshot))
+
+    def testHistogramQuantiles(self):
+        histogram = Histogram(LATENCY_BUCKETS)
+        for value in [0.002] * 9 + [3]:
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 0.0025)
+        self.assertEqual(histogram.quantile(0.99), 3)
+        self.assertEqual(histogram.snapshot()["max"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
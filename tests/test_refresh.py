@@ -0,0 +1,157 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Os, shutil and tempfile used for scratch metadata files
+import os
+import shutil
+import tempfile
+
+from tests import ReplayTestCase
+from tsamashup import metadata, refresh, upstream
+from tsamashup.metadata import OpenAirportIndex, MetadataError
+from tsamashup.refresh import RefreshAirportMetadata
+
+
+## METADATA REFRESH
+
+def AirportElement(data, airportCode):
+    """
+    :return: Returns the start and end offsets of an airport's <airport> element in the metadata XML
+    """
+    code = data.index("<shortcode>{}</shortcode>".format(airportCode))
+    return data.rindex("<airport>", 0, code), data.index("</airport>", code) + len("</airport>")
+
+def ChangedMetadata(data):
+    """
+    :param data: TSA metadata XML
+    :return: Returns a new version of it with BOS removed, SEA renamed, and ZZZ added as a copy of ATL
+    """
+    start, end = AirportElement(data, "ATL")
+    added = data[start:end].replace("<shortcode>ATL</shortcode>", "<shortcode>ZZZ</shortcode>")
+    start, end = AirportElement(data, "BOS")
+    data = data[:start] + data[end:]
+    data = data.replace("<name>Seattle-Tacoma International</name>", "<name>Seattle-Tacoma</name>")
+    return data.replace("</airports>", added + "</airports>")
+
+class RefreshTest(ReplayTestCase):
+    def setUp(self):
+        ReplayTestCase.setUp(self)
+        self.dirname = tempfile.mkdtemp()
+        self.xml_fname = os.path.join(self.dirname, "apcp.xml")
+        self.index_fname = os.path.join(self.dirname, "apcp.idx")
+        self.checksum_fname = os.path.join(self.dirname, "apcp.checksum.xml")
+        shutil.copy(metadata.airport_fname, self.xml_fname)
+        with open(self.xml_fname, "rb") as fobj:
+            self.original = fobj.read()
+        self.replay.setMetadata(self.original)
+        self.index = OpenAirportIndex(self.xml_fname, self.index_fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+        ReplayTestCase.tearDown(self)
+
+    def refresh(self, force=False):
+        return RefreshAirportMetadata(self.index, force, self.xml_fname, self.index_fname, self.checksum_fname)
+
+    def read(self, fname):
+        with open(fname, "rb") as fobj:
+            return fobj.read()
+
+    def testUnchangedMetadata(self):
+        newMetadata, diff = self.refresh()
+        self.assertFalse(diff)
+        self.assertEqual(self.read(self.checksum_fname), self.replay.metadataChecksum)
+        self.assertEqual(self.replay.counts["metadata"], 2)
+
+        # the checksum is the same, so apcp.xml isn't downloaded again
+        self.assertEqual(self.refresh(), (self.index, None))
+        self.assertEqual(self.replay.counts["metadata"], 3)
+
+    def testChangedMetadata(self):
+        self.refresh()
+        carried = self.index["ATL"]
+        self.replay.setMetadata(ChangedMetadata(self.original))
+        newMetadata, diff = self.refresh()
+
+        self.assertEqual(diff.added, ["ZZZ"])
+        self.assertEqual(diff.removed, ["BOS"])
+        self.assertEqual(diff.changed, {"SEA": {"fields": ["name"], "checkpointsAdded": [], "checkpointsRemoved": [],
+                                                "checkpointsChanged": []}})
+        self.assertTrue("ZZZ" in newMetadata and "BOS" not in newMetadata)
+        self.assertEqual(newMetadata["SEA"].name, "Seattle-Tacoma")
+        self.assertTrue(newMetadata["ATL"] is carried)
+        # the old metadata is untouched, for requests still using it
+        self.assertEqual(self.index["SEA"].name, "Seattle-Tacoma International")
+
+        self.assertEqual(self.read(self.xml_fname), ChangedMetadata(self.original))
+        self.assertEqual(self.read(self.checksum_fname), self.replay.metadataChecksum)
+        self.assertEqual(sorted(os.listdir(self.dirname)), ["apcp.checksum.xml", "apcp.idx", "apcp.xml"])
+        reopened = OpenAirportIndex(self.xml_fname, self.index_fname)
+        self.assertEqual(sorted(reopened.keys()), sorted(newMetadata.keys()))
+        reopened.close()
+
+    def testFailedApplyKeepsFiles(self):
+        self.refresh()
+        checksum = self.read(self.checksum_fname)
+        self.replay.setMetadata(ChangedMetadata(self.original))
+
+        def failing(xml_fname, index_fname):
+            raise IOError("disk full")
+        build = refresh.BuildAirportIndex
+        refresh.BuildAirportIndex = failing
+        try:
+            self.assertRaises(IOError, self.refresh)
+        finally:
+            refresh.BuildAirportIndex = build
+        self.assertEqual(self.read(self.xml_fname), self.original)
+        self.assertEqual(self.read(self.checksum_fname), checksum)
+        self.assertEqual(sorted(os.listdir(self.dirname)), ["apcp.checksum.xml", "apcp.idx", "apcp.xml"])
+
+        # the checksum wasn't written, so the next check applies the new metadata
+        newMetadata, diff = self.refresh()
+        self.assertEqual(diff.added, ["ZZZ"])
+
+    def testMismatchedChecksum(self):
+        self.refresh()
+        checksum = self.read(self.checksum_fname)
+        # TSA published a new checksum, but apcp.xml is still the old version
+        self.replay.setMetadata(self.original, "<checksum>{}</checksum>".format("0" * 40))
+        self.assertRaises(MetadataError, self.refresh)
+        self.assertEqual(self.read(self.checksum_fname), checksum)
+        self.assertEqual(sorted(os.listdir(self.dirname)), ["apcp.checksum.xml", "apcp.idx", "apcp.xml"])
+
+    def testReplacedIndexIsClosed(self):
+        delay = refresh.RETIRED_INDEX_DELAY
+        del refresh.retired_indexes[:]
+        newMetadata, diff = self.refresh()
+        # still open for requests that picked it up before the swap
+        self.assertEqual(self.index["SEA"].name, "Seattle-Tacoma International")
+        self.assertEqual(refresh.CloseRetiredIndexes(), 0)
+
+        refresh.RETIRED_INDEX_DELAY = 0
+        try:
+            self.replay.setMetadata(ChangedMetadata(self.original))
+            newerMetadata, diff = RefreshAirportMetadata(newMetadata, False, self.xml_fname, self.index_fname,
+                                                         self.checksum_fname)
+        finally:
+            refresh.RETIRED_INDEX_DELAY = delay
+        self.assertRaises(ValueError, newMetadata.mm.read_byte)
+        self.assertEqual(newerMetadata["SEA"].name, "Seattle-Tacoma")
+        self.assertEqual([index for closeAt, index in refresh.retired_indexes], [self.index])
+        del refresh.retired_indexes[:]
+        newerMetadata.close()
+
+    def testOwnBreaker(self):
+        self.refresh(force=True)
+        breakers = dict((name, breaker.stats()) for name, breaker in upstream.upstream_breakers.items())
+        self.assertEqual(breakers["metadata"]["calls"], 2)
+        self.assertEqual(breakers["tsa"]["calls"], 0)
+
+        self.replay.metadata = self.replay.metadataChecksum = None
+        self.assertRaises(Exception, self.refresh)
+        self.assertEqual(upstream.upstream_breakers["metadata"].stats()["calls"], 3)
+        self.assertEqual(upstream.upstream_breakers["tsa"].stats()["calls"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# StringIO, os and tempfile used for the batch input and the fixture file
+import StringIO
+import os
+import tempfile
+
+from tests import ResetUpstreamState
+from tsamashup import upstream
+from tsamashup.batch import LoadBatchTrips, BatchLeaveTimes
+from tsamashup.cache import ResponseCache
+from tsamashup.metadata import AirportMetadata
+from tsamashup.replay import StartReplay, RecordUpstream
+
+
+## RECORD AND REPLAY
+
+BATCH_CSV = """id,origin,airport
+1,Cambridge MA,BOS
+2,Brooklyn NY,JFK
+3,Seattle WA,SEA
+"""
+
+def RunBatch(csv):
+    ResetUpstreamState()
+    return BatchLeaveTimes(LoadBatchTrips(StringIO.StringIO(csv)), "KEY", AirportMetadata())
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.fixture_fname = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        os.remove(self.fixture_fname)
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        os.remove(self.fixture_fname)
+
+    def start(self, fixtures=None, synthetic=False):
+        server = StartReplay(fixtures, synthetic)
+        self.servers.append(server)
+        return server
+
+    def testRecordThenReplay(self):
+        self.start(synthetic=True)
+        fixtures = ResponseCache(self.fixture_fname)
+        recorder = RecordUpstream(fixtures)
+        try:
+            recorded = RunBatch(BATCH_CSV)
+        finally:
+            upstream.upstream_recorders.remove(recorder)
+        # each airport's wait times, and one Distance Matrix request per airport
+        self.assertEqual(len(fixtures), 6)
+
+        replay = self.start(ResponseCache(self.fixture_fname))
+        replayed = RunBatch(BATCH_CSV)
+        self.assertEqual(replay.counts, {"replayed": 6, "synthetic": 0, "metadata": 0, "missing": 0, "outage": 0})
+        self.assertEqual([result["status"] for result in replayed], ["OK", "OK", "OK"])
+        for recordedResult, replayedResult in zip(recorded, replayed):
+            self.assertEqual(recordedResult["travelTime"], replayedResult["travelTime"])
+            self.assertEqual(recordedResult["originAddress"], replayedResult["originAddress"])
+
+    def testMissingFixture(self):
+        replay = self.start(ResponseCache(self.fixture_fname))
+        results = RunBatch(BATCH_CSV.splitlines()[0] + "\n" + BATCH_CSV.splitlines()[1] + "\n")
+        # nothing was recorded and nothing is known, and batch mode reports the TSA wait times first
+        self.assertEqual(results[0]["status"], "TSA_UNAVAILABLE")
+        self.assertEqual(replay.counts["missing"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Json, os, StringIO, tempfile and threading used for report files and waiting on the report
+import json
+import os
+import StringIO
+import tempfile
+import threading
+
+from tests import ReplayTestCase
+from tsamashup.upstream import GetTSAWaitTimes
+from tsamashup.report import GenerateReport, CompletedAirports
+
+
+## NATIONWIDE REPORT
+
+# Seconds a report of a few airports may take before it counts as hung
+REPORT_TIMEOUT = 30
+
+class ReportTest(ReplayTestCase):
+    def generate(self, airportCodes, fmt="csv"):
+        """
+        Runs GenerateReport on a thread, so a hung report fails the test instead of hanging the suite.
+        :return: Returns the (counts, report text)
+        """
+        fobj = StringIO.StringIO()
+        outcome = []
+        thread = threading.Thread(target=lambda: outcome.append(GenerateReport(airportCodes, fobj, fmt, processes=2)))
+        thread.daemon = True
+        thread.start()
+        thread.join(REPORT_TIMEOUT)
+        self.assertFalse(thread.is_alive(), "report hung")
+        return outcome[0], fobj.getvalue()
+
+    def testReportAfterFetchInParent(self):
+        # the parent's fetch pool and session exist before the workers are forked
+        GetTSAWaitTimes("BOS")
+        counts, text = self.generate(["BOS", "JFK", "SEA", "XXX"], "jsonl")
+        self.assertEqual(counts, {"OK": 3, "UNKNOWN_AIRPORT": 1})
+        rows = dict((row["airport"], row) for row in map(json.loads, text.splitlines()))
+        self.assertEqual(rows["BOS"]["reports"], 25)
+
+    def testUnavailableAirports(self):
+        self.replay.setOutage("tsa", 503)
+        counts, text = self.generate(["BOS", "JFK"])
+        self.assertEqual(counts, {"TSA_UNAVAILABLE": 2})
+
+class CompletedAirportsTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.fname = tempfile.mkstemp(suffix=".jsonl")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.fname)
+
+    def write(self, data):
+        with open(self.fname, "wb") as fobj:
+            fobj.write(data)
+
+    def read(self):
+        with open(self.fname, "rb") as fobj:
+            return fobj.read()
+
+    def testOnlyOKRowsAreKept(self):
+        ok = json.dumps({"airport": "BOS", "status": "OK"}) + "\n"
+        self.write(ok + json.dumps({"airport": "JFK", "status": "TSA_UNAVAILABLE"}) + "\n" + '{"airport": "SE')
+        self.assertEqual(CompletedAirports(self.fname, "jsonl"), set(["BOS"]))
+        self.assertEqual(self.read(), ok)
+
+    def testCSV(self):
+        data = "airport,status\r\nBOS,OK\r\nJFK,OK\r\n"
+        self.write(data + "SEA,TSA_UNAVAILABLE\r\n")
+        self.assertEqual(CompletedAirports(self.fname), set(["BOS", "JFK"]))
+        self.assertEqual(self.read(), data)
+
+        # nothing to drop, the file is left as it is
+        os.utime(self.fname, (1000000000, 1000000000))
+        self.assertEqual(CompletedAirports(self.fname), set(["BOS", "JFK"]))
+        self.assertEqual(os.path.getmtime(self.fname), 1000000000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Json, urllib2 and threading used for calling the server
+import json
+import urllib2
+import threading
+
+from tests import ReplayTestCase
+from tsamashup import server
+from tsamashup.metadata import AirportMetadata
+from tsamashup.server import EstimateServer
+
+
+## HTTP SERVICE
+
+class ServerTest(ReplayTestCase):
+    def setUp(self):
+        ReplayTestCase.setUp(self)
+        self.server = EstimateServer(("127.0.0.1", 0), "KEY")
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        ReplayTestCase.tearDown(self)
+
+    def get(self, path):
+        """
+        :return: Returns the (status, decoded JSON body) of a GET request
+        """
+        try:
+            response = urllib2.urlopen(self.url + path)
+        except urllib2.HTTPError, e:
+            response = e
+        return response.getcode(), json.loads(response.read())
+
+    def testAirports(self):
+        self.assertEqual(self.server.airportList, None)
+        status, airports = self.get("/airports")
+        self.assertEqual(status, 200)
+        self.assertEqual([airport["shortcode"] for airport in airports], sorted(AirportMetadata().keys()))
+        self.assertTrue(self.server.airports() is self.server.airports())
+
+    def testSetMetadataRebuildsAirports(self):
+        self.get("/airports")
+        self.server.setMetadata({"BOS": AirportMetadata()["BOS"]})
+        status, airports = self.get("/airports")
+        self.assertEqual([airport["shortcode"] for airport in airports], ["BOS"])
+
+    def testEstimate(self):
+        status, result = self.get("/estimate?origin=Cambridge+MA&airport=bos&precheck=y")
+        self.assertEqual(status, 200)
+        self.assertEqual(result["status"], "OK")
+        self.assertEqual(result["airport"], "BOS")
+        self.assertTrue(result["totalTime"] > result["travelTime"] > 0)
+        self.assertEqual(result["stale"], None)
+
+    def testEstimateErrors(self):
+        self.assertEqual(self.get("/estimate?origin=Cambridge+MA&airport=XXX")[0], 404)
+        status, result = self.get("/estimate?origin=Cambridge+MA&airport=BOS&arrival=soon")
+        self.assertEqual((status, result["status"]), (400, "BAD_TIME"))
+        status, result = self.get("/estimate?origin=Cambridge+MA%7CQuincy+MA&airport=BOS")
+        self.assertEqual((status, result["status"]), (400, "BAD_ORIGIN"))
+        self.assertEqual(self.replay.counts["synthetic"], 0)
+        self.assertEqual(self.get("/estimate?airport=BOS")[0], 400)
+        self.assertEqual(self.get("/estimate?origin=Cambridge+MA&airport=BOS&traffic_model=fast")[0], 400)
+        self.assertEqual(self.get("/estimate?origin=Cambridge+MA&airport=BOS&units=furlongs")[0], 400)
+        self.assertEqual(self.get("/estimate?origin=Cambridge+MA&airport=BOS&units=metric")[0], 200)
+
+    def testWaitTimes(self):
+        status, stats = self.get("/airports/bos/waittimes?pct=50")
+        self.assertEqual(status, 200)
+        self.assertEqual((stats["airport"], stats["reports"], stats["percentile"]), ("BOS", 25, 50))
+        self.assertEqual(self.get("/airports/XXX/waittimes")[0], 404)
+        self.replay.setOutage("tsa", 503)
+        self.assertEqual(self.get("/airports/JFK/waittimes")[0], 502)
+
+    def testBugIsServerError(self):
+        def broken(*args):
+            raise KeyError("checkpoints")
+        stats = server.AirportWaitTimeStats
+        server.AirportWaitTimeStats = broken
+        self.server.RequestHandlerClass.log_error = lambda handler, *args: None
+        try:
+            status, body = self.get("/airports/BOS/waittimes")
+        finally:
+            server.AirportWaitTimeStats = stats
+            del self.server.RequestHandlerClass.log_error
+        self.assertEqual((status, body["error"]), (500, "Internal server error"))
+
+    def testStats(self):
+        self.get("/estimate?origin=Cambridge+MA&airport=BOS")
+        status, stats = self.get("/stats")
+        self.assertEqual(status, 200)
+        self.assertEqual([breaker["name"] for breaker in stats["breakers"]], ["google", "metadata", "tsa"])
+        self.assertEqual(self.get("/nowhere")[0], 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Sys and StringIO used for capturing printed output
+import sys
+import StringIO
+
+from tests import ReplayTestCase
+from tsamashup import cli
+from tsamashup.metadata import AirportMetadata
+from tsamashup.payloads import DistanceMatrix, DistanceElement
+from tsamashup.trip import Trip, GoogleDistance
+
+
+## TRIPS
+
+class TripTest(ReplayTestCase):
+    def setUp(self):
+        ReplayTestCase.setUp(self)
+        self.stdout = sys.stdout
+        sys.stdout = self.output = StringIO.StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        ReplayTestCase.tearDown(self)
+
+    def run1(self, answers):
+        """
+        Runs the interactive program, answering its prompts in order.
+        :return: Returns what it printed
+        """
+        answers = list(answers)
+        cli.raw_input = lambda prompt: answers.pop(0)
+        try:
+            cli.Main1()
+        finally:
+            del cli.raw_input
+        return self.output.getvalue()
+
+    def testTripIsSilent(self):
+        noRoute = DistanceMatrix("OK", ["Honolulu, HI, USA"], ["BOS Airport"], [[DistanceElement("ZERO_RESULTS")]])
+        distance = GoogleDistance("Honolulu HI", "BOS", "KEY", matrix=noRoute)
+        self.assertEqual(distance.elementStatus, "ZERO_RESULTS")
+        UserTrip = Trip("Honolulu HI", "BOS", "KEY", AirportMetadata(), distance=distance)
+        self.assertEqual(UserTrip.distance.durationValue, 0)
+        self.assertRaises(KeyError, Trip, "Cambridge MA", "XXX", "KEY", AirportMetadata())
+        self.assertEqual(self.output.getvalue(), "")
+
+    def testProgramReportsUnknownAirport(self):
+        output = self.run1(["KEY", "XXX", "Cambridge MA"] + ["n"] * 5)
+        self.assertTrue("The entered airport shortcode does not exist." in output)
+        self.assertFalse("Leave for the airport" in output)
+
+    def testProgramEstimate(self):
+        output = self.run1(["KEY", "BOS", "Cambridge MA"] + ["n"] * 5)
+        self.assertTrue("Leave for the airport" in output)
+        self.assertTrue("Origin: Cambridge MA, USA" in output)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+
+from tests import ReplayTestCase
+from tsamashup import upstream
+from tsamashup.breaker import CircuitBreaker, CircuitOpenError
+from tsamashup.payloads import DistanceMatrix, DistanceElement, PayloadError
+from tsamashup.upstream import FetchDistanceMatrix
+
+
+## DISTANCE MATRIX REQUESTS
+
+class DistanceMatrixTest(ReplayTestCase):
+    def setUp(self):
+        ReplayTestCase.setUp(self)
+        self.request = upstream.RequestDistanceMatrix
+
+    def tearDown(self):
+        upstream.RequestDistanceMatrix = self.request
+        ReplayTestCase.tearDown(self)
+
+    def testRowsMatchOrigins(self):
+        matrix = FetchDistanceMatrix(["Quincy MA", "Braintree MA"], ["BOS", "JFK"], "KEY")
+        self.assertEqual(matrix.originAddresses, ("Quincy MA, USA", "Braintree MA, USA"))
+        self.assertEqual(matrix.destinationAddresses, ("BOS Airport", "JFK Airport"))
+
+    def testMissingRowIsRejected(self):
+        def oneRow(origins, destinations, *args):
+            return DistanceMatrix("OK", origins[:1], destinations, [[DistanceElement("OK", 600)] * len(destinations)])
+        upstream.RequestDistanceMatrix = oneRow
+        self.assertRaises(PayloadError, FetchDistanceMatrix, ["Quincy MA", "Braintree MA"], ["BOS"], "KEY")
+        # nothing was cached from the short response
+        upstream.RequestDistanceMatrix = self.request
+        self.assertEqual(FetchDistanceMatrix(["Quincy MA"], ["BOS"], "KEY").originAddresses, ("Quincy MA, USA",))
+
+    def testPlaceWithSeparatorIsRejected(self):
+        self.assertRaises(ValueError, FetchDistanceMatrix, ["Quincy MA|Braintree MA"], ["BOS"], "KEY")
+        self.assertRaises(ValueError, FetchDistanceMatrix, [" "], ["BOS"], "KEY")
+        self.assertEqual(sum(self.replay.counts.values()), 0)
+
+
+## CIRCUIT BREAKERS
+
+class CircuitBreakerTest(unittest.TestCase):
+    def testOpensAfterThreshold(self):
+        breaker = CircuitBreaker("test", failureThreshold=3)
+        for num in range(3):
+            breaker.failure(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertRaises(CircuitOpenError, breaker.allow)
+
+    def testSuccessResetsFailures(self):
+        breaker = CircuitBreaker("test", failureThreshold=3)
+        breaker.failure(breaker.allow())
+        breaker.failure(breaker.allow())
+        breaker.success(breaker.allow())
+        breaker.failure(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def testLateCallsDontCloseOrReopen(self):
+        breaker = CircuitBreaker("test", failureThreshold=2, resetTimeout=0)
+        late = breaker.allow()
+        breaker.failure(breaker.allow())
+        breaker.failure(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        # a call admitted before the breaker opened can't close it
+        breaker.success(late)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # only the trial call decides whether it closes
+        trial = breaker.allow()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.failure(late)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.success(trial)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.stats()["failures"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
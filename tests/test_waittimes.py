@@ -0,0 +1,122 @@
+## IMPORT STATEMENTS
+
+# Unittest used for the test cases
+import unittest
+# Datetime used for report times
+import datetime
+# Copy used for checking the metadata is left alone
+import copy
+
+from tsamashup.metadata import AirportMetadata
+from tsamashup.payloads import ParseTSAWaitTimes
+from tsamashup.waittimes import TSAWaitTimes, WaitTimeSnapshot, WaitTimeStatsByAirport, WaitIncrementsToSeconds
+
+
+## WAIT TIME SNAPSHOTS
+## BTV has checkpoints 1 and 2, and ABQ has checkpoint 1. The expected values are worked out by hand from FEED.
+
+MONDAY = datetime.datetime(2016, 11, 28, 7, 0)
+
+def Feed(reports):
+    """
+    :param reports: List of (checkpoint, wait time increment, minutes after 7 AM Monday) tuples
+    :return: Returns the feed of a TSA Wait Times API response with those reports
+    """
+    return ParseTSAWaitTimes({"WaitTimes": [{"CheckpointIndex": str(chk), "WaitTime": str(wait),
+                           "Created_Datetime": (MONDAY + datetime.timedelta(minutes=minutes)).strftime("%m/%d/%Y %I:%M:%S %p")}
+                                            for chk, wait, minutes in reports]})
+
+# newest first the waits are 2, 4, 3, 0, 1
+FEED = [(1, 1, 0), (2, 0, 10), (1, 3, 20), (2, 4, 30), (1, 2, 40)]
+
+class WaitTimeSnapshotTest(unittest.TestCase):
+    def testSortedAndGrouped(self):
+        snapshot = WaitTimeSnapshot("BTV", Feed(FEED))
+        self.assertEqual([record.waitTime for record in snapshot.records], [2, 4, 3, 0, 1])
+        self.assertEqual([record.waitTime for record in snapshot.checkpointRecords(1)], [2, 3, 1])
+        self.assertEqual([record.waitTime for record in snapshot.checkpointRecords(2)], [4, 0])
+        self.assertEqual(snapshot.checkpointRecords(3), ())
+        self.assertEqual(snapshot.checkpointWaits().tolist(), [2, 4, 3, 0, 1])
+        self.assertEqual(snapshot.checkpointWaits(2).tolist(), [4, 0])
+        self.assertEqual(snapshot.checkpointArray.tolist(), [1, 2, 1, 2, 1])
+        self.assertEqual((snapshot.epochArray[0] - snapshot.epochArray[-1]), 2400)
+        self.assertRaises(ValueError, snapshot.waitArray.__setitem__, 0, 9)
+
+    def testMetadataNotModified(self):
+        TSAairportDict = AirportMetadata()
+        checkpoints = TSAairportDict["BTV"].checkpoints
+        before = copy.deepcopy([vars(checkpoint) for checkpoint in checkpoints])
+        first = TSAWaitTimes("BTV", TSAairportDict, Feed(FEED))
+        second = TSAWaitTimes("BTV", TSAairportDict, Feed(FEED[:1]))
+        self.assertTrue(TSAairportDict["BTV"].checkpoints is checkpoints)
+        self.assertEqual([vars(checkpoint) for checkpoint in checkpoints], before)
+        self.assertEqual(len(first.OneCheckpointWaitTimes(1)["WaitTimes"]), 3)
+        self.assertEqual(len(second.OneCheckpointWaitTimes(1)["WaitTimes"]), 1)
+        self.assertEqual([checkpoint["id"] for checkpoint in first.AllCheckpointWaitTimes()], [1, 2])
+
+
+## WAIT TIME STATISTICS
+
+class WaitTimeStatisticsTest(unittest.TestCase):
+    def setUp(self):
+        self.TSAairportDict = AirportMetadata()
+        self.waitTimes = TSAWaitTimes("BTV", self.TSAairportDict, Feed(FEED))
+        self.empty = TSAWaitTimes("BTV", self.TSAairportDict, Feed([]))
+
+    def testAverages(self):
+        self.assertEqual(self.waitTimes.AvgAllWaitTime(), 1200)
+        self.assertEqual(self.waitTimes.AvgAllWaitTime(2), 1800)
+        self.assertEqual(self.waitTimes.AvgOneWaitTime(1), 1200)
+        self.assertEqual(self.waitTimes.AvgOneWaitTime(2, 1), 2400)
+        self.assertEqual(self.empty.AvgAllWaitTime(), 0)
+        self.assertEqual(self.empty.AvgOneWaitTime(1), 0)
+
+    def testWorstAndSlowest(self):
+        self.assertEqual(self.waitTimes.WorstWaitTime(), ("11/28/2016 07:30:00 AM", 2400))
+        self.assertEqual(self.waitTimes.slowestWaitTimeNow(), 2400)
+        self.assertEqual(self.waitTimes.MaxWaitTimeByCheckpoint(), {1: 1800, 2: 2400})
+        self.assertEqual(self.empty.WorstWaitTime(), (None, 0))
+        self.assertEqual(self.empty.slowestWaitTimeNow(), 0)
+        self.assertEqual(self.empty.MaxWaitTimeByCheckpoint(), {})
+
+    def testNewestOfTiesIsWorst(self):
+        waitTimes = TSAWaitTimes("BTV", self.TSAairportDict, Feed([(1, 4, 0), (2, 4, 10), (1, 1, 20)]))
+        self.assertEqual(waitTimes.WorstWaitTime(), ("11/28/2016 07:10:00 AM", 2400))
+
+    def testSlowestNeedsEveryCheckpoint(self):
+        waitTimes = TSAWaitTimes("BTV", self.TSAairportDict, Feed([(1, 4, 0)]))
+        self.assertEqual(waitTimes.slowestWaitTimeNow(), 0)
+
+    def testPercentiles(self):
+        self.assertEqual(self.waitTimes.WaitTimePercentile(50), 1200)
+        self.assertEqual(self.waitTimes.WaitTimePercentile(90), 2400)
+        self.assertEqual(self.waitTimes.WaitTimePercentile(100, 1), 1800)
+        self.assertEqual(self.empty.WaitTimePercentile(90), 0)
+
+    def testWindowedAverage(self):
+        self.assertEqual(self.waitTimes.WindowedAvgWaitTime(1800), 1800)
+        self.assertEqual(self.waitTimes.WindowedAvgWaitTime(1800, 1), 1800)
+        self.assertEqual(self.waitTimes.WindowedAvgWaitTime(1200, now=MONDAY + datetime.timedelta(minutes=15)), 600)
+        self.assertEqual(self.waitTimes.WindowedAvgWaitTime(600, now=MONDAY - datetime.timedelta(hours=1)), 0)
+        self.assertEqual(self.empty.WindowedAvgWaitTime(), 0)
+
+    def testStatsByAirport(self):
+        abq = TSAWaitTimes("ABQ", self.TSAairportDict, Feed([(1, 1, 0), (1, 1, 10), (1, 2, 20)]))
+        stats = WaitTimeStatsByAirport([self.waitTimes.snapshot, abq.snapshot, WaitTimeSnapshot("BOS", Feed([]))])
+        self.assertEqual(stats, {"BTV": {"count": 5, "avg": 1200, "worst": 2400, "percentile": 2400},
+                                 "ABQ": {"count": 3, "avg": 1200, "worst": 1200, "percentile": 1200},
+                                 "BOS": {"count": 0, "avg": 0, "worst": 0, "percentile": 0}})
+        # each airport's percentile agrees with the single airport statistic
+        for pct in (0, 25, 50, 75, 90, 100):
+            stats = WaitTimeStatsByAirport([self.waitTimes.snapshot, abq.snapshot], pct)
+            self.assertEqual(stats["BTV"]["percentile"], self.waitTimes.WaitTimePercentile(pct))
+            self.assertEqual(stats["ABQ"]["percentile"], abq.WaitTimePercentile(pct))
+        self.assertEqual(WaitTimeStatsByAirport([]), {})
+
+    def testIncrementsRoundUp(self):
+        self.assertEqual(WaitIncrementsToSeconds(0), 0)
+        self.assertEqual(WaitIncrementsToSeconds(1.01), 1200)
+        self.assertEqual(WaitIncrementsToSeconds(2), 1200)
+
+if __name__ == "__main__":
+    unittest.main()
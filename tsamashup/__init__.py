@@ -0,0 +1,21 @@
+"""
+TSA-Mashup: estimates when to leave for the airport from TSA checkpoint wait times and Google Distance Matrix travel times.
+
+Importing the package or any of its modules has no side effects. The response cache, the airport metadata and the
+REST API sessions are all loaded on first use. Entry points:
+    tsamashup.cli.main(argv)               the command line program, also python -m tsamashup
+    tsamashup.metadata.AirportMetadata()   the shared TSAairportDict
+    tsamashup.trip.Trip, CalcTotalTime     one estimate
+    tsamashup.batch.BatchLeaveTimes        many estimates at once
+    tsamashup.compare.CompareAirports      nearby airports ranked by total time
+    tsamashup.history.WaitTimePoller       background collection of wait time history
+    tsamashup.forecast.ForecastModel()     wait times predicted by hour of the week
+    tsamashup.replay.StartReplay           a local stand-in for the upstream APIs
+    tsamashup.metrics.instrumentation      stage timings, upstream latencies and counters
+"""
+
+# Os used for locating the data files
+import os
+
+# Directory holding apcp.xml and the cache files, the project root unless TSA_MASHUP_DATA_DIR is set
+DATA_DIR = os.environ.get("TSA_MASHUP_DATA_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
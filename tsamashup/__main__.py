@@ -0,0 +1,5 @@
+## Runs the command line program, python -m tsamashup
+
+from tsamashup.cli import main
+
+main()
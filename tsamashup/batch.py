@@ -0,0 +1,290 @@
+## IMPORT STATEMENTS
+
+# Json used for reading and writing JSONL batch files
+import json
+# Csv used for reading and writing batch trip files
+import csv
+# Os and sys used for the API key environment variable and standard output
+import os
+import sys
+# Argparse used for parsing batch mode command line options
+import argparse
+
+from tsamashup.upstream import FetchAsync, FetchDistanceMatrix, AwaitUpstream, UpstreamDeadline, UpstreamUnavailable
+from tsamashup.upstream import TRAFFIC_MODELS, UNITS, IsValidPlace
+from tsamashup.history import StoredTSAWaitTimes
+from tsamashup.metadata import LoadTSAMetadata
+from tsamashup.trip import GoogleDistance, Trip, CalcTotalTime, CheckpointWaitTime, LeaveTimeMessage
+from tsamashup.trip import AwaitAirport, DegradedDistance
+from tsamashup.forecast import ParseArrivalTime
+from tsamashup.metrics import instrumentation, FormatSnapshot
+
+
+## BATCH MODE
+## Computes departure advice for many trips at once, without printing or prompting.
+
+# Most origins Google accepts in a single Distance Matrix request
+MAX_MATRIX_ORIGINS = 25
+
+# Batch file column names, in order. The yes/no columns default to no. The optional times are on the airport's local
+# clock, e.g. 2016-11-28 07:30: departure is when the traveller leaves the origin, for travel times in the traffic
+# expected then, and arrival is when they get to security, for the wait time forecast.
+BATCH_FLAG_FIELDS = ["precheck", "international", "checkedBags", "rentalCar", "pessimistic"]
+BATCH_TIME_FIELDS = ["departure", "arrival"]
+BATCH_FIELDS = ["id", "origin", "airport"] + BATCH_FLAG_FIELDS + BATCH_TIME_FIELDS
+# stale lists the inputs, waitTime and/or travelTime, that fell back on what was known because TSA or Google was
+# unavailable, and waitAge and travelAge say how many seconds old they are
+BATCH_RESULT_FIELDS = ["id", "origin", "airport", "status", "originAddress", "destinationAddress",
+                       "travelTime", "waitTime", "waitSource", "buffer", "totalTime", "advice",
+                       "stale", "waitAge", "travelAge"]
+
+def ParseYesNo(value):
+    """
+    Reads a yes/no answer from a batch file.
+    :param value: y/n, yes/no, true/false, 1/0 or an actual boolean
+    :return: Returns True or False
+    """
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return str(value).strip().upper() in ("Y", "YES", "TRUE", "1")
+
+def ParseTripOrigin(trip, row):
+    """
+    Reads a trip's origin. A trip without one, or with a | in it, gets the status BAD_ORIGIN and is never requested:
+    Google would read it as several origins, and every later trip packed into the same request would get another
+    origin's travel time.
+    :param trip: Trip dictionary to set the origin and, on a bad origin, status of
+    :param row: Input row or request parameters
+    """
+    trip["origin"] = (row.get("origin") or "").strip()
+    if not IsValidPlace(trip["origin"]):
+        trip["status"] = "BAD_ORIGIN"
+
+def ParseTripTimes(trip, row):
+    """
+    Reads a trip's optional departure and arrival times. A trip with a time that isn't in either format gets the
+    status BAD_TIME instead of silently running as now.
+    :param trip: Trip dictionary to set the BATCH_TIME_FIELDS and, on a bad time, status of
+    :param row: Input row or request parameters, times as text, see ParseArrivalTime
+    """
+    for field in BATCH_TIME_FIELDS:
+        trip[field] = None
+        if row.get(field):
+            try:
+                trip[field] = ParseArrivalTime(row[field])
+            except ValueError, e:
+                trip["status"] = "BAD_TIME"
+
+def LoadBatchTrips(fobj, fmt="csv"):
+    """
+    Reads trips from a CSV file with a header row, or from a JSONL file with one trip object per line.
+    :param fobj: Open file object
+    :param fmt: csv or jsonl
+    :return: Returns a list of trip dictionaries with the BATCH_FIELDS keys, and a status for trips that can't be run
+    """
+    if fmt == "jsonl":
+        rows = [json.loads(line) for line in fobj if line.strip()]
+    else:
+        rows = list(csv.DictReader(fobj))
+
+    trips = []
+    for num, row in enumerate(rows):
+        trip = {}
+        trip["id"] = row.get("id") or str(num + 1)
+        ParseTripOrigin(trip, row)
+        trip["airport"] = (row.get("airport") or "").strip().upper()
+        for field in BATCH_FLAG_FIELDS:
+            trip[field] = ParseYesNo(row.get(field))
+        ParseTripTimes(trip, row)
+        trips.append(trip)
+    return trips
+
+def BatchLeaveTimes(trips, key, TSAairportDict, units="imperial", traffic_model=None):
+    """
+    Calculates departure advice for many trips. Trips are grouped by airport so each airport's TSA wait times
+    are requested once, and each airport's origins leaving at the same time are packed into multi-origin
+    Distance Matrix requests. All of the requests run concurrently on the shared fetch pool, and when TSA or Google
+    is unavailable, trips fall back on the wait times and travel times last known, see DegradedAirport.
+    :param trips: List of trip dictionaries, see LoadBatchTrips. Trips that already have a status aren't run, nor
+    are trips with a bad origin, see ParseTripOrigin.
+    :param key: Google API key
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :param units: Measurement return from Google API, can also be metric
+    :param traffic_model: Optional traffic model from TRAFFIC_MODELS, for the trips with a departure time
+    :return: Returns a list of result dictionaries with the BATCH_RESULT_FIELDS keys, in the same order as trips
+    """
+    results = [None] * len(trips)
+
+    # Group trip indexes by airport, then by departure time and origin, so duplicates share one lookup
+    tripsByAirport = {}
+    for num, trip in enumerate(trips):
+        status = trip.get("status")
+        if not status and not IsValidPlace(trip["origin"]):
+            status = "BAD_ORIGIN"
+        if status:
+            results[num] = BatchResult(trip, status)
+            continue
+        tripsByAirport.setdefault(trip["airport"], {}).setdefault((trip.get("departure"), trip["origin"]), []).append(num)
+
+    # Start every request up front, then collect the results airport by airport
+    pendingTSA = {}
+    pendingDistance = {}
+    for airportCode, tripsByOrigin in tripsByAirport.items():
+        if airportCode in TSAairportDict:
+            pendingTSA[airportCode] = FetchAsync("tsa", StoredTSAWaitTimes, airportCode)
+            originsByDeparture = {}
+            for departure, origin in tripsByOrigin.keys():
+                originsByDeparture.setdefault(departure, []).append(origin)
+            pendingDistance[airportCode] = []
+            for departure, origins in originsByDeparture.items():
+                departure_time = TSAairportDict[airportCode].utcEpoch(departure) if departure is not None else None
+                for start in range(0, len(origins), MAX_MATRIX_ORIGINS):
+                    chunk = origins[start:start + MAX_MATRIX_ORIGINS]
+                    pending = FetchAsync("google", FetchDistanceMatrix, chunk, [airportCode], key, units, departure_time, traffic_model)
+                    pendingDistance[airportCode].append((departure, chunk, pending))
+    tsaDeadline = UpstreamDeadline("tsa", len(pendingTSA))
+    googleDeadline = UpstreamDeadline("google", sum(len(pendings) for pendings in pendingDistance.values()))
+
+    for airportCode, tripsByOrigin in tripsByAirport.items():
+        if airportCode not in TSAairportDict:
+            for nums in tripsByOrigin.values():
+                for num in nums:
+                    results[num] = BatchResult(trips[num], "UNKNOWN_AIRPORT")
+            continue
+
+        try:
+            airport = AwaitAirport(airportCode, TSAairportDict, pendingTSA[airportCode], tsaDeadline)
+        except UpstreamUnavailable, e:
+            for nums in tripsByOrigin.values():
+                for num in nums:
+                    results[num] = BatchResult(trips[num], "TSA_UNAVAILABLE")
+            continue
+
+        for departure, chunk, pending in pendingDistance[airportCode]:
+            try:
+                matrix = AwaitUpstream("google", pending, googleDeadline)
+            except UpstreamUnavailable, e:
+                matrix = None
+
+            for row, origin in enumerate(chunk):
+                distance = None
+                if matrix is None:
+                    try:
+                        distance = DegradedDistance(origin, airportCode, key, units)
+                        status = "OK"
+                    except UpstreamUnavailable, e:
+                        status = "DISTANCE_UNAVAILABLE"
+                elif matrix.status != "OK":
+                    status = "DISTANCE_UNAVAILABLE"
+                else:
+                    # e.g. ZERO_RESULTS when there's no route, or NOT_FOUND when the origin couldn't be found
+                    status = matrix.element(row, 0).status
+                    if status == "OK":
+                        distance = GoogleDistance(origin, airportCode, key, units, matrix.cell(row, 0))
+                for num in tripsByOrigin[(departure, origin)]:
+                    if distance is None:
+                        results[num] = BatchResult(trips[num], status)
+                        continue
+                    UserTrip = Trip(origin, airportCode, key, TSAairportDict, units, airport, distance)
+                    results[num] = BatchResult(trips[num], "OK", UserTrip)
+
+    return results
+
+def BatchResult(trip, status, UserTrip=None):
+    """
+    Builds one batch result row.
+    :param trip: The trip dictionary the result is for
+    :param status: OK, or the reason no advice could be calculated
+    :param UserTrip: Trip instance, only needed when status is OK
+    :return: Returns a result dictionary with the BATCH_RESULT_FIELDS keys
+    """
+    result = dict.fromkeys(BATCH_RESULT_FIELDS)
+    result["id"] = trip["id"]
+    result["origin"] = trip["origin"]
+    result["airport"] = trip["airport"]
+    result["status"] = status
+    if UserTrip is not None:
+        arrival = trip.get("arrival")
+        total_time, total_buffer, total_traveltime = CalcTotalTime(UserTrip, trip["precheck"], trip["international"],
+                                                                   trip["checkedBags"], trip["rentalCar"], trip["pessimistic"],
+                                                                   arrival)
+        result["originAddress"] = UserTrip.distance.originAddress
+        result["destinationAddress"] = UserTrip.distance.destinationAddress
+        result["travelTime"] = total_traveltime
+        result["waitTime"], result["waitSource"] = CheckpointWaitTime(UserTrip, arrival)
+        result["buffer"] = total_buffer
+        result["totalTime"] = total_time
+        result["advice"] = LeaveTimeMessage(total_time)
+        stale = UserTrip.StaleInputs()
+        if stale:
+            result["stale"] = ",".join(sorted(stale))
+            result["waitAge"] = int(stale["waitTime"]) if stale.get("waitTime") is not None else None
+            result["travelAge"] = int(stale["travelTime"]) if "travelTime" in stale else None
+    return result
+
+def WriteBatchResults(results, fobj, fmt="csv"):
+    """
+    Writes batch results as CSV with a header row, or as JSONL with one result object per line.
+    :param results: List of result dictionaries from BatchLeaveTimes
+    :param fobj: Open file object
+    :param fmt: csv or jsonl
+    """
+    if fmt == "jsonl":
+        for result in results:
+            fobj.write(json.dumps(result, sort_keys=True) + "\n")
+    else:
+        writer = csv.DictWriter(fobj, BATCH_RESULT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(dict((k, v.encode("utf-8") if isinstance(v, unicode) else v) for k, v in result.items()))
+
+def MainBatch(argv):
+    """
+    Batch program entry point, e.g. python tsa-mashup.py batch trips.csv --key KEY --output advice.jsonl
+    :param argv: Command line arguments after "batch"
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py batch", description="Calculate departure advice for a file of trips.")
+    parser.add_argument("input", help="CSV or JSONL trip file, columns: " + ", ".join(BATCH_FIELDS))
+    parser.add_argument("--output", help="CSV or JSONL result file, defaults to standard output")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Result format, defaults to the output file extension or jsonl")
+    parser.add_argument("--key", default=os.environ.get("GOOGLE_API_KEY"), help="Google API key, defaults to $GOOGLE_API_KEY")
+    parser.add_argument("--units", default="imperial", choices=UNITS)
+    parser.add_argument("--traffic-model", choices=TRAFFIC_MODELS, help="Traffic model for trips with a departure time")
+    parser.add_argument("--metrics", nargs="?", const="-",
+                        help="Report stage timings and counters to standard error, or to this file, as JSON if it ends in .json")
+    args = parser.parse_args(argv)
+
+    if not args.key:
+        parser.error("a Google API key is required, pass --key or set GOOGLE_API_KEY")
+    if args.metrics:
+        instrumentation.enable()
+
+    inputFormat = "jsonl" if args.input.endswith(".jsonl") else "csv"
+    outputFormat = args.format
+    if outputFormat is None:
+        outputFormat = "csv" if args.output and args.output.endswith(".csv") else "jsonl"
+
+    with open(args.input, "rb") as fobj:
+        trips = LoadBatchTrips(fobj, inputFormat)
+
+    TSAairportDict = LoadTSAMetadata()
+    results = BatchLeaveTimes(trips, args.key, TSAairportDict, args.units, args.traffic_model)
+
+    if args.output:
+        with open(args.output, "wb") as fobj:
+            WriteBatchResults(results, fobj, outputFormat)
+    else:
+        WriteBatchResults(results, sys.stdout, outputFormat)
+
+    if args.metrics == "-":
+        print >> sys.stderr, FormatSnapshot(instrumentation.snapshot())
+    elif args.metrics:
+        with open(args.metrics, "wb") as fobj:
+            if args.metrics.endswith(".json"):
+                json.dump(instrumentation.snapshot(), fobj, indent=2, sort_keys=True)
+            else:
+                fobj.write(FormatSnapshot(instrumentation.snapshot()) + "\n")
+    return
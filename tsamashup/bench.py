@@ -0,0 +1,190 @@
+## IMPORT STATEMENTS
+
+# Json used for saving and comparing benchmark results
+import json
+# Time used for timing
+import time
+# Sys used for the exit status
+import sys
+# Argparse used for parsing benchmark command line options
+import argparse
+
+from tsamashup.cache import tsa_cache, distance_cache
+from tsamashup.metadata import GetTSAMetadata, TSAAirport, OpenAirportIndex, AirportMetadata
+from tsamashup.waittimes import TSAWaitTimes, WaitTimeSnapshot, WaitTimeStatsByAirport
+from tsamashup.trip import Trip, CalcBuffer
+from tsamashup.replay import StartReplay, SyntheticTSAFeed
+from tsamashup.payloads import ParseTSAWaitTimes
+
+
+## BENCHMARKS
+## Times each stage of an estimate, from loading the metadata to whole trips against the replay server, at scales
+## from one airport to every airport in apcp.xml. Results can be saved and later runs checked against them.
+
+BENCH_AIRPORT = "DCA"
+BENCH_ORIGIN = "Washington, DC"
+# Synthetic TSA feed sizes, the real feed returns 25 reports, and the feed size used for every airport at once
+BENCH_FEED_SIZES = [25, 1000, 50000]
+BENCH_ALL_AIRPORTS_FEED_SIZE = 250
+# A benchmark regresses when it takes this fraction longer than the baseline
+BENCH_TOLERANCE = 0.5
+# Fast benchmarks keep running until they've taken this many seconds, so the fastest run isn't noise
+BENCH_MIN_SECONDS = 0.2
+BENCH_MAX_RUNS = 1000
+
+def Measure(func, operations=1, repeat=3):
+    """
+    Times func, keeping the fastest run. Runs it repeat times, or more until BENCH_MIN_SECONDS have passed.
+    :param func: Function with no arguments to time
+    :param operations: Number of operations one call of func performs, for the throughput
+    :param repeat: Least number of runs
+    :return: Returns a dictionary of seconds per call, operations and operations per second
+    """
+    best = None
+    runs = 0
+    total = 0.0
+    while runs < repeat or (total < BENCH_MIN_SECONDS and runs < BENCH_MAX_RUNS):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        runs += 1
+        total += elapsed
+        if best is None or elapsed < best:
+            best = elapsed
+    return {"seconds": best, "operations": operations, "perSecond": operations / best if best > 0 else None}
+
+def ParseAllAirports():
+    """
+    :return: Returns every airport parsed from apcp.xml, the way LoadTSAMetadata does without the index
+    """
+    return dict((airport.shortcode, airport) for airport in (TSAAirport(element) for element in GetTSAMetadata().getroot()))
+
+def BenchMetadata():
+    """
+    :return: Returns the results for loading the airport metadata from the XML and from the index
+    """
+    results = {}
+    airportCount = len(ParseAllAirports())
+    results["metadata.parse"] = Measure(ParseAllAirports, airportCount)
+    results["metadata.index.one"] = Measure(lambda: OpenAirportIndex()[BENCH_AIRPORT])
+    results["metadata.index.all"] = Measure(lambda: OpenAirportIndex().values(), airportCount)
+    return results
+
+def BenchWaitTimes(TSAairportDict, feedSizes=BENCH_FEED_SIZES):
+    """
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :param feedSizes: Synthetic feed sizes to time
+    :return: Returns the results for parsing feeds and bucketing them into snapshots, and computing the statistics,
+    for one airport at each feed size and then for every airport at once
+    """
+    results = {}
+    airport = TSAairportDict[BENCH_AIRPORT]
+    for size in feedSizes:
+        TSAdump = SyntheticTSAFeed(airport, size)
+        results["snapshot.{}".format(size)] = Measure(lambda: WaitTimeSnapshot(BENCH_AIRPORT, ParseTSAWaitTimes(TSAdump)), size)
+        waitTimes = TSAWaitTimes(BENCH_AIRPORT, TSAairportDict, ParseTSAWaitTimes(TSAdump))
+
+        def stats():
+            waitTimes.AvgAllWaitTime()
+            waitTimes.WorstWaitTime()
+            waitTimes.slowestWaitTimeNow()
+            waitTimes.WaitTimePercentile(90)
+            waitTimes.WindowedAvgWaitTime()
+            waitTimes.MaxWaitTimeByCheckpoint()
+        results["stats.{}".format(size)] = Measure(stats, size)
+
+    airportCodes = sorted(TSAairportDict.keys())
+    snapshots = [WaitTimeSnapshot(airportCode, ParseTSAWaitTimes(SyntheticTSAFeed(TSAairportDict[airportCode],
+                                                                                  BENCH_ALL_AIRPORTS_FEED_SIZE)))
+                 for airportCode in airportCodes]
+    results["stats.allAirports"] = Measure(lambda: WaitTimeStatsByAirport(snapshots), len(snapshots))
+    return results
+
+def BenchTrips(TSAairportDict, airportCodes, label):
+    """
+    Times whole estimates, a Trip and its CalcBuffer per airport, against the replay server.
+    Cold runs start with empty response caches, so every trip waits on both requests, warm runs are all cache hits.
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :param airportCodes: Airports to make a trip to
+    :param label: Name of the scale, e.g. one or all
+    :return: Returns the cold and warm results
+    """
+    def trips():
+        for airportCode in airportCodes:
+            CalcBuffer(Trip(BENCH_ORIGIN, airportCode, "BENCH", TSAairportDict), False, False, False, False)
+
+    def coldTrips():
+        tsa_cache.clear()
+        distance_cache.clear()
+        trips()
+
+    return {"trip.{}.cold".format(label): Measure(coldTrips, len(airportCodes)),
+            "trip.{}.warm".format(label): Measure(trips, len(airportCodes))}
+
+def RunBenchmarks(scale="all", feedSizes=BENCH_FEED_SIZES):
+    """
+    Runs every benchmark. Trips are made against a synthetic replay server, so no real upstream is called.
+    :param scale: one for a single airport's trips, all to also make a trip to every airport
+    :param feedSizes: Synthetic feed sizes for the wait time benchmarks
+    :return: Returns a dictionary of benchmark name to result
+    """
+    TSAairportDict = AirportMetadata()
+    results = BenchMetadata()
+    results.update(BenchWaitTimes(TSAairportDict, feedSizes))
+
+    server = StartReplay(synthetic=True)
+    try:
+        results.update(BenchTrips(TSAairportDict, [BENCH_AIRPORT], "one"))
+        if scale == "all":
+            results.update(BenchTrips(TSAairportDict, sorted(TSAairportDict.keys()), "all"))
+    finally:
+        server.shutdown()
+    return results
+
+def Regressions(results, baseline, tolerance=BENCH_TOLERANCE):
+    """
+    :param results: Results from RunBenchmarks
+    :param baseline: Earlier results to compare against
+    :param tolerance: Fraction slower than the baseline that still passes
+    :return: Returns a list of (name, seconds, baseline seconds) for the benchmarks that got slower
+    """
+    slower = []
+    for name in sorted(results):
+        if name in baseline and results[name]["seconds"] > baseline[name]["seconds"] * (1 + tolerance):
+            slower.append((name, results[name]["seconds"], baseline[name]["seconds"]))
+    return slower
+
+def MainBench(argv):
+    """
+    Benchmark program entry point, e.g. python tsa-mashup.py bench --baseline bench.json
+    Exits with an error if any benchmark regressed against the baseline.
+    :param argv: Command line arguments after "bench"
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py bench", description="Time each stage of an estimate.")
+    parser.add_argument("--scale", default="all", choices=["one", "all"], help="Make trips to one airport, or to every airport too")
+    parser.add_argument("--feed-sizes", default=",".join(str(size) for size in BENCH_FEED_SIZES),
+                        help="Comma separated synthetic TSA feed sizes")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from an earlier --save to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE, help="Fraction slower than the baseline allowed")
+    args = parser.parse_args(argv)
+
+    results = RunBenchmarks(args.scale, [int(size) for size in args.feed_sizes.split(",")])
+    for name in sorted(results):
+        result = results[name]
+        print "{:<22} {:10.2f} ms {:>10} ops {:14.0f} ops/s".format(name, result["seconds"] * 1000, result["operations"],
+                                                                   result["perSecond"] or 0)
+
+    if args.save:
+        with open(args.save, "wb") as fobj:
+            json.dump(results, fobj, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, "rb") as fobj:
+            slower = Regressions(results, json.load(fobj), args.tolerance)
+        for name, seconds, baselineSeconds in slower:
+            print "Regressed: {} took {:.2f} ms, baseline {:.2f} ms".format(name, seconds * 1000, baselineSeconds * 1000)
+        if slower:
+            sys.exit("{} benchmarks regressed.".format(len(slower)))
+    return
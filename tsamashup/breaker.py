@@ -0,0 +1,94 @@
+## IMPORT STATEMENTS
+
+# Threading used for guarding the breaker state
+import threading
+# Time used for timing how long a breaker stays open
+import time
+
+
+## CIRCUIT BREAKERS
+## An upstream that keeps failing, or answering too slowly, is cut off for a while instead of tying up a thread on
+## every request. Callers fail straight away and fall back on what they already know, see trip.DegradedAirport.
+
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream whose circuit breaker is open.
+    """
+    pass
+
+class CircuitBreaker:
+    """
+    Counts an upstream's failures in a row. After failureThreshold of them the breaker opens, and every call is
+    refused with CircuitOpenError for resetTimeout seconds. Then one trial call is let through (half open): the
+    breaker closes again if it succeeds, and stays open for another resetTimeout if it fails.
+    Each call reports its outcome once, with the generation allow gave it. Opening starts a new generation, so calls
+    admitted before the breaker opened and finishing after it can't close it or keep it open, only the trial call can.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, failureThreshold=BREAKER_FAILURES, resetTimeout=BREAKER_RESET):
+        self.name = name
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openedAt = None
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failed = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        """
+        Call before each upstream call, then report how it went with success or failure.
+        Raises CircuitOpenError if the breaker is open, or half open with its trial call still running.
+        :return: Returns the call's generation, to pass to success or failure
+        """
+        with self.lock:
+            if self.state == self.OPEN and time.time() - self.openedAt >= self.resetTimeout:
+                self.state = self.HALF_OPEN
+            elif self.state != self.CLOSED:
+                self.rejected += 1
+                raise CircuitOpenError("{} circuit breaker is open".format(self.name))
+            self.calls += 1
+            return self.generation
+
+    def success(self, generation):
+        """
+        :param generation: The call's generation from allow
+        """
+        with self.lock:
+            if generation == self.generation:
+                self.state = self.CLOSED
+                self.failures = 0
+
+    def failure(self, generation):
+        """
+        :param generation: The call's generation from allow
+        """
+        with self.lock:
+            self.failed += 1
+            if generation != self.generation:
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failureThreshold):
+                self.state = self.OPEN
+                self.openedAt = time.time()
+                self.opened += 1
+                self.generation += 1
+
+    def stats(self):
+        """
+        :return: Returns a dictionary of the state, and the call, failure, refused call and opening counters
+        """
+        with self.lock:
+            return {"name": self.name, "state": self.state, "calls": self.calls, "failures": self.failed,
+                    "rejected": self.rejected, "opened": self.opened,
+                    "openFor": max(self.openedAt + self.resetTimeout - time.time(), 0) if self.state == self.OPEN else None}
@@ -0,0 +1,380 @@
+## IMPORT STATEMENTS
+
+# Requests used to pull REST API results
+import requests
+# Pickle used for reading the old cache file
+import pickle
+# Sqlite3 used for the persistent response cache
+import sqlite3
+# Threading used to give each thread its own cache connection
+import threading
+# Os used for locating the cache files
+import os
+# Time used for cache expiry
+import time
+# Collections used for the least recently used cache order
+import collections
+
+from tsamashup import DATA_DIR
+from tsamashup.geo import origin_aliases
+from tsamashup.metrics import instrumentation
+
+
+## CACHING FUNCTIONS
+## Useful to use while you're testing your code.
+
+# cached data source file names, the pickle file is the old format and is migrated into the database on first use
+cache_fname = os.path.join(DATA_DIR, "cached_results.txt")
+cache_db_fname = os.path.join(DATA_DIR, "cached_results.db")
+
+class ResponseCache:
+    """
+    Persistent URL-keyed store of REST API responses, backed by SQLite.
+    Lookups and inserts touch one row instead of rewriting the whole file, and SQLite's locking makes it safe
+    for several threads and processes to read and write at once. The database is only opened on first use.
+    Supports the same "in", [] and []= operations as the old cache dictionary.
+    """
+    def __init__(self, db_fname, legacy_fname=None):
+        self.db_fname = db_fname
+        self.legacy_fname = legacy_fname
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def connection(self):
+        """
+        Opens the database for the calling thread, creating the table and migrating the legacy pickle file the first time.
+        :return: Returns the calling thread's SQLite connection
+        """
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_fname, timeout=30)
+            conn.text_factory = unicode
+            self.local.conn = conn
+            with self.lock:
+                if not self.ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    with conn:
+                        conn.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, body TEXT NOT NULL)")
+                    if self.legacy_fname and os.path.exists(self.legacy_fname) and len(self) == 0:
+                        MigratePickleCache(self.legacy_fname, self)
+                    self.ready = True
+        return conn
+
+    def get(self, url, default=None):
+        row = self.connection().execute("SELECT body FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return default
+        return row[0]
+
+    def put(self, url, body):
+        conn = self.connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO responses (url, body) VALUES (?, ?)", (url, body))
+
+    def putMany(self, items):
+        """
+        Stores many responses in one transaction, keeping any response already stored for the same url.
+        :param items: Iterable of (url, body) pairs
+        """
+        conn = self.connection()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO responses (url, body) VALUES (?, ?)", items)
+
+    def __contains__(self, url):
+        return self.connection().execute("SELECT 1 FROM responses WHERE url = ?", (url,)).fetchone() is not None
+
+    def __getitem__(self, url):
+        body = self.get(url)
+        if body is None:
+            raise KeyError(url)
+        return body
+
+    def __setitem__(self, url, body):
+        self.put(url, body)
+
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+def MigratePickleCache(pickle_fname, cache):
+    """
+    One-shot copy of the old whole-file pickle cache into a ResponseCache. Entries that aren't url/response text pairs are skipped.
+    :param pickle_fname: File name of cached pickled responses
+    :param cache: ResponseCache to copy into
+    :return: Returns a tuple of the number of responses migrated and skipped
+    """
+    fobj = open(pickle_fname, 'rb')
+    old_cache = pickle.load(fobj)
+    fobj.close()
+    items = [(url, body) for url, body in old_cache.items() if isinstance(body, basestring) and "://" in url]
+    cache.putMany(items)
+    return (len(items), len(old_cache) - len(items))
+
+def requestURL(baseurl, params = {}):
+    """
+    Returns the full URL for the request.
+    :param baseurl: REST API root url
+    :param params: Parameters dictionary for REST API
+    :return: Returns the base url and parameters formatted as a REST API request
+    """
+    req = requests.Request(method = 'GET', url = baseurl, params = params)
+    prepped = req.prepare()
+    return prepped.url
+
+# Parameters that say who is asking rather than what is asked, left out of cache keys
+CREDENTIAL_PARAMS = ["key", "client", "signature"]
+
+def cacheKeyURL(baseurl, params = {}):
+    """
+    Returns the URL a response is cached under: the request URL with its parameters sorted and without credentials,
+    so the same request always has the same key and rotating the API key keeps the cache.
+    :param baseurl: REST API root url
+    :param params: Parameters dictionary for REST API
+    :return: Returns the cache key URL
+    """
+    return requestURL(baseurl, sorted((name, value) for name, value in params.items() if name not in CREDENTIAL_PARAMS))
+
+## RESPONSE CACHES
+## In-process caches in front of the REST APIs, each upstream with its own time to live.
+
+class PendingLoad(object):
+    """
+    One in-progress cache load that other callers can wait on.
+    """
+    __slots__ = ["done", "value", "error"]
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one in-flight call, whose result or error every caller shares.
+    Nothing is kept once the call finishes, so it only sits in front of a cache or an upstream request.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.collapsed = 0
+
+    def do(self, key, func):
+        """
+        Calls func(), unless a call for key is already in flight, in which case waits for and returns its result.
+        :param key: Hashable key, e.g. the request URL
+        :param func: Function with no arguments returning the value, may raise
+        :return: Returns func's result, raises func's error
+        """
+        with self.lock:
+            pending = self.inflight.get(key)
+            leader = pending is None
+            if leader:
+                self.calls += 1
+                pending = self.inflight[key] = PendingLoad()
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = func()
+            return pending.value
+        except Exception, e:
+            pending.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            pending.done.set()
+
+    def resetAfterFork(self):
+        """
+        Forgets the calls in flight in the parent process, for a forked child. The threads making them don't exist
+        in the child, so a caller waiting on one would wait forever.
+        """
+        self.lock = threading.Lock()
+        self.inflight = {}
+
+    def stats(self):
+        """
+        :return: Returns a dictionary of the call and collapsed call counters
+        """
+        with self.lock:
+            return {"name": self.name, "calls": self.calls, "collapsed": self.collapsed, "inflight": len(self.inflight)}
+
+class TTLCache:
+    """
+    Size-bounded, least recently used cache whose entries expire after ttl seconds.
+    For staleTTL seconds after expiry an entry is still returned, while a background thread reloads it (stale-while-revalidate).
+    Concurrent misses for the same key wait for one load instead of each calling the loader.
+    """
+    def __init__(self, name, ttl, maxEntries=1000, staleTTL=0):
+        self.name = name
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.staleTTL = staleTTL
+        self.entries = collections.OrderedDict()
+        self.refreshing = set()
+        self.flight = SingleFlight(name)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.staleHits = 0
+        self.lookupMisses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refreshErrors = 0
+
+    def get(self, key, loader, cacheable=None):
+        """
+        Returns the cached value for key, calling loader() to fill the cache on a miss.
+        :param key: Hashable cache key
+        :param loader: Function with no arguments returning the value, may raise
+        :param cacheable: Optional function deciding whether a loaded value should be kept, e.g. to skip error responses
+        :return: Returns the cached or freshly loaded value
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, storedAt = entry
+                age = time.time() - storedAt
+                if age < self.ttl:
+                    # move to the newest end of the LRU order
+                    del self.entries[key]
+                    self.entries[key] = entry
+                    self.hits += 1
+                    return value
+                if age < self.ttl + self.staleTTL:
+                    self.staleHits += 1
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        refresher = threading.Thread(target=self.refresh, args=(key, loader, cacheable))
+                        refresher.daemon = True
+                        refresher.start()
+                    return value
+
+        # a miss counts as the flight's call, a miss that waited on another caller's load as collapsed
+        return self.flight.do(key, lambda: self.load(key, loader, cacheable))
+
+    def load(self, key, loader, cacheable=None):
+        """
+        Fills the cache for one missed key, unless a load that finished just before this one already did.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                return entry[0]
+        value = loader()
+        if cacheable is None or cacheable(value):
+            self.put(key, value)
+        return value
+
+    def lookup(self, key):
+        """
+        Returns the cached value for key without loading it, for callers that load many missing keys in one request.
+        :param key: Hashable cache key
+        :return: Returns the value, or None if key isn't cached or has expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[1] >= self.ttl:
+                self.lookupMisses += 1
+                return None
+            del self.entries[key]
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def lastKnown(self, key, maxAge):
+        """
+        Returns the value for key however long ago it expired, for falling back on when its upstream is unavailable.
+        Doesn't count as a hit or change the LRU order.
+        :param key: Hashable cache key
+        :param maxAge: Seconds after which a value is too old to fall back on
+        :return: Returns a tuple of the value and when it was stored, seconds since 1970, or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or time.time() - entry[1] >= maxAge:
+            return None
+        return entry
+
+    def refresh(self, key, loader, cacheable=None):
+        """
+        Reloads one stale entry in the background, keeping the stale value if the loader fails.
+        """
+        try:
+            value = loader()
+            if cacheable is not None and not cacheable(value):
+                raise ValueError("uncacheable response")
+            self.put(key, value)
+            with self.lock:
+                self.refreshes += 1
+        except Exception, e:
+            with self.lock:
+                self.refreshErrors += 1
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                del self.entries[key]
+            self.entries[key] = (value, time.time())
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def resetAfterFork(self):
+        """
+        Forgets the loads and background refreshes in flight in the parent process, for a forked child, see
+        SingleFlight.resetAfterFork. The cached entries are kept.
+        """
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.flight.resetAfterFork()
+
+    def stats(self):
+        """
+        :return: Returns a dictionary of the hit, miss and eviction counters
+        """
+        flight = self.flight.stats()
+        with self.lock:
+            return {"name": self.name, "size": len(self.entries), "hits": self.hits, "staleHits": self.staleHits,
+                    "misses": flight["calls"] + self.lookupMisses, "coalesced": flight["collapsed"], "evictions": self.evictions,
+                    "refreshes": self.refreshes, "refreshErrors": self.refreshErrors}
+
+# TSA wait times go stale within minutes, travel times can be reused within the same departure time bucket.
+# The distance cache is the travel time matrix: one entry per (origin cell, destination, units, departure bucket,
+# traffic model), so any matrix request can be assembled from the cells other requests already paid for.
+TSA_CACHE_TTL = 120
+TSA_CACHE_STALE_TTL = 180
+DISTANCE_CACHE_TTL = 1800
+DISTANCE_DEPARTURE_BUCKET = 900
+# While an upstream is unavailable, estimates fall back on wait times up to LAST_KNOWN_WAIT_AGE seconds old and
+# travel times up to LAST_KNOWN_TRAVEL_AGE seconds old. The last travel times are kept by origin cell, destination
+# and units, whatever the departure time they were looked up for.
+LAST_KNOWN_WAIT_AGE = 6 * 3600
+LAST_KNOWN_TRAVEL_AGE = 7 * 86400
+
+tsa_cache = TTLCache("tsa", TSA_CACHE_TTL, 500, TSA_CACHE_STALE_TTL)
+distance_cache = TTLCache("google", DISTANCE_CACHE_TTL, 20000)
+last_travel_times = TTLCache("google.lastKnown", LAST_KNOWN_TRAVEL_AGE, 20000)
+
+def CacheStats():
+    """
+    :return: Returns the counters of every upstream response cache, and of the origin alias table
+    """
+    return [tsa_cache.stats(), distance_cache.stats(), last_travel_times.stats(), origin_aliases.stats()]
+
+instrumentation.addSource("caches", CacheStats)
@@ -0,0 +1,279 @@
+## IMPORT STATEMENTS
+
+# Os, sys, time and subprocess used for the command line and the import time check
+import os
+import sys
+import time
+import subprocess
+
+from tsamashup.cache import MigratePickleCache, ResponseCache, cache_fname, cache_db_fname
+from tsamashup.metadata import LoadTSAMetadata, BuildAirportIndex, MetadataError, airport_fname, airport_index_fname
+from tsamashup.upstream import UpstreamUnavailable, UPSTREAM_DESCRIPTIONS
+from tsamashup.trip import Trip, CalcTotalTime, LeaveTimeMessage
+# Each command's module is imported by main when that command runs, so a run only loads what it uses
+
+
+## GETUSERINPUT FUNCTION
+
+def GetUserInput():
+    """
+    Requests trip variables from user.
+    :return: Returns user responses (destination shortcode, departure address, has TSA precheck, international flight, checkedBags, returning a rentalCar)
+    """
+    while True:
+        trip_destination = raw_input("Enter your destination airport shortcode (3 letters): \n>>")
+        if len(trip_destination) == 3:
+            break
+        else:
+            print "The shortcode must be 3 letters, please try again."
+
+    trip_departure = raw_input("Enter your departure address: \n>>")
+
+    while True:
+        tmp_input = raw_input("Do you have TSA Precheck? (Enter y/n): \n>>")
+        if (tmp_input.upper() == "Y"):
+            trip_precheck = True
+            break
+        elif (tmp_input.upper() == "N"):
+            trip_precheck = False
+            break
+        else:
+            print "Please enter 'y' or 'n'."
+
+    while True:
+        tmp_input = raw_input("Is this an international flight? (Enter y/n): \n>>")
+        if (tmp_input.upper() == "Y"):
+            trip_international = True
+            break
+        elif (tmp_input.upper() == "N"):
+            trip_international = False
+            break
+        else:
+            print "Please enter 'y' or 'n'."
+
+    while True:
+        tmp_input = raw_input("Will you be checking bags? (Enter y/n): \n>>")
+        if (tmp_input.upper() == "Y"):
+            trip_checkedBags = True
+            break
+        elif (tmp_input.upper() == "N"):
+            trip_checkedBags = False
+            break
+        else:
+            print "Please enter 'y' or 'n'."
+
+    while True:
+        tmp_input = raw_input("Will you be returning a rental car? (Enter y/n): \n>>")
+        if (tmp_input.upper() == "Y"):
+            trip_rentalCar = True
+            break
+        elif (tmp_input.upper() == "N"):
+            trip_rentalCar = False
+            break
+        else:
+            print "Please enter 'y' or 'n'."
+
+    while True:
+        tmp_input = raw_input("Are you a pessimist? (Enter y/n): \n>>")
+        if (tmp_input.upper() == "Y"):
+            trip_pessimistic = True
+            break
+        elif (tmp_input.upper() == "N"):
+            trip_pessimistic = False
+            break
+        else:
+            print "Please enter 'y' or 'n'."
+
+    return (trip_destination, trip_departure, trip_precheck, trip_international, trip_checkedBags, trip_rentalCar, trip_pessimistic)
+
+
+## MAIN PROGRAM LOOP
+
+def Main1():
+    """
+    Central program loop.
+    :return: end of program
+    """
+    # Set the Google Distance Matrix API Key
+    google_key = None  # paste your Google API key here
+    if not google_key:
+        google_key = raw_input(
+            "Enter your Google API key, or paste it in the .py file to avoid this prompt in the future: \n>>")
+
+    # Load the TSA Airport Metadata into a dictionary
+    TSAairportDict = LoadTSAMetadata()
+
+    # Uncomment to set values without going through interface raw_input requests for testing
+    # trip_destination = "DCA"
+    # trip_departure = "Washington,DC"
+    # trip_precheck = True
+    # trip_international = False
+    # trip_checkedBags = False
+    # trip_rentalCar = False
+    # trip_pessimistic = True
+
+    print "\n*********\n"
+
+    print "Welcome to flightCALC"
+    print "This program calculates when you should leave to catch your flight based on real-time conditions."
+
+    print "\n*********\n"
+
+    # Comment out below to request values from user rather than using preset values above, for testing
+    trip_destination, trip_departure, trip_precheck, trip_international, trip_checkedBags, trip_rentalCar, trip_pessimistic = GetUserInput()
+
+    print "\n*********\n"
+
+    # Create a trip instance
+    try:
+        UserTrip = Trip(trip_departure, trip_destination, google_key, TSAairportDict)
+    except KeyError, e:
+        print "The entered airport shortcode does not exist. Please try again."
+        return
+    except UpstreamUnavailable, e:
+        print "Error: Unable to load {}. Please try again.".format(UPSTREAM_DESCRIPTIONS[e.upstream])
+        return
+    if UserTrip.distance.elementStatus == "ZERO_RESULTS":
+        print "There is no route from the entered origin to the airport. Please try again."
+        return
+    elif UserTrip.distance.elementStatus != "OK":
+        print "The entered origin or destination does not exist. Please try again."
+        return
+
+    # Set total buffer time based on user variables
+    total_time, total_buffer, total_traveltime = CalcTotalTime(UserTrip, trip_precheck, trip_international,
+                                                               trip_checkedBags, trip_rentalCar, trip_pessimistic)
+
+    print "Departing from:", UserTrip.origin
+    print "Going to:", UserTrip.airport.name
+    print "\n"
+
+    # Set response based on total time accrued
+    print LeaveTimeMessage(total_time)
+
+    # Print additional information
+    print "\n"
+    print "This estimate was calculated based on current traffic conditions and TSA checkpoint wait times."
+    stale = UserTrip.StaleInputs()
+    if "waitTime" in stale:
+        if stale["waitTime"] is None:
+            print "TSA is unavailable, so the checkpoint wait time is the one predicted for now."
+        else:
+            print "TSA is unavailable, so the checkpoint wait times are from", int(stale["waitTime"]) / 60, "minutes ago."
+    if "travelTime" in stale:
+        print "Google is unavailable, so the travel time is from", int(stale["travelTime"]) / 60, "minutes ago."
+    print "Travel time:", UserTrip.distance.durationValue / 60, "minutes."
+    print "Checkpoint wait time:", UserTrip.airport.checkpoints.slowestWaitTimeNow() / 60, "minutes."
+    print "Average wait time:", UserTrip.airport.checkpoints.AvgAllWaitTime() / 60, "minutes."
+    worstWaitDate, worstWaitTot  = UserTrip.airport.checkpoints.WorstWaitTime()
+    print "Slowest wait time reported:", int(worstWaitTot) / 60, "minutes, at", worstWaitDate
+    print "Buffer time:", total_buffer / 60, "minutes."
+    print "\n"
+    print UserTrip.distance
+
+    print "\n*********\n"
+
+    return
+
+## COMMAND LINE ENTRY POINT
+
+# Most wall clock milliseconds importing each module may take in a fresh interpreter, checked by the import-time command
+IMPORT_TIME_BUDGET = {"tsamashup": 10, "tsamashup.trip": 200, "tsamashup.cli": 250}
+
+def MeasureImportTimes(runs=9):
+    """
+    Times importing each IMPORT_TIME_BUDGET module in a fresh interpreter, less the time an empty interpreter takes.
+    :param runs: Number of runs per module, the median run counts so one slow or lucky run doesn't decide the result
+    :return: Returns a dictionary of module name to import time in milliseconds
+    """
+    codeDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def median(code):
+        times = []
+        for run in range(runs):
+            start = time.time()
+            subprocess.check_call([sys.executable, "-c", code], cwd=codeDir)
+            times.append((time.time() - start) * 1000)
+        return sorted(times)[len(times) // 2]
+
+    baseline = median("pass")
+    return dict((module, median("import " + module) - baseline) for module in IMPORT_TIME_BUDGET)
+
+def MainImportTime():
+    """
+    Prints each module's import time against its budget, exiting with an error if any is over budget.
+    :return: end of program
+    """
+    times = MeasureImportTimes()
+    overBudget = False
+    for module in sorted(times):
+        print "{:<16} {:7.1f} ms  (budget {} ms)".format(module, times[module], IMPORT_TIME_BUDGET[module])
+        if times[module] > IMPORT_TIME_BUDGET[module]:
+            overBudget = True
+    if overBudget:
+        sys.exit("Import time over budget.")
+    return
+
+def main(argv=None):
+    """
+    Command line entry point. Runs the interactive program, or the batch, compare, serve, collect, train-model,
+    build-index, refresh-metadata, migrate-cache, import-time, report, record, replay or bench command named by the
+    first argument. Exits with an error if the TSA metadata can't be loaded.
+    :param argv: Command line arguments, defaults to sys.argv[1:]
+    :return: end of program
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        RunCommand(argv)
+    except MetadataError, e:
+        sys.exit("Error: " + str(e))
+    return
+
+def RunCommand(argv):
+    """
+    Runs the command named by the first argument, see main.
+    :param argv: Command line arguments
+    :return: end of program
+    """
+    command = argv[0] if argv else None
+
+    if command == "batch":
+        from tsamashup.batch import MainBatch
+        MainBatch(argv[1:])
+    elif command == "compare":
+        from tsamashup.compare import MainCompare
+        MainCompare(argv[1:])
+    elif command == "serve":
+        from tsamashup.server import MainServe
+        MainServe(argv[1:])
+    elif command == "collect":
+        from tsamashup.history import MainCollect
+        MainCollect(argv[1:])
+    elif command == "train-model":
+        from tsamashup.forecast import MainTrainModel
+        MainTrainModel(argv[1:])
+    elif command == "build-index":
+        print "Indexed {} airports into {}.".format(BuildAirportIndex(airport_fname, airport_index_fname), airport_index_fname)
+    elif command == "migrate-cache":
+        print "Migrated {} cached responses, skipped {}.".format(*MigratePickleCache(cache_fname, ResponseCache(cache_db_fname)))
+    elif command == "refresh-metadata":
+        from tsamashup.refresh import MainRefreshMetadata
+        MainRefreshMetadata(argv[1:])
+    elif command == "import-time":
+        MainImportTime()
+    elif command == "report":
+        from tsamashup.report import MainReport
+        MainReport(argv[1:])
+    elif command == "record":
+        from tsamashup.replay import MainRecord
+        MainRecord(argv[1:], main)
+    elif command == "replay":
+        from tsamashup.replay import MainReplay
+        MainReplay(argv[1:], main)
+    elif command == "bench":
+        from tsamashup.bench import MainBench
+        MainBench(argv[1:])
+    else:
+        Main1()
+    return
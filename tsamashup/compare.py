@@ -0,0 +1,211 @@
+## IMPORT STATEMENTS
+
+# Math used for great circle distances
+import math
+# Os and sys used for the API key environment variable and standard output
+import os
+import sys
+# Argparse used for parsing comparison mode command line options
+import argparse
+
+from tsamashup.upstream import FetchAsync, FetchDistanceMatrix, FetchGeocode, AwaitUpstream, UpstreamDeadline
+from tsamashup.upstream import UpstreamUnavailable, TRAFFIC_MODELS, UNITS, IsValidPlace
+from tsamashup.history import StoredTSAWaitTimes
+from tsamashup.metadata import LoadTSAMetadata
+from tsamashup.geo import ParseCoordinates
+from tsamashup.trip import GoogleDistance, Trip, AwaitAirport, DegradedDistance
+from tsamashup.batch import BatchResult, WriteBatchResults
+from tsamashup.forecast import ParseArrivalTime
+
+
+## AIRPORT COMPARISON MODE
+## Ranks the airports near one origin by total time, e.g. DCA, IAD and BWI for Washington, DC.
+
+# Default search radius in miles, the grid cell size in degrees, and the most destinations Google accepts per request
+DEFAULT_COMPARE_RADIUS = 60
+AIRPORT_GRID_CELL = 1.0
+MAX_MATRIX_DESTINATIONS = 25
+EARTH_RADIUS_MILES = 3958.8
+
+def GreatCircleMiles(lat1, lon1, lat2, lon2):
+    """
+    :return: Returns the great circle (haversine) distance between two coordinates, in miles
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+class AirportGrid:
+    """
+    Spatial index of the airport metadata coordinates: airports are bucketed into cells of AIRPORT_GRID_CELL degrees,
+    so a radius search only checks the airports in the cells the radius overlaps. Longitude cells wrap around at the
+    antimeridian, so a search near it also checks the cells across it, e.g. from the western Aleutians.
+    """
+    def __init__(self, TSAairportDict, cellSize=AIRPORT_GRID_CELL):
+        self.cellSize = cellSize
+        self.lonCells = int(math.ceil(360.0 / cellSize))
+        self.cells = {}
+        for airport in TSAairportDict.values():
+            self.cells.setdefault(self.cell(airport.latitude, airport.longitude), []).append(
+                (airport.shortcode, airport.latitude, airport.longitude))
+
+    def cell(self, lat, lon):
+        return (int(math.floor(lat / self.cellSize)), int(math.floor(lon / self.cellSize)) % self.lonCells)
+
+    def nearby(self, lat, lon, radius):
+        """
+        Finds the airports within radius miles of a coordinate.
+        :param lat: Latitude of the search center
+        :param lon: Longitude of the search center
+        :param radius: Search radius in miles
+        :return: Returns a list of (miles, shortcode) tuples, nearest first
+        """
+        # the latitudes and longitudes the circle spans, every longitude when it reaches over a pole
+        angle = radius / EARTH_RADIUS_MILES
+        latDegrees = math.degrees(angle)
+        if angle < math.pi / 2 and math.sin(angle) < math.cos(math.radians(lat)):
+            lonDegrees = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+            lowLon = int(math.floor((lon - lonDegrees) / self.cellSize))
+            highLon = int(math.floor((lon + lonDegrees) / self.cellSize))
+            lonCells = set(lonCell % self.lonCells for lonCell in range(lowLon, min(highLon, lowLon + self.lonCells - 1) + 1))
+        else:
+            lonCells = range(self.lonCells)
+        found = []
+        for latCell in range(self.cell(lat - latDegrees, lon)[0], self.cell(lat + latDegrees, lon)[0] + 1):
+            for lonCell in lonCells:
+                for shortcode, airportLat, airportLon in self.cells.get((latCell, lonCell), []):
+                    miles = GreatCircleMiles(lat, lon, airportLat, airportLon)
+                    if miles <= radius:
+                        found.append((miles, shortcode))
+        return sorted(found)
+
+def SearchCenter(origin, key, TSAairportDict, near=None):
+    """
+    Works out where to look for airports: near, otherwise the origin, geocoded by Google when it's an address.
+    Raises ValueError if near isn't an airport shortcode or coordinates, or Google can't find the origin, and
+    UpstreamUnavailable if Google can't be loaded.
+    :param origin: Where the trip to the airport starts
+    :param key: Google API key
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :param near: Optional search center, an airport shortcode or "latitude,longitude"
+    :return: Returns the (latitude, longitude) of the search center
+    """
+    if near:
+        center = ParseCoordinates(near)
+        if center is None and near.upper() in TSAairportDict:
+            airport = TSAairportDict[near.upper()]
+            center = (airport.latitude, airport.longitude)
+        if center is None:
+            raise ValueError("Search center must be an airport shortcode or latitude,longitude: {}".format(near))
+        return center
+    center = ParseCoordinates(origin)
+    if center is not None:
+        return center
+    geocode = AwaitUpstream("google", FetchAsync("google", FetchGeocode, origin, key), UpstreamDeadline("google"))
+    if geocode.status != "OK":
+        raise ValueError("Google couldn't find the origin {}: {}".format(origin, geocode.status))
+    return (geocode.latitude, geocode.longitude)
+
+def CompareAirports(origin, key, TSAairportDict, trip_precheck=False, trip_international=False, trip_checkedBags=False,
+                    trip_rentalCar=False, trip_pessimistic=False, near=None, radius=DEFAULT_COMPARE_RADIUS,
+                    units="imperial", grid=None, departure=None, traffic_model=None):
+    """
+    Ranks the airports around an origin by total door-to-gate time (travel time plus CalcBuffer).
+    Candidates come from the airport grid, their travel times from one multi-destination Distance Matrix request,
+    and their TSA wait times from concurrent requests. When TSA or Google is unavailable, airports fall back on the
+    wait times and travel times last known, see DegradedAirport. Raises ValueError for an origin that isn't one place
+    or a search center that can't be found, and UpstreamUnavailable if Google can't geocode the origin, see SearchCenter.
+    :param origin: Where the trip to the airport starts
+    :param key: Google API key
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :param near: Search center, an airport shortcode or "latitude,longitude". Defaults to the origin, see SearchCenter.
+    :param radius: Search radius in miles
+    :param grid: Optional AirportGrid to reuse between calls
+    :param departure: Optional datetime when the trip starts, on the nearest airport's local clock
+    :param traffic_model: Optional traffic model from TRAFFIC_MODELS, only used with a departure
+    :return: Returns a list of result dictionaries with the BATCH_RESULT_FIELDS keys, fastest first, then airports without a time
+    """
+    if not IsValidPlace(origin):
+        raise ValueError("Origin must be a single place: {!r}".format(origin))
+    center = SearchCenter(origin, key, TSAairportDict, near)
+
+    if grid is None:
+        grid = AirportGrid(TSAairportDict)
+    candidates = [shortcode for miles, shortcode in grid.nearby(center[0], center[1], radius)][:MAX_MATRIX_DESTINATIONS]
+    if not candidates:
+        return []
+
+    pendingTSA = dict((airportCode, FetchAsync("tsa", StoredTSAWaitTimes, airportCode)) for airportCode in candidates)
+    departure_time = TSAairportDict[candidates[0]].utcEpoch(departure) if departure is not None else None
+    pendingDistance = FetchAsync("google", FetchDistanceMatrix, [origin], candidates, key, units, departure_time, traffic_model)
+    tsaDeadline = UpstreamDeadline("tsa", len(pendingTSA))
+
+    trips = [{"id": airportCode, "origin": origin, "airport": airportCode, "precheck": trip_precheck,
+              "international": trip_international, "checkedBags": trip_checkedBags, "rentalCar": trip_rentalCar,
+              "pessimistic": trip_pessimistic} for airportCode in candidates]
+    try:
+        matrix = AwaitUpstream("google", pendingDistance, UpstreamDeadline("google"))
+    except UpstreamUnavailable, e:
+        matrix = None
+    if matrix is not None and matrix.status != "OK":
+        return [BatchResult(trip, "DISTANCE_UNAVAILABLE") for trip in trips]
+
+    results = []
+    for col, trip in enumerate(trips):
+        airportCode = trip["airport"]
+        if matrix is None:
+            try:
+                distance = DegradedDistance(origin, airportCode, key, units)
+            except UpstreamUnavailable, e:
+                results.append(BatchResult(trip, "DISTANCE_UNAVAILABLE"))
+                continue
+        elif matrix.element(0, col).status != "OK":
+            results.append(BatchResult(trip, matrix.element(0, col).status))
+            continue
+        else:
+            distance = GoogleDistance(origin, airportCode, key, units, matrix.cell(0, col))
+        try:
+            airport = AwaitAirport(airportCode, TSAairportDict, pendingTSA[airportCode], tsaDeadline)
+        except UpstreamUnavailable, e:
+            results.append(BatchResult(trip, "TSA_UNAVAILABLE"))
+            continue
+        results.append(BatchResult(trip, "OK", Trip(origin, airportCode, key, TSAairportDict, units, airport, distance)))
+
+    results.sort(key=lambda result: (result["totalTime"] is None, result["totalTime"]))
+    return results
+
+def MainCompare(argv):
+    """
+    Comparison program entry point, e.g. python tsa-mashup.py compare "Washington, DC" --near DCA --radius 50 --key KEY
+    :param argv: Command line arguments after "compare"
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py compare", description="Rank the airports near an origin by total time.")
+    parser.add_argument("origin", help="Departure address, or latitude,longitude")
+    parser.add_argument("--near", help="Search center, an airport shortcode or latitude,longitude. Defaults to the origin.")
+    parser.add_argument("--radius", type=float, default=DEFAULT_COMPARE_RADIUS, help="Search radius in miles")
+    parser.add_argument("--key", default=os.environ.get("GOOGLE_API_KEY"), help="Google API key, defaults to $GOOGLE_API_KEY")
+    parser.add_argument("--units", default="imperial", choices=UNITS)
+    parser.add_argument("--format", default="jsonl", choices=["csv", "jsonl"])
+    parser.add_argument("--departure", help="When the trip starts, local time, e.g. 2016-11-28 06:00. Defaults to now.")
+    parser.add_argument("--traffic-model", choices=TRAFFIC_MODELS, help="Traffic model, used with --departure")
+    for flag in ["precheck", "international", "checkedBags", "rentalCar", "pessimistic"]:
+        parser.add_argument("--" + flag, action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.key:
+        parser.error("a Google API key is required, pass --key or set GOOGLE_API_KEY")
+
+    TSAairportDict = LoadTSAMetadata()
+    try:
+        departure = ParseArrivalTime(args.departure) if args.departure else None
+        results = CompareAirports(args.origin, args.key, TSAairportDict, args.precheck, args.international,
+                                  args.checkedBags, args.rentalCar, args.pessimistic, args.near, args.radius, args.units,
+                                  departure=departure, traffic_model=args.traffic_model)
+    except ValueError, e:
+        parser.error(str(e))
+    except UpstreamUnavailable, e:
+        sys.exit("Error: Unable to find the search center, {}".format(e))
+    WriteBatchResults(results, sys.stdout, args.format)
+
+    return
@@ -0,0 +1,249 @@
+## IMPORT STATEMENTS
+
+# Json used for reading recorded TSA responses
+import json
+# Datetime used for parsing arrival times
+import datetime
+# Threading used for loading the shared model once
+import threading
+# Os used for locating the model file
+import os
+# Argparse used for parsing trainer command line options
+import argparse
+# Numpy, used for the hour of week wait time histograms, is imported by the functions that use it, see waittimes.py
+
+from tsamashup import DATA_DIR
+from tsamashup.waittimes import WaitTimeSnapshot, WaitIncrementsToSeconds, LocalEpoch
+from tsamashup.history import wait_time_store
+from tsamashup.payloads import ParseTSAWaitTimes
+
+
+## WAIT TIME FORECAST
+## Wait times by hour of the week, learned from stored or recorded TSA feeds, so a trip hours or days from now
+## can be planned around the wait expected when the user gets to security instead of the wait right now.
+
+wait_model_fname = os.path.join(DATA_DIR, "waitmodel.npz")
+
+HOURS_PER_WEEK = 168
+# TSA wait time increments above this are counted as this, 12 increments is two hours
+MAX_WAIT_INCREMENT = 12
+# predictions are this percentile of the wait times reported in the hour, conservative like the other estimates
+FORECAST_PERCENTILE = 80
+# hours with fewer reports borrow them from up to FORECAST_SMOOTHING_HOURS hours either side, then from the whole week
+MIN_HOUR_REPORTS = 5
+FORECAST_SMOOTHING_HOURS = 2
+
+def HourOfWeek(epochs):
+    """
+    :param epochs: Seconds since 1970 on the airport's local clock, a number or a numpy array, see LocalEpoch
+    :return: Returns the hour of the week, 0 for Monday midnight to 167 for Sunday 11 PM
+    """
+    # 1 January 1970 was a Thursday, 3 days after Monday
+    return (epochs // 3600 + 3 * 24) % HOURS_PER_WEEK
+
+def ParseArrivalTime(text):
+    """
+    :param text: Airport local time, e.g. 2016-11-28 07:30 or 2016-11-28T07:30
+    :return: Returns the datetime, raises ValueError if it isn't in either format
+    """
+    return datetime.datetime.strptime(text.strip().replace("T", " ")[:16], "%Y-%m-%d %H:%M")
+
+class WaitTimeModel:
+    """
+    Per-airport, per-checkpoint histograms of TSA wait time increments by hour of the week.
+    Each report is counted once, however many feeds it appears in. The prediction tables are rebuilt the first
+    time predict is called after new reports are added, so a lookup is a dictionary and array index, for the slowest
+    checkpoint as well as for one.
+    """
+    def __init__(self, pct=FORECAST_PERCENTILE):
+        self.pct = pct
+        self.histograms = {}
+        self.seen = set()
+        self.tables = None
+        self.lock = threading.Lock()
+
+    def add(self, airportCode, feed):
+        """
+        Counts the reports in one TSA Wait Times API response, or one stored history dump.
+        :param airportCode: 3-letter shortcode of airport
+        :param feed: TSAWaitTimesFeed from TSA Wait Times API or the wait time store
+        :return: Returns the number of reports not counted before
+        """
+        import numpy
+        snapshot = WaitTimeSnapshot(airportCode, feed)
+        fresh = numpy.array([(airportCode, chk, epoch) not in self.seen for chk, epoch
+                             in zip(snapshot.checkpointArray.tolist(), snapshot.epochArray.tolist())], dtype=bool)
+        if not fresh.any():
+            return 0
+        checkpoints = snapshot.checkpointArray[fresh]
+        hours = HourOfWeek(snapshot.epochArray[fresh])
+        waits = numpy.minimum(snapshot.waitArray[fresh], MAX_WAIT_INCREMENT)
+
+        with self.lock:
+            self.seen.update(zip([airportCode] * checkpoints.size, checkpoints.tolist(), snapshot.epochArray[fresh].tolist()))
+            for chk in numpy.unique(checkpoints).tolist():
+                histogram = self.histograms.get((airportCode, chk))
+                if histogram is None:
+                    histogram = self.histograms[(airportCode, chk)] = numpy.zeros((HOURS_PER_WEEK, MAX_WAIT_INCREMENT + 1), dtype=numpy.int64)
+                mask = checkpoints == chk
+                numpy.add.at(histogram, (hours[mask], waits[mask]), 1)
+            self.tables = None
+        return int(fresh.sum())
+
+    def addStore(self, store=None):
+        """
+        Counts every report kept in a wait time store.
+        :param store: WaitTimeStore to read, defaults to the shared store
+        :return: Returns the number of reports not counted before
+        """
+        if store is None:
+            store = wait_time_store
+        return sum(self.add(airportCode, store.dump(airportCode, store.retention)) for airportCode in store.airports())
+
+    def addRecorded(self, fobj):
+        """
+        Counts the reports in a file of recorded TSA responses, one JSON object per line: the response with an
+        added airport field, e.g. {"airport": "DCA", "WaitTimes": [...]}. Lines without an airport are skipped, and
+        raise PayloadError if they aren't shaped like a TSA response.
+        :param fobj: Open file object
+        :return: Returns the number of reports not counted before
+        """
+        added = 0
+        for line in fobj:
+            if not line.strip():
+                continue
+            recorded = json.loads(line)
+            if recorded.get("airport"):
+                added += self.add(recorded["airport"].upper(), ParseTSAWaitTimes(recorded))
+        return added
+
+    def build(self):
+        """
+        Turns each histogram into a table of the predicted wait time increment for each hour of the week, and adds a
+        table of each airport's slowest checkpoint, keyed by (airportCode, None).
+        """
+        import numpy
+        target = self.pct / 100.0
+        tables = {}
+        for key, histogram in self.histograms.items():
+            # widen sparse hours to their neighbouring hours, then to the whole week
+            pooled = histogram.copy()
+            sparse = histogram.sum(axis=1) < MIN_HOUR_REPORTS
+            window = histogram.copy()
+            for width in range(1, FORECAST_SMOOTHING_HOURS + 1):
+                window = window + numpy.roll(histogram, width, axis=0) + numpy.roll(histogram, -width, axis=0)
+                widened = sparse & (window.sum(axis=1) >= MIN_HOUR_REPORTS)
+                pooled[widened] = window[widened]
+                sparse &= ~widened
+            pooled[sparse] = histogram.sum(axis=0)
+
+            # the smallest increment with at least pct of the hour's reports at or below it
+            cumulative = pooled.cumsum(axis=1)
+            needed = numpy.maximum(numpy.ceil(cumulative[:, -1] * target), 1)
+            tables[key] = (cumulative < needed[:, None]).sum(axis=1)
+
+        for (airportCode, chk), table in tables.items():
+            slowest = tables.get((airportCode, None))
+            tables[(airportCode, None)] = table if slowest is None else numpy.maximum(slowest, table)
+        self.tables = tables
+
+    def predict(self, airportCode, checkpoint, arrival_time):
+        """
+        Predicts the wait time at a checkpoint for someone getting to security at arrival_time.
+        :param airportCode: 3-letter shortcode of airport
+        :param checkpoint: The Security Checkpoint ID, or None for the slowest checkpoint
+        :param arrival_time: Datetime in the airport's local time
+        :return: Returns the predicted wait time in seconds, or None if there is no history for it
+        """
+        tables = self.tables
+        if tables is None:
+            with self.lock:
+                if self.tables is None:
+                    self.build()
+                tables = self.tables
+        table = tables.get((airportCode, checkpoint))
+        if table is None:
+            return None
+        return WaitIncrementsToSeconds(table[HourOfWeek(LocalEpoch(arrival_time))])
+
+    def checkpoints(self, airportCode):
+        """
+        :param airportCode: 3-letter shortcode of airport
+        :return: Returns the sorted Security Checkpoint IDs the model has history for
+        """
+        return sorted(chk for tableAirport, chk in self.histograms.keys() if tableAirport == airportCode)
+
+    def save(self, fname):
+        """
+        Writes the histograms to a compressed numpy file, replacing it only once it is complete.
+        """
+        import numpy
+        temp_fname = fname + ".tmp"
+        with open(temp_fname, "wb") as fobj:
+            numpy.savez_compressed(fobj, **dict(("{}_{}".format(airportCode, chk), histogram)
+                                                for (airportCode, chk), histogram in self.histograms.items()))
+        os.rename(temp_fname, fname)
+
+def LoadWaitTimeModel(fname, pct=FORECAST_PERCENTILE):
+    """
+    :param fname: File written by WaitTimeModel.save
+    :param pct: Percentile to predict
+    :return: Returns a WaitTimeModel with the saved histograms
+    """
+    import numpy
+    model = WaitTimeModel(pct)
+    with numpy.load(fname) as saved:
+        for name in saved.files:
+            airportCode, chk = name.rsplit("_", 1)
+            model.histograms[(airportCode, int(chk))] = saved[name]
+    return model
+
+# The shared model as a (file stamp, WaitTimeModel) tuple, loaded by ForecastModel on first use
+loaded_model = []
+model_lock = threading.Lock()
+
+def ForecastModel():
+    """
+    Returns the process-wide wait time model, loading it from waitmodel.npz the first time it's needed, and again
+    whenever train-model replaces the file, so a long-running server picks up a retrained model.
+    :return: Returns the WaitTimeModel, or None if no model has been trained
+    """
+    try:
+        stat = os.stat(wait_model_fname)
+    except OSError:
+        return None
+    # save renames a new file into place, so a retrained model has a new inode even within the same mtime
+    stamp = (stat.st_mtime, stat.st_ino, stat.st_size)
+    loaded = loaded_model[0] if loaded_model else None
+    if loaded is None or loaded[0] != stamp:
+        with model_lock:
+            if not loaded_model or loaded_model[0][0] != stamp:
+                loaded_model[:] = [(stamp, LoadWaitTimeModel(wait_model_fname))]
+            loaded = loaded_model[0]
+    return loaded[1]
+
+def MainTrainModel(argv):
+    """
+    Trainer program entry point, e.g. python tsa-mashup.py train-model --store recorded.jsonl
+    :param argv: Command line arguments after "train-model"
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py train-model", description="Train the wait time forecast.")
+    parser.add_argument("recorded", nargs="*", help="JSONL files of recorded TSA responses with an airport field")
+    parser.add_argument("--store", action="store_true", help="Also train on every report in the wait time store")
+    parser.add_argument("--output", default=wait_model_fname, help="Model file, defaults to " + wait_model_fname)
+    args = parser.parse_args(argv)
+
+    if not args.recorded and not args.store:
+        parser.error("pass recorded response files, --store, or both")
+
+    model = WaitTimeModel()
+    reports = 0
+    if args.store:
+        reports += model.addStore()
+    for fname in args.recorded:
+        with open(fname, "rb") as fobj:
+            reports += model.addRecorded(fobj)
+    model.save(args.output)
+    print "Trained on {} reports for {} checkpoints, saved to {}.".format(reports, len(model.histograms), args.output)
+    return
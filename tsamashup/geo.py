@@ -0,0 +1,217 @@
+## IMPORT STATEMENTS
+
+# Datetime and calendar used for converting airport local times
+import datetime
+import calendar
+# Re used for normalizing addresses
+import re
+# Threading and collections used for the bounded origin alias table
+import threading
+import collections
+
+
+## COORDINATES
+## Trip origins as cache keys: nearby coordinates share a geohash cell, so they share cached travel times.
+
+# 6 characters is a cell of about 1.2 by 0.6 km, close enough that travel times to the airport barely differ
+ORIGIN_GEOHASH_PRECISION = 6
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def ParseCoordinates(text):
+    """
+    :param text: Text that may be a "latitude,longitude" pair
+    :return: Returns a (latitude, longitude) tuple, or None if text isn't a coordinate pair
+    """
+    try:
+        lat, lon = [float(part) for part in text.split(",")]
+    except ValueError:
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return (lat, lon)
+    return None
+
+def Geohash(lat, lon, precision=ORIGIN_GEOHASH_PRECISION):
+    """
+    :param lat: Latitude
+    :param lon: Longitude
+    :param precision: Number of characters, each one narrows the cell by 5 bits
+    :return: Returns the geohash of the cell containing the coordinate
+    """
+    latRange = [-90.0, 90.0]
+    lonRange = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    # bits alternate between longitude and latitude, starting with longitude
+    evenBit = True
+    while len(chars) < precision:
+        if evenBit:
+            span, coordinate = lonRange, lon
+        else:
+            span, coordinate = latRange, lat
+        middle = (span[0] + span[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            span[0] = middle
+        else:
+            value = value * 2
+            span[1] = middle
+        evenBit = not evenBit
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+def OriginCell(origin):
+    """
+    Cache key for a trip origin: the geohash cell of a "latitude,longitude" origin, otherwise the origin's
+    location id from the alias table, see OriginAliases.
+    :param origin: Where the trip to the airport starts
+    :return: Returns the origin's cache key
+    """
+    coordinates = ParseCoordinates(origin)
+    if coordinates is not None:
+        return "geohash:" + Geohash(coordinates[0], coordinates[1])
+    return origin_aliases.locate(origin)
+
+
+## ORIGIN NORMALIZATION
+## Different spellings of one address, e.g. "Washington,DC", "washington, dc" and "Washington DC", should share
+## cached travel times. Addresses are normalized, and the address Google resolved each one to (origin_addresses
+## in a Distance Matrix response, or a geocoded address) becomes its location id, so spellings Google resolves alike
+## share one id. Geocoded locations also keep their coordinates, e.g. for finding the airports near an address.
+
+# Most spellings kept in the alias table, the least recently used are dropped first
+ORIGIN_ALIAS_ENTRIES = 10000
+# Street words shortened the way Google writes them
+ADDRESS_ABBREVIATIONS = {"street": "st", "avenue": "ave", "road": "rd", "boulevard": "blvd", "drive": "dr",
+                         "lane": "ln", "court": "ct", "place": "pl", "highway": "hwy", "parkway": "pkwy",
+                         "north": "n", "south": "s", "east": "e", "west": "w", "northeast": "ne", "northwest": "nw",
+                         "southeast": "se", "southwest": "sw", "suite": "ste"}
+
+def NormalizeOrigin(origin):
+    """
+    :param origin: Address, e.g. "Washington, D.C." or "1600 Pennsylvania Avenue NW, Washington, DC 20500, USA"
+    :return: Returns the address lower-cased, without punctuation, with street words abbreviated and without a
+    trailing USA, e.g. "washington dc" or "1600 pennsylvania ave nw washington dc 20500"
+    """
+    words = re.sub(r"[^\w#]+", " ", re.sub(r"[.']", "", origin.lower()), flags=re.UNICODE).split()
+    words = [ADDRESS_ABBREVIATIONS.get(word, word) for word in words]
+    if words[-2:] == ["united", "states"]:
+        words = words[:-2]
+    elif words[-1:] == ["usa"]:
+        words = words[:-1]
+    return " ".join(words)
+
+class OriginAliases:
+    """
+    Bounded, least recently used table from normalized origin spellings to location ids, and from geocoded location
+    ids to their coordinates. A spelling that hasn't been resolved yet is its own location id.
+    """
+    def __init__(self, maxEntries=ORIGIN_ALIAS_ENTRIES):
+        self.maxEntries = maxEntries
+        self.aliases = collections.OrderedDict()
+        self.coordinates = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def locate(self, origin):
+        """
+        :param origin: Where the trip to the airport starts
+        :return: Returns the origin's location id
+        """
+        spelling = NormalizeOrigin(origin)
+        with self.lock:
+            locationId = self.aliases.pop(spelling, None)
+            if locationId is None:
+                self.misses += 1
+                return spelling
+            self.aliases[spelling] = locationId
+            self.hits += 1
+            return locationId
+
+    def locateCoordinates(self, origin):
+        """
+        :param origin: Where the trip to the airport starts
+        :return: Returns the (latitude, longitude) the origin's location was geocoded to, or None if it hasn't been
+        """
+        locationId = self.locate(origin)
+        with self.lock:
+            coordinates = self.coordinates.pop(locationId, None)
+            if coordinates is not None:
+                self.coordinates[locationId] = coordinates
+            return coordinates
+
+    def learn(self, origin, address, coordinates=None):
+        """
+        Records the address Google resolved an origin to as the origin's location id.
+        :param origin: The origin as it was requested
+        :param address: The origin address Google returned, empty if Google couldn't resolve it
+        :param coordinates: Optional (latitude, longitude) Google geocoded the address to
+        """
+        locationId = NormalizeOrigin(address or "")
+        if not locationId:
+            return
+        with self.lock:
+            for spelling in (NormalizeOrigin(origin), locationId):
+                self.aliases.pop(spelling, None)
+                self.aliases[spelling] = locationId
+            if coordinates is not None:
+                self.coordinates.pop(locationId, None)
+                self.coordinates[locationId] = coordinates
+            while len(self.aliases) > self.maxEntries:
+                self.aliases.popitem(last=False)
+                self.evictions += 1
+            while len(self.coordinates) > self.maxEntries:
+                self.coordinates.popitem(last=False)
+
+    def stats(self):
+        """
+        :return: Returns a dictionary of the hit, miss and eviction counters
+        """
+        with self.lock:
+            return {"name": "origins", "size": len(self.aliases), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+origin_aliases = OriginAliases()
+
+
+## LOCAL TIMES
+
+def USDaylightSaving(localTime):
+    """
+    :param localTime: Datetime on the local clock
+    :return: Returns True if US daylight saving time is in effect, from 2 AM on the second Sunday in March
+    to 2 AM on the first Sunday in November
+    """
+    march = datetime.datetime(localTime.year, 3, 8, 2)
+    start = march + datetime.timedelta(days=(6 - march.weekday()) % 7)
+    november = datetime.datetime(localTime.year, 11, 1, 2)
+    end = november + datetime.timedelta(days=(6 - november.weekday()) % 7)
+    return start <= localTime < end
+
+def LocalTimeToEpoch(localTime, utc, dst):
+    """
+    :param localTime: Datetime on the local clock
+    :param utc: Standard time offset from UTC in hours, e.g. -5 for Washington, DC
+    :param dst: If the place observes US daylight saving time
+    :return: Returns seconds since 1970 UTC
+    """
+    offset = utc + 1 if dst and USDaylightSaving(localTime) else utc
+    return int(calendar.timegm(localTime.timetuple()) - offset * 3600)
+
+def EpochToLocalTime(epoch, utc, dst):
+    """
+    :param epoch: Seconds since 1970 UTC
+    :param utc: Standard time offset from UTC in hours, e.g. -5 for Washington, DC
+    :param dst: If the place observes US daylight saving time
+    :return: Returns the datetime on the local clock
+    """
+    localTime = datetime.datetime.utcfromtimestamp(epoch + utc * 3600)
+    if dst and USDaylightSaving(localTime):
+        localTime += datetime.timedelta(hours=1)
+    return localTime
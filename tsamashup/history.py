@@ -0,0 +1,289 @@
+## IMPORT STATEMENTS
+
+# Sqlite3 used for the on-disk wait time store
+import sqlite3
+# Threading used for the background poller and per-thread store connections
+import threading
+# Os used for locating the store file
+import os
+# Time and random used for scheduling polls with jitter
+import time
+import random
+# Datetime used for report times read back from the store
+import datetime
+# Collections used for the poll budget window
+import collections
+# Argparse used for parsing collector command line options
+import argparse
+
+from tsamashup import DATA_DIR
+from tsamashup.cache import tsa_cache, LAST_KNOWN_WAIT_AGE
+from tsamashup.upstream import FetchTSAWaitTimes, RequestTSAWaitTimes
+from tsamashup.waittimes import LocalEpoch
+from tsamashup.payloads import TSAWaitTimesFeed, WaitTimeRecord
+
+
+## WAIT TIME STORE
+## The TSA feed only returns the newest ~25 reports across all checkpoints, so a poller keeps appending them
+## to a store, and the statistics read a longer history from it than any single response holds.
+
+wait_time_db_fname = os.path.join(DATA_DIR, "waittimes.db")
+
+# reports older than WAIT_TIME_RETENTION seconds before an airport's newest report are dropped, and the statistics
+# read the last STORE_READ_WINDOW seconds. An airport not polled for STORE_MAX_AGE seconds is requested live instead.
+WAIT_TIME_RETENTION = 7 * 86400
+STORE_READ_WINDOW = 86400
+STORE_MAX_AGE = 900
+
+class WaitTimeStore:
+    """
+    Per-airport time series of TSA wait time reports, backed by SQLite.
+    Reports are keyed by airport, checkpoint and report time, so polling the same feed twice stores each report once.
+    Report times are epochs on the airport's local clock, see LocalEpoch. The database is only opened on first use.
+    """
+    def __init__(self, db_fname, retention=WAIT_TIME_RETENTION):
+        self.db_fname = db_fname
+        self.retention = retention
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def connection(self):
+        """
+        Opens the database for the calling thread, creating the tables the first time.
+        :return: Returns the calling thread's SQLite connection
+        """
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_fname, timeout=30)
+            conn.text_factory = unicode
+            self.local.conn = conn
+            with self.lock:
+                if not self.ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    with conn:
+                        conn.execute("CREATE TABLE IF NOT EXISTS waittimes (airport TEXT NOT NULL, checkpoint INTEGER NOT NULL, "
+                                     "epoch INTEGER NOT NULL, wait INTEGER NOT NULL, created TEXT NOT NULL, "
+                                     "PRIMARY KEY (airport, checkpoint, epoch)) WITHOUT ROWID")
+                        conn.execute("CREATE INDEX IF NOT EXISTS waittimes_time ON waittimes (airport, epoch)")
+                        conn.execute("CREATE TABLE IF NOT EXISTS polls (airport TEXT PRIMARY KEY, polledAt REAL NOT NULL)")
+                    self.ready = True
+        return conn
+
+    def append(self, airportCode, feed, polledAt=None):
+        """
+        Adds the reports in one TSA Wait Times API response, skipping reports already stored, then drops the airport's
+        reports older than the retention.
+        :param airportCode: 3-letter shortcode of airport
+        :param feed: TSAWaitTimesFeed from the TSA Wait Times API
+        :param polledAt: When the response was requested, seconds since 1970. Defaults to now.
+        :return: Returns the number of new reports
+        """
+        rows = [(airportCode, record.checkpoint, LocalEpoch(record.created), record.waitTime, record.createdText)
+                for record in feed.records]
+
+        conn = self.connection()
+        with conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO waittimes (airport, checkpoint, epoch, wait, created) VALUES (?, ?, ?, ?, ?)", rows)
+            added = conn.total_changes - before
+            conn.execute("DELETE FROM waittimes WHERE airport = ? AND epoch <= "
+                         "(SELECT MAX(epoch) FROM waittimes WHERE airport = ?) - ?", (airportCode, airportCode, self.retention))
+            conn.execute("INSERT OR REPLACE INTO polls (airport, polledAt) VALUES (?, ?)",
+                         (airportCode, time.time() if polledAt is None else polledAt))
+        return added
+
+    def dump(self, airportCode, window=STORE_READ_WINDOW):
+        """
+        Returns the airport's stored reports as a feed like a TSA Wait Times API response's, so TSAWaitTimes can read it.
+        :param airportCode: 3-letter shortcode of airport
+        :param window: Seconds of history to return, counting back from the airport's newest report
+        :return: Returns a TSAWaitTimesFeed, newest first
+        """
+        rows = self.connection().execute(
+            "SELECT checkpoint, wait, epoch, created FROM waittimes WHERE airport = ? AND epoch > "
+            "(SELECT MAX(epoch) FROM waittimes WHERE airport = ?) - ? ORDER BY epoch DESC",
+            (airportCode, airportCode, window)).fetchall()
+        # the epoch is on the airport's local clock, see LocalEpoch, so it converts back without a time zone
+        return TSAWaitTimesFeed(WaitTimeRecord(checkpoint, wait, datetime.datetime.utcfromtimestamp(epoch), created)
+                                for checkpoint, wait, epoch, created in rows)
+
+    def lastPoll(self, airportCode):
+        """
+        :param airportCode: 3-letter shortcode of airport
+        :return: Returns when the airport was last stored, seconds since 1970, or None if it never was
+        """
+        # a process that never collects shouldn't create the store just by checking it
+        if not self.ready and not os.path.exists(self.db_fname):
+            return None
+        row = self.connection().execute("SELECT polledAt FROM polls WHERE airport = ?", (airportCode,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def airports(self):
+        """
+        :return: Returns the sorted shortcodes of every airport that has been stored
+        """
+        return [row[0] for row in self.connection().execute("SELECT airport FROM polls ORDER BY airport")]
+
+    def stats(self):
+        """
+        :return: Returns a dictionary of the number of airports and reports stored
+        """
+        conn = self.connection()
+        return {"airports": conn.execute("SELECT COUNT(*) FROM polls").fetchone()[0],
+                "reports": conn.execute("SELECT COUNT(*) FROM waittimes").fetchone()[0]}
+
+wait_time_store = WaitTimeStore(wait_time_db_fname)
+
+def StoredTSAWaitTimes(airportCode, store=None, maxAge=STORE_MAX_AGE):
+    """
+    Returns an airport's wait times from the wait time store when a poller is keeping it current,
+    otherwise from the TSA response cache or a live request like FetchTSAWaitTimes. Raises on failure.
+    :param airportCode: 3-letter shortcode of airport
+    :param store: WaitTimeStore to read, defaults to the shared store
+    :param maxAge: Seconds since the last poll after which the stored history is considered out of date
+    :return: Returns the TSAWaitTimesFeed from TSA Wait Times API, or the stored history as one
+    """
+    if store is None:
+        store = wait_time_store
+    polledAt = store.lastPoll(airportCode)
+    if polledAt is not None and time.time() - polledAt < maxAge:
+        return store.dump(airportCode)
+    return FetchTSAWaitTimes(airportCode)
+
+def LastKnownTSAWaitTimes(airportCode, store=None, maxAge=LAST_KNOWN_WAIT_AGE):
+    """
+    Returns the newest wait times known for an airport without calling TSA, for when it's unavailable: the
+    stored history if the airport has been collected, or the last response in the TSA response cache.
+    :param airportCode: 3-letter shortcode of airport
+    :param store: WaitTimeStore to read, defaults to the shared store
+    :param maxAge: Seconds after which wait times are too old to use
+    :return: Returns a tuple of the wait times, as a TSAWaitTimesFeed, and when they were
+    requested, seconds since 1970, or None if there are none from the last maxAge seconds
+    """
+    if store is None:
+        store = wait_time_store
+    lastKnown = tsa_cache.lastKnown(airportCode, maxAge)
+    polledAt = store.lastPoll(airportCode)
+    if polledAt is not None and time.time() - polledAt < maxAge and (lastKnown is None or polledAt >= lastKnown[1]):
+        return (store.dump(airportCode), polledAt)
+    return lastKnown
+
+
+## WAIT TIME POLLER
+
+# each airport is polled every POLL_INTERVAL seconds, give or take POLL_JITTER of the interval,
+# with at most POLL_BUDGET requests to TSA in any hour
+POLL_INTERVAL = 300
+POLL_JITTER = 0.2
+POLL_BUDGET = 720
+
+class WaitTimePoller(threading.Thread):
+    """
+    Background thread that polls a set of airports' TSA wait times on a schedule and appends them to a WaitTimeStore.
+    The first polls are spread over one interval and every later poll is jittered, so airports don't all come due
+    at once. Polls that would go over the hourly budget wait until the budget allows them.
+    Each response also refreshes the TSA response cache.
+    """
+    def __init__(self, store, airports, interval=POLL_INTERVAL, jitter=POLL_JITTER, budget=POLL_BUDGET):
+        threading.Thread.__init__(self, name="WaitTimePoller")
+        self.daemon = True
+        self.store = store
+        self.interval = interval
+        self.jitter = jitter
+        self.budget = budget
+        now = time.time()
+        self.due = dict((airportCode, now + random.uniform(0, interval)) for airportCode in airports)
+        self.sent = collections.deque()
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.polls = 0
+        self.pollErrors = 0
+        self.deferred = 0
+        self.newReports = 0
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.pollDue()
+            self.stopped.wait(max(0, min(self.due.values() or [time.time() + self.interval]) - time.time()))
+
+    def stop(self):
+        self.stopped.set()
+
+    def pollDue(self):
+        """
+        Polls every airport that is due, oldest due first, as far as the budget allows.
+        """
+        for airportCode, dueAt in sorted(self.due.items(), key=lambda item: item[1]):
+            now = time.time()
+            if dueAt > now or self.stopped.is_set():
+                break
+            # forget requests that have left the budget's one hour window
+            while self.sent and self.sent[0] <= now - 3600:
+                self.sent.popleft()
+            if len(self.sent) >= self.budget:
+                # push the airport back to when the oldest request leaves the window
+                self.due[airportCode] = self.sent[0] + 3600
+                with self.lock:
+                    self.deferred += 1
+                continue
+            self.sent.append(now)
+            self.poll(airportCode)
+            self.due[airportCode] = time.time() + self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def poll(self, airportCode):
+        """
+        Requests one airport's wait times and stores them, counting failures instead of raising.
+        """
+        try:
+            feed = RequestTSAWaitTimes(airportCode)
+            added = self.store.append(airportCode, feed)
+            tsa_cache.put(airportCode, feed)
+        except Exception, e:
+            with self.lock:
+                self.pollErrors += 1
+            return
+        with self.lock:
+            self.polls += 1
+            self.newReports += added
+
+    def stats(self):
+        """
+        :return: Returns a dictionary of the poll, error, deferred poll and new report counters
+        """
+        with self.lock:
+            return {"airports": len(self.due), "polls": self.polls, "pollErrors": self.pollErrors,
+                    "deferred": self.deferred, "newReports": self.newReports, "budgetUsed": len(self.sent)}
+
+def ParseAirportList(text):
+    """
+    :param text: Comma separated airport shortcodes, e.g. DCA,IAD,BWI
+    :return: Returns the list of upper case shortcodes
+    """
+    return [airportCode.strip().upper() for airportCode in (text or "").split(",") if airportCode.strip()]
+
+def MainCollect(argv):
+    """
+    Collector program entry point, e.g. python tsa-mashup.py collect --airports DCA,IAD,BWI
+    :param argv: Command line arguments after "collect"
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py collect", description="Poll TSA wait times into the wait time store.")
+    parser.add_argument("--airports", required=True, help="Comma separated airport shortcodes, e.g. DCA,IAD,BWI")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Seconds between polls of each airport")
+    parser.add_argument("--jitter", type=float, default=POLL_JITTER, help="Fraction of the interval to vary each poll by")
+    parser.add_argument("--budget", type=int, default=POLL_BUDGET, help="Most TSA requests in any hour")
+    args = parser.parse_args(argv)
+
+    poller = WaitTimePoller(wait_time_store, ParseAirportList(args.airports), args.interval, args.jitter, args.budget)
+    print "Collecting wait times for {} airports into {}".format(len(poller.due), wait_time_store.db_fname)
+    poller.start()
+    try:
+        while poller.is_alive():
+            poller.join(1)
+    except KeyboardInterrupt:
+        poller.stop()
+    print "Stored {newReports} new reports from {polls} polls, {pollErrors} failed, {deferred} deferred.".format(**poller.stats())
+    return
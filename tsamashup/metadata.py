@@ -0,0 +1,368 @@
+## IMPORT STATEMENTS
+
+try:
+    # cElementTree parses TSA Metadata XML about ten times faster than the pure Python ET
+    import xml.etree.cElementTree as ET
+except ImportError:
+    # ET used for parsing TSA Metadata XML
+    import xml.etree.ElementTree as ET
+# Os used for locating the metadata files
+import os
+# Hashlib used for the TSA metadata checksum
+import hashlib
+# Struct and mmap used for reading and writing the binary airport index
+import struct
+import mmap
+# UserDict used to give the airport index the usual dictionary methods
+import UserDict
+# Collections used for the checkpoint tuples
+import collections
+# Threading used for loading the shared metadata once
+import threading
+
+from tsamashup import DATA_DIR
+from tsamashup.geo import LocalTimeToEpoch, EpochToLocalTime
+from tsamashup.metrics import Instrumented
+
+
+## TSA METADATA
+
+# TSA metadata file and its compiled index
+airport_fname = os.path.join(DATA_DIR, "apcp.xml")
+airport_index_fname = os.path.join(DATA_DIR, "apcp.idx")
+
+class MetadataError(Exception):
+    """
+    The TSA metadata file apcp.xml is missing or can't be parsed.
+    """
+
+@Instrumented
+def GetTSAMetadata():
+    """Returns the full set of metadata for airports, using the TSAAirport class, from the apcp.xml file.
+    In the future, this file should be checked against the checksum file online to ensure it's the latest update.
+    Raises MetadataError if the file is missing or can't be parsed.
+    :return: Returns the parsed XML data from the TSA metadata file
+    """
+    # In future, get from the web to make sure data is fresh
+    # http://www.tsa.gov/data/apcp.xml
+    # checksum: http://www.tsa.gov/data/apcp.checksum.xml
+    try:
+        airportTree = ET.parse(airport_fname)
+    except Exception, e:
+        raise MetadataError("The TSA Airport metadata file apcp.xml could not be loaded from the program directory ({}). "
+                            "Please upload and try again.".format(e))
+    return airportTree
+
+@Instrumented
+def LoadTSAMetadata():
+    """
+    Loads TSAAirports into an airport metadata dictionary.
+    Uses the binary airport index when possible, so airports are only built when they are looked up.
+    Raises MetadataError if apcp.xml is missing or can't be parsed.
+    :return: Returns dictionary of TSA metadata airport instances
+    """
+    try:
+        return OpenAirportIndex()
+    except EnvironmentError, e:
+        # e.g. a read-only program directory, fall back to parsing the whole file
+        pass
+
+    TSAairportTree = GetTSAMetadata()
+    TSAairportRoot = TSAairportTree.getroot()
+    TSAairportDict = {}
+    for airport in TSAairportRoot:
+        airportDict = TSAAirport(airport)
+        TSAairportDict[airportDict.shortcode] = airportDict
+    return TSAairportDict
+
+# The shared metadata dictionary, loaded by AirportMetadata on first use
+loaded_metadata = []
+metadata_lock = threading.Lock()
+
+def AirportMetadata():
+    """
+    Returns the process-wide airport metadata dictionary, loading it the first time it's needed.
+    The dictionary is only read after loading, so it can be shared between threads and requests.
+    :return: Returns dictionary of TSA metadata airport instances
+    """
+    if not loaded_metadata:
+        with metadata_lock:
+            if not loaded_metadata:
+                loaded_metadata.append(LoadTSAMetadata())
+    return loaded_metadata[0]
+
+def ReplaceAirportMetadata(TSAairportDict):
+    """
+    Swaps in a new process-wide airport metadata dictionary. Callers already holding the old one keep reading it,
+    so nothing in flight sees a half-updated dictionary.
+    :param TSAairportDict: The new dictionary of TSA metadata airport instances
+    """
+    with metadata_lock:
+        if loaded_metadata:
+            loaded_metadata[0] = TSAairportDict
+        else:
+            loaded_metadata.append(TSAairportDict)
+
+## AIRPORT INDEX
+## apcp.xml compiled into a binary file, so one airport can be looked up without parsing the whole XML.
+
+# Index layout: a header (magic, sha1 checksum of apcp.xml, airport count, and the mtime and size of the apcp.xml
+# it was built from), a table of fixed size entries sorted by shortcode (shortcode, offset, length), then each
+# airport's <airport> XML element
+AIRPORT_INDEX_MAGIC = "APCPIDX2"
+AIRPORT_INDEX_HEADER = struct.Struct("<8s20sIdQ")
+# Offset of the mtime and size in the header
+AIRPORT_INDEX_STAT = struct.Struct("<dQ")
+AIRPORT_INDEX_STAT_OFFSET = AIRPORT_INDEX_HEADER.size - AIRPORT_INDEX_STAT.size
+AIRPORT_INDEX_ENTRY = struct.Struct("<8sII")
+
+def AirportMetadataChecksum(xml_fname):
+    """
+    :param xml_fname: File name of the TSA metadata XML
+    :return: Returns the sha1 digest of the file
+    """
+    with open(xml_fname, 'rb') as fobj:
+        return hashlib.sha1(fobj.read()).digest()
+
+def AirportRecords(data):
+    """
+    :param data: TSA metadata XML document
+    :return: Returns a dictionary of shortcode to the airport's <airport> XML element, serialized
+    """
+    # later duplicates win, the same as LoadTSAMetadata's dictionary
+    records = {}
+    for airport in ET.fromstring(data):
+        records[airport.find('shortcode').text] = ET.tostring(airport)
+    return records
+
+def BuildAirportIndex(xml_fname, index_fname):
+    """
+    Compiles the TSA metadata XML into a binary airport index.
+    The index is written to a temporary file and renamed into place, so readers never see half an index.
+    :param xml_fname: File name of the TSA metadata XML
+    :param index_fname: File name of the index to write
+    :return: Returns the number of airports in the index
+    """
+    with open(xml_fname, 'rb') as fobj:
+        data = fobj.read()
+        stat = os.fstat(fobj.fileno())
+
+    records = AirportRecords(data)
+    codes = sorted(records)
+
+    table = []
+    blobs = []
+    offset = AIRPORT_INDEX_HEADER.size + AIRPORT_INDEX_ENTRY.size * len(codes)
+    for code in codes:
+        blob = records[code]
+        table.append(AIRPORT_INDEX_ENTRY.pack(code.encode("ascii"), offset, len(blob)))
+        blobs.append(blob)
+        offset += len(blob)
+
+    tmp_fname = "{}.{}.tmp".format(index_fname, os.getpid())
+    with open(tmp_fname, 'wb') as fobj:
+        fobj.write(AIRPORT_INDEX_HEADER.pack(AIRPORT_INDEX_MAGIC, hashlib.sha1(data).digest(), len(codes),
+                                             stat.st_mtime, stat.st_size))
+        fobj.write("".join(table))
+        fobj.write("".join(blobs))
+    os.rename(tmp_fname, index_fname)
+    return len(codes)
+
+class AirportIndex(UserDict.DictMixin):
+    """
+    Read-only, memory-mapped airport index that acts like the TSAairportDict dictionary.
+    Each TSAAirport is built from its XML element the first time it is looked up.
+    """
+    def __init__(self, index_fname):
+        fobj = open(index_fname, 'rb')
+        try:
+            self.mm = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            fobj.close()
+        try:
+            magic, self.checksum, self.count, self.mtime, self.size = AIRPORT_INDEX_HEADER.unpack_from(self.mm, 0)
+        except struct.error:
+            self.mm.close()
+            raise ValueError("Truncated airport index " + index_fname)
+        if magic != AIRPORT_INDEX_MAGIC:
+            self.mm.close()
+            raise ValueError("Not an airport index " + index_fname)
+        self.airports = {}
+
+    def entry(self, num):
+        code, offset, length = AIRPORT_INDEX_ENTRY.unpack_from(self.mm, AIRPORT_INDEX_HEADER.size + num * AIRPORT_INDEX_ENTRY.size)
+        return (code.rstrip("\0"), offset, length)
+
+    def find(self, airportCode):
+        """
+        Binary search of the shortcode table.
+        :param airportCode: 3-letter shortcode of airport
+        :return: Returns the (shortcode, offset, length) table entry, or None if the airport isn't in the index
+        """
+        if not isinstance(airportCode, basestring):
+            return None
+        low = 0
+        high = self.count
+        while low < high:
+            mid = (low + high) // 2
+            entry = self.entry(mid)
+            if entry[0] < airportCode:
+                low = mid + 1
+            elif entry[0] > airportCode:
+                high = mid
+            else:
+                return entry
+        return None
+
+    def __getitem__(self, airportCode):
+        airport = self.airports.get(airportCode)
+        if airport is None:
+            airport = TSAAirport(ET.fromstring(self.record(airportCode)))
+            self.airports[airportCode] = airport
+        return airport
+
+    def record(self, airportCode):
+        """
+        :param airportCode: 3-letter shortcode of airport
+        :return: Returns the airport's serialized <airport> XML element, raises KeyError if it isn't in the index
+        """
+        entry = self.find(airportCode)
+        if entry is None:
+            raise KeyError(airportCode)
+        code, offset, length = entry
+        return self.mm[offset:offset + length]
+
+    def __contains__(self, airportCode):
+        return airportCode in self.airports or self.find(airportCode) is not None
+
+    def __iter__(self):
+        for num in range(self.count):
+            yield self.entry(num)[0]
+
+    def __len__(self):
+        return self.count
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        """
+        Builds every airport not looked up yet from one parse of the records, which are stored back to back,
+        instead of parsing each record on its own.
+        :return: Returns a list of TSAAirport instances, sorted by shortcode
+        """
+        if len(self.airports) < self.count and self.count:
+            start = self.entry(0)[1]
+            end = self.entry(self.count - 1)[1] + self.entry(self.count - 1)[2]
+            for airport in ET.fromstring("<airports>" + self.mm[start:end] + "</airports>"):
+                shortcode = airport.find('shortcode').text
+                if shortcode not in self.airports:
+                    self.airports[shortcode] = TSAAirport(airport)
+        return [self[airportCode] for airportCode in self]
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def fresh(self, stat):
+        """
+        :param stat: os.stat result for the TSA metadata XML
+        :return: Returns True if the XML has the same mtime and size as the one the index was built from
+        """
+        return self.mtime == stat.st_mtime and self.size == stat.st_size
+
+    def close(self):
+        self.mm.close()
+
+def StampAirportIndex(index_fname, stat):
+    """
+    Records a new mtime and size for the XML in an index whose checksum still matches it.
+    :param index_fname: File name of the compiled index
+    :param stat: os.stat result for the TSA metadata XML
+    """
+    with open(index_fname, 'r+b') as fobj:
+        fobj.seek(AIRPORT_INDEX_STAT_OFFSET)
+        fobj.write(AIRPORT_INDEX_STAT.pack(stat.st_mtime, stat.st_size))
+
+def OpenAirportIndex(xml_fname=airport_fname, index_fname=airport_index_fname):
+    """
+    Opens the airport index, rebuilding it first if it is missing or its checksum doesn't match the XML.
+    The XML is only hashed when its mtime or size differs from the index header's, e.g. after a copy or touch, and
+    then the header is updated so the next open doesn't hash it again.
+    :param xml_fname: File name of the TSA metadata XML
+    :param index_fname: File name of the compiled index
+    :return: Returns an AirportIndex
+    """
+    stat = os.stat(xml_fname)
+    try:
+        index = AirportIndex(index_fname)
+        if index.fresh(stat):
+            return index
+        if index.checksum == AirportMetadataChecksum(xml_fname):
+            try:
+                StampAirportIndex(index_fname, stat)
+            except EnvironmentError, e:
+                # e.g. a read-only program directory, the XML is hashed again on the next open
+                pass
+            return index
+        index.close()
+    except (EnvironmentError, ValueError), e:
+        pass
+    BuildAirportIndex(xml_fname, index_fname)
+    return AirportIndex(index_fname)
+
+
+## TSAAIRPORT CLASS
+
+# One security checkpoint from the TSA airport metadata file, id is the TSA checkpoint number
+Checkpoint = collections.namedtuple("Checkpoint", ["id", "longname", "shortname"])
+
+class TSAAirport(object):
+    """
+    Used to create instances of airports containing data from the TSA airport metadata file.
+    Slotted, with coordinates and utc offset parsed to numbers, flags parsed to booleans and checkpoints kept as a
+    tuple of Checkpoint tuples, to keep the full airport table small.
+    """
+    __slots__ = ["name", "shortcode", "city", "state", "latitude", "longitude", "utc", "dst", "precheck", "checkpoints"]
+
+    def __init__(self, airport):
+        self.name = airport.find('name').text
+        self.shortcode = airport.find('shortcode').text
+        self.city = airport.find('city').text
+        self.state = airport.find('state').text
+        self.latitude = float(airport.find('latitude').text)
+        self.longitude = float(airport.find('longitude').text)
+        self.utc = float(airport.find('utc').text)
+        self.dst = airport.find('dst').text.lower() == "true"
+        self.precheck = airport.find('precheck').text.lower() == "true"
+        tmpCheckpoints = airport.find('checkpoints')
+        self.checkpoints = tuple(Checkpoint(int(checkpoint.find('id').text), checkpoint.find('longname').text,
+                                            checkpoint.find('shortname').text)
+                                 for checkpoint in tmpCheckpoints.findall('checkpoint'))
+
+    def hasTSAPrecheck(self):
+        """
+        TSA Precheck allows travelers to skip the security checkpoint lines
+        :return: Returns True if the airport has TSA Precheck, false otherwise
+        """
+        return self.precheck
+
+    def numCheckpoints(self):
+        """
+        Useful to know the number of checkpoints at the instance airport
+        :return: Returns the number of TSA security checkpoints
+        """
+        return len(self.checkpoints)
+
+    def utcEpoch(self, localTime):
+        """
+        :param localTime: Datetime on the airport's local clock
+        :return: Returns the time as seconds since 1970 UTC, using the airport's utc offset and dst flag
+        """
+        return LocalTimeToEpoch(localTime, self.utc, self.dst)
+
+    def localTime(self, epoch):
+        """
+        :param epoch: Seconds since 1970 UTC
+        :return: Returns the time as a datetime on the airport's local clock, the reverse of utcEpoch
+        """
+        return EpochToLocalTime(epoch, self.utc, self.dst)
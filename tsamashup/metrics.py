@@ -0,0 +1,192 @@
+## IMPORT STATEMENTS
+
+# Time used for timing stages
+import time
+# Threading used for guarding the shared counters
+import threading
+# Bisect used for finding histogram buckets
+import bisect
+# Functools used for keeping the names of instrumented functions
+import functools
+# Os used for enabling instrumentation from the environment
+import os
+
+
+## INSTRUMENTATION
+## Per-stage timers, upstream latency and payload size histograms, and counters for cache hits and errors, so a
+## slow estimate shows where its time went. Everything is off unless enabled, and then an instrumented function
+## costs one attribute check.
+
+# Histogram bucket upper bounds, in seconds for latencies and bytes for payload sizes
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576]
+HISTOGRAM_BUCKETS = {"stage": LATENCY_BUCKETS, "upstream": LATENCY_BUCKETS, "payload": SIZE_BUCKETS}
+
+class Histogram:
+    """
+    Counts of observed values by bucket, along with their count, total and maximum.
+    """
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        :param q: Fraction between 0 and 1
+        :return: Returns the upper bound of the bucket holding the q quantile, or the maximum for the last bucket
+        """
+        needed = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if count and seen >= needed:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        """
+        :return: Returns a JSON-ready dictionary of the histogram, buckets as [upper bound, count] with None for the last
+        """
+        return {"count": self.count, "total": self.total, "max": self.max,
+                "mean": self.total / self.count if self.count else None,
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99),
+                "buckets": [[bound, count] for bound, count in zip(self.bounds + [None], self.buckets) if count]}
+
+class Instrumentation:
+    """
+    Collects timings, sizes and counters while enabled, and passes each one to the hooks as it happens.
+    A hook is called as hook(kind, name, value), kind being stage, upstream or payload for observations and
+    count for counters, e.g. hook("upstream", "tsa", 0.12) or hook("count", "errors.upstream.tsa.Timeout", 1).
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.hooks = []
+        self.sources = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def addHook(self, hook):
+        """
+        :param hook: Function called as hook(kind, name, value) for every observation and count
+        """
+        self.hooks.append(hook)
+
+    def removeHook(self, hook):
+        self.hooks.remove(hook)
+
+    def addSource(self, name, source):
+        """
+        :param name: Key of the source's stats in the snapshot, e.g. caches
+        :param source: Function with no arguments returning JSON-ready stats, called for each snapshot
+        """
+        self.sources[name] = source
+
+    def observe(self, kind, name, value):
+        """
+        Records one timing or size.
+        :param kind: stage, upstream or payload
+        :param name: What was observed, e.g. GetDistance or google
+        :param value: Seconds, or bytes for payloads
+        """
+        with self.lock:
+            histogram = self.histograms.get((kind, name))
+            if histogram is None:
+                histogram = self.histograms[(kind, name)] = Histogram(HISTOGRAM_BUCKETS[kind])
+            histogram.observe(value)
+        for hook in self.hooks:
+            hook(kind, name, value)
+
+    def count(self, name, amount=1):
+        """
+        :param name: Counter name, e.g. degraded.waitTime.lastKnown or errors.stage.LoadTSAMetadata.IOError
+        :param amount: Amount to add
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+        for hook in self.hooks:
+            hook("count", name, amount)
+
+    def snapshot(self):
+        """
+        :return: Returns a JSON-ready dictionary of every histogram by kind, the counters, the hit ratio of every
+        counter pair named <name>.hits and <name>.misses, and the stats of each source
+        """
+        with self.lock:
+            histograms = dict((key, histogram.snapshot()) for key, histogram in self.histograms.items())
+            counters = dict(self.counters)
+        snapshot = {"enabled": self.enabled, "counters": counters, "hitRatios": {}}
+        for kind in HISTOGRAM_BUCKETS:
+            snapshot[kind + "s"] = dict((name, histogram) for (histogramKind, name), histogram in histograms.items()
+                                        if histogramKind == kind)
+        for name in counters:
+            prefix, suffix = name.rsplit(".", 1) if "." in name else (name, "")
+            if suffix in ("hits", "misses"):
+                hits = counters.get(prefix + ".hits", 0)
+                snapshot["hitRatios"][prefix] = float(hits) / (hits + counters.get(prefix + ".misses", 0))
+        for name, source in self.sources.items():
+            snapshot[name] = stats = source()
+            # e.g. the response caches' stats, a list of dictionaries with name, hits and misses
+            for entry in stats if isinstance(stats, list) else []:
+                if "hits" in entry and "misses" in entry and entry["hits"] + entry["misses"]:
+                    snapshot["hitRatios"]["{}.{}".format(name, entry["name"])] = float(entry["hits"]) / (entry["hits"] + entry["misses"])
+        return snapshot
+
+instrumentation = Instrumentation(os.environ.get("TSA_MASHUP_METRICS", "") not in ("", "0"))
+
+def Instrumented(func):
+    """
+    Decorator timing every call of func as the stage named after it, and counting the exceptions it raises by type.
+    """
+    stage = func.__name__
+
+    @functools.wraps(func)
+    def instrumented(*args, **kwargs):
+        if not instrumentation.enabled:
+            return func(*args, **kwargs)
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        except Exception, e:
+            instrumentation.count("errors.stage.{}.{}".format(stage, type(e).__name__))
+            raise
+        finally:
+            instrumentation.observe("stage", stage, time.time() - start)
+    return instrumented
+
+def FormatSnapshot(snapshot):
+    """
+    :param snapshot: Dictionary from Instrumentation.snapshot
+    :return: Returns the snapshot as aligned lines of text, times in milliseconds
+    """
+    lines = []
+    for kind, unit, scale in (("stage", "ms", 1000), ("upstream", "ms", 1000), ("payload", "B", 1)):
+        for name, histogram in sorted(snapshot[kind + "s"].items()):
+            lines.append("{:<9} {:<22} count {:>7}  mean {:>10.1f} {u}  p50 <= {:>8.1f} {u}  p90 <= {:>8.1f} {u}  max {:>10.1f} {u}".format(
+                kind, name, histogram["count"], (histogram["mean"] or 0) * scale, histogram["p50"] * scale,
+                histogram["p90"] * scale, histogram["max"] * scale, u=unit))
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append("{:<9} {:<22} {}".format("count", name, value))
+    for name, ratio in sorted(snapshot["hitRatios"].items()):
+        lines.append("{:<9} {:<22} {:.1%}".format("hitRatio", name, ratio))
+    return "\n".join(lines)
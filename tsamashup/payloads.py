@@ -0,0 +1,223 @@
+## IMPORT STATEMENTS
+
+# Json used to parse REST API responses when no faster decoder is installed
+import json
+try:
+    # Ujson, if installed, parses REST API responses several times faster than json
+    import ujson as fast_json
+except ImportError:
+    fast_json = None
+# Datetime used for parsing TSA wait time report times
+import datetime
+# Collections used for the wait time record tuples
+import collections
+
+
+## DECODING
+## Responses are parsed straight from the bytes received, without decoding them to text first.
+
+def DecodeJSON(content):
+    """
+    :param content: JSON document, as the bytes received or as text
+    :return: Returns the parsed document, raises ValueError if it isn't JSON
+    """
+    if fast_json is not None:
+        return fast_json.loads(content)
+    return json.loads(content)
+
+def JSONBackend():
+    """
+    :return: Returns the name of the module DecodeJSON uses
+    """
+    return "ujson" if fast_json is not None else "json"
+
+class PayloadError(ValueError):
+    """
+    An upstream response that parsed as JSON but isn't shaped like the API's responses.
+    """
+    pass
+
+
+## TSA WAIT TIMES API
+
+# One report from the TSA Wait Times API: checkpoint number, wait time in 10-minute increments,
+# report time, and the report time as TSA wrote it
+WaitTimeRecord = collections.namedtuple("WaitTimeRecord", ["checkpoint", "waitTime", "created", "createdText"])
+
+def ParseTSADatetime(text):
+    """
+    :param text: Created_Datetime from the TSA Wait Times API, e.g. 11/27/2016 7:13:53 PM
+    :return: Returns the datetime, in the airport's local time
+    """
+    return datetime.datetime.strptime(text, "%m/%d/%Y %I:%M:%S %p")
+
+class TSAWaitTimesFeed(object):
+    """
+    A TSA Wait Times API response, or an airport's stored history: its reports as WaitTimeRecords, in the order given.
+    """
+    __slots__ = ["records"]
+
+    def __init__(self, records=()):
+        self.records = tuple(records)
+
+def ParseTSAWaitTimes(TSAdump):
+    """
+    Checks the shape of a TSA Wait Times API response once and converts its reports to typed records. Malformed
+    reports are skipped one by one, so one doesn't lose the rest.
+    :param TSAdump: The full parsed json data from TSA Wait Times API
+    :return: Returns the TSAWaitTimesFeed, raises PayloadError if the response is malformed
+    """
+    if not isinstance(TSAdump, dict):
+        raise PayloadError("TSA response is not an object")
+    waitTimes = TSAdump.get("WaitTimes")
+    if waitTimes is None:
+        return TSAWaitTimesFeed()
+    if not isinstance(waitTimes, list):
+        raise PayloadError("TSA response WaitTimes is not a list")
+    records = []
+    for waitTime in waitTimes:
+        try:
+            records.append(WaitTimeRecord(int(waitTime["CheckpointIndex"]), int(waitTime["WaitTime"]),
+                                          ParseTSADatetime(waitTime["Created_Datetime"]), waitTime["Created_Datetime"]))
+        except (KeyError, TypeError, ValueError), e:
+            pass
+    return TSAWaitTimesFeed(records)
+
+
+## GOOGLE DISTANCE MATRIX API
+
+# Element statuses Google documents. Elements that aren't OK have no duration or distance, e.g. ZERO_RESULTS when
+# there is no route between the origin and the destination, and NOT_FOUND when either couldn't be geocoded.
+ELEMENT_STATUSES = ["OK", "NOT_FOUND", "ZERO_RESULTS", "MAX_ROUTE_LENGTH_EXCEEDED"]
+
+class DistanceElement(object):
+    """
+    One origin to destination travel time from a Distance Matrix response. Values are seconds and meters, and the
+    duration is the duration in traffic when Google returned one. Elements that aren't OK have zero values.
+    """
+    __slots__ = ["status", "durationValue", "durationText", "distanceValue", "distanceText"]
+
+    def __init__(self, status, durationValue=0, durationText="", distanceValue=0, distanceText=""):
+        self.status = status
+        self.durationValue = durationValue
+        self.durationText = durationText
+        self.distanceValue = distanceValue
+        self.distanceText = distanceText
+
+class DistanceMatrix(object):
+    """
+    A Distance Matrix response: one row per origin, each with one DistanceElement per destination.
+    A response whose status isn't OK has no rows.
+    """
+    __slots__ = ["status", "originAddresses", "destinationAddresses", "rows"]
+
+    def __init__(self, status, originAddresses=(), destinationAddresses=(), rows=()):
+        self.status = status
+        self.originAddresses = tuple(originAddresses)
+        self.destinationAddresses = tuple(destinationAddresses)
+        self.rows = tuple(tuple(row) for row in rows)
+
+    def element(self, row, col):
+        """
+        :param row: Index of the origin
+        :param col: Index of the destination
+        :return: Returns the DistanceElement from the origin to the destination
+        """
+        return self.rows[row][col]
+
+    def cell(self, row, col):
+        """
+        :param row: Index of the origin
+        :param col: Index of the destination
+        :return: Returns a single origin, single destination DistanceMatrix for one pair
+        """
+        return DistanceMatrix(self.status, [self.originAddresses[row]], [self.destinationAddresses[col]],
+                              [[self.rows[row][col]]])
+
+def DistanceMeasure(element, name):
+    """
+    :param element: Element object from a Distance Matrix response
+    :param name: duration, duration_in_traffic or distance
+    :return: Returns the measure's (value, text), raises PayloadError if it's missing or malformed
+    """
+    measure = element.get(name)
+    if not isinstance(measure, dict) or not isinstance(measure.get("value"), (int, long)) \
+            or not isinstance(measure.get("text"), basestring):
+        raise PayloadError("Distance Matrix element has no valid {}".format(name))
+    return (measure["value"], measure["text"])
+
+def ParseDistanceElement(element):
+    """
+    :param element: Element object from a Distance Matrix response
+    :return: Returns the DistanceElement, raises PayloadError if the element is malformed
+    """
+    if not isinstance(element, dict) or element.get("status") not in ELEMENT_STATUSES:
+        raise PayloadError("Distance Matrix element has no valid status")
+    if element["status"] != "OK":
+        return DistanceElement(element["status"])
+    # requests with a departure time also get the travel time in the traffic expected then
+    durationValue, durationText = DistanceMeasure(element, "duration_in_traffic" if "duration_in_traffic" in element else "duration")
+    distanceValue, distanceText = DistanceMeasure(element, "distance")
+    return DistanceElement("OK", durationValue, durationText, distanceValue, distanceText)
+
+def ParseDistanceMatrix(DistanceDict):
+    """
+    Checks the shape of a Distance Matrix response once and converts it to typed records.
+    :param DistanceDict: The processed json response from Google Distance Matrix API
+    :return: Returns the DistanceMatrix, raises PayloadError if the response is malformed
+    """
+    if not isinstance(DistanceDict, dict) or not isinstance(DistanceDict.get("status"), basestring):
+        raise PayloadError("Distance Matrix response has no status")
+    if DistanceDict["status"] != "OK":
+        return DistanceMatrix(DistanceDict["status"])
+
+    originAddresses = DistanceDict.get("origin_addresses")
+    destinationAddresses = DistanceDict.get("destination_addresses")
+    rows = DistanceDict.get("rows")
+    if not isinstance(originAddresses, list) or not isinstance(destinationAddresses, list) or not isinstance(rows, list) \
+            or len(rows) != len(originAddresses):
+        raise PayloadError("Distance Matrix response doesn't have one row per origin")
+    elements = []
+    for row in rows:
+        if not isinstance(row, dict) or not isinstance(row.get("elements"), list) \
+                or len(row["elements"]) != len(destinationAddresses):
+            raise PayloadError("Distance Matrix row doesn't have one element per destination")
+        elements.append([ParseDistanceElement(element) for element in row["elements"]])
+    return DistanceMatrix("OK", originAddresses, destinationAddresses, elements)
+
+
+## GOOGLE GEOCODING API
+
+class Geocode(object):
+    """
+    A Geocoding response: the address and coordinates of the best match. A response whose status isn't OK, e.g.
+    ZERO_RESULTS when Google couldn't find the address, has neither.
+    """
+    __slots__ = ["status", "address", "latitude", "longitude"]
+
+    def __init__(self, status, address=None, latitude=None, longitude=None):
+        self.status = status
+        self.address = address
+        self.latitude = latitude
+        self.longitude = longitude
+
+def ParseGeocode(GeocodeDict):
+    """
+    Checks the shape of a Geocoding response and converts its best match to a typed record.
+    :param GeocodeDict: The processed json response from Google Geocoding API
+    :return: Returns the Geocode, raises PayloadError if the response is malformed
+    """
+    if not isinstance(GeocodeDict, dict) or not isinstance(GeocodeDict.get("status"), basestring):
+        raise PayloadError("Geocoding response has no status")
+    if GeocodeDict["status"] != "OK":
+        return Geocode(GeocodeDict["status"])
+    results = GeocodeDict.get("results")
+    if not isinstance(results, list) or not results or not isinstance(results[0], dict):
+        raise PayloadError("Geocoding response has no results")
+    address = results[0].get("formatted_address")
+    geometry = results[0].get("geometry")
+    location = geometry.get("location") if isinstance(geometry, dict) else None
+    if not isinstance(address, basestring) or not isinstance(location, dict) \
+            or not all(isinstance(location.get(name), (int, long, float)) for name in ("lat", "lng")):
+        raise PayloadError("Geocoding result has no address and location")
+    return Geocode("OK", address, float(location["lat"]), float(location["lng"]))
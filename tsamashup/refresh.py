@@ -0,0 +1,322 @@
+## IMPORT STATEMENTS
+
+try:
+    # cElementTree, if available, for parsing the changed airports and the checksum document
+    import xml.etree.cElementTree as ET
+except ImportError:
+    # ET used for parsing the changed airports and the checksum document
+    import xml.etree.ElementTree as ET
+# Os used for locating the metadata files and the refresh urls
+import os
+# Hashlib used for checking the downloaded metadata against its checksum
+import hashlib
+# Threading and time used for the background refresher
+import threading
+import time
+# Argparse used for parsing refresh command line options
+import argparse
+
+from tsamashup import DATA_DIR
+from tsamashup.upstream import UpstreamGet
+from tsamashup.metadata import AirportMetadata, ReplaceAirportMetadata, AirportRecords, BuildAirportIndex
+from tsamashup.metadata import AirportIndex, TSAAirport, MetadataError, airport_fname, airport_index_fname
+
+
+## METADATA REFRESH
+## TSA publishes apcp.xml along with a small checksum document. A long-running process checks the checksum, and only
+## when it changes downloads the metadata, works out which airports and checkpoints were added, removed or changed,
+## and swaps in a new airport dictionary. Unchanged airports carry over as they are, and requests already holding
+## the old dictionary finish with it.
+
+# Metadata and checksum urls, can be pointed at a local stand-in server for offline testing
+TSA_METADATA_URL = os.environ.get("TSA_METADATA_URL", "http://www.tsa.gov/data/apcp.xml")
+TSA_METADATA_CHECKSUM_URL = os.environ.get("TSA_METADATA_CHECKSUM_URL", "http://www.tsa.gov/data/apcp.checksum.xml")
+# the last checksum document applied, kept next to apcp.xml
+airport_checksum_fname = os.path.join(DATA_DIR, "apcp.checksum.xml")
+METADATA_REFRESH_INTERVAL = 3600
+# Seconds a replaced airport index stays open, longer than any request holds on to the metadata
+RETIRED_INDEX_DELAY = 300
+# Hash functions for the checksum document, told apart by the length of the hex digest
+METADATA_CHECKSUM_HASHES = {32: hashlib.md5, 40: hashlib.sha1, 64: hashlib.sha256}
+
+class MetadataDiff(object):
+    """
+    The airports added, removed and changed between two versions of apcp.xml. Each changed airport lists the
+    fields that changed and the checkpoint ids added, removed and changed.
+    """
+    def __init__(self, added=None, removed=None, changed=None):
+        self.added = added or []
+        self.removed = removed or []
+        self.changed = changed or {}
+
+    def __nonzero__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self):
+        """
+        :return: Returns the diff as a JSON-ready dictionary
+        """
+        return {"added": self.added, "removed": self.removed, "changed": self.changed}
+
+def AirportChanges(oldAirport, newAirport):
+    """
+    :param oldAirport: TSAAirport instance from the old metadata
+    :param newAirport: TSAAirport instance from the new metadata
+    :return: Returns a dictionary of the changed fields, and of the checkpoint ids added, removed and changed
+    """
+    fields = [name for name in TSAAirport.__slots__
+              if name != "checkpoints" and getattr(oldAirport, name) != getattr(newAirport, name)]
+    oldCheckpoints = dict((checkpoint.id, checkpoint) for checkpoint in oldAirport.checkpoints)
+    newCheckpoints = dict((checkpoint.id, checkpoint) for checkpoint in newAirport.checkpoints)
+    return {"fields": fields,
+            "checkpointsAdded": sorted(set(newCheckpoints) - set(oldCheckpoints)),
+            "checkpointsRemoved": sorted(set(oldCheckpoints) - set(newCheckpoints)),
+            "checkpointsChanged": sorted(chk for chk in set(oldCheckpoints) & set(newCheckpoints)
+                                         if oldCheckpoints[chk] != newCheckpoints[chk])}
+
+def DiffAirportRecords(oldRecords, newRecords):
+    """
+    Compares two versions of the metadata airport by airport. Only the airports whose XML differs are parsed.
+    :param oldRecords: Dictionary of shortcode to serialized <airport> element, see AirportRecords
+    :param newRecords: The same for the new metadata
+    :return: Returns a MetadataDiff
+    """
+    diff = MetadataDiff(sorted(set(newRecords) - set(oldRecords)), sorted(set(oldRecords) - set(newRecords)))
+    for airportCode in sorted(set(oldRecords) & set(newRecords)):
+        if oldRecords[airportCode] != newRecords[airportCode]:
+            changes = AirportChanges(TSAAirport(ET.fromstring(oldRecords[airportCode])),
+                                     TSAAirport(ET.fromstring(newRecords[airportCode])))
+            # e.g. only the element's formatting changed
+            if changes["fields"] or changes["checkpointsAdded"] or changes["checkpointsRemoved"] or changes["checkpointsChanged"]:
+                diff.changed[airportCode] = changes
+    return diff
+
+def MetadataRecords(TSAairportDict, xml_fname=airport_fname):
+    """
+    :param TSAairportDict: The live airport metadata, an AirportIndex or a plain dictionary
+    :param xml_fname: File it was loaded from, read when it's a plain dictionary
+    :return: Returns a dictionary of shortcode to serialized <airport> element
+    """
+    if isinstance(TSAairportDict, AirportIndex):
+        return dict((airportCode, TSAairportDict.record(airportCode)) for airportCode in TSAairportDict)
+    with open(xml_fname, "rb") as fobj:
+        return AirportRecords(fobj.read())
+
+def ApplyMetadataDiff(TSAairportDict, diff, newRecords, xml_fname=airport_fname, index_fname=airport_index_fname):
+    """
+    Builds the new airport metadata without touching the live one: a new index when the live metadata is an
+    index, otherwise a copy of the dictionary. Airports the diff doesn't mention keep their loaded TSAAirport.
+    :param TSAairportDict: The live airport metadata
+    :param diff: MetadataDiff from DiffAirportRecords
+    :param newRecords: The new metadata's records, see AirportRecords
+    :param xml_fname: The new apcp.xml, already written under a temporary name
+    :param index_fname: Temporary file name to build the new index under
+    :return: Returns the new airport metadata
+    """
+    stale = set(diff.removed) | set(diff.changed)
+    if isinstance(TSAairportDict, AirportIndex):
+        # the new index stays mapped when it is renamed into place, and the old one stays mapped until closed
+        BuildAirportIndex(xml_fname, index_fname)
+        newMetadata = AirportIndex(index_fname)
+        newMetadata.airports = dict((airportCode, airport) for airportCode, airport in TSAairportDict.airports.items()
+                                    if airportCode not in stale)
+        return newMetadata
+
+    newMetadata = dict((airportCode, airport) for airportCode, airport in TSAairportDict.items() if airportCode not in stale)
+    for airportCode in diff.added + sorted(diff.changed):
+        newMetadata[airportCode] = TSAAirport(ET.fromstring(newRecords[airportCode]))
+    return newMetadata
+
+def TemporaryName(fname):
+    """
+    :return: Returns the name a file is written under before it is renamed into place
+    """
+    return "{}.{}.tmp".format(fname, os.getpid())
+
+def WriteReplacing(fname, data):
+    """
+    Writes a file under a temporary name and renames it into place, so readers never see half a file.
+    """
+    tmp_fname = TemporaryName(fname)
+    with open(tmp_fname, "wb") as fobj:
+        fobj.write(data)
+    os.rename(tmp_fname, fname)
+
+def ChecksumValue(document):
+    """
+    :param document: The checksum XML document
+    :return: Returns the checksum text in it, whatever element it's in
+    """
+    return "".join(ET.fromstring(document).itertext()).strip()
+
+def VerifyMetadataChecksum(data, checksum):
+    """
+    Raises MetadataError if downloaded metadata doesn't match the checksum document, e.g. a truncated download or
+    TSA publishing a new version between the two requests.
+    :param data: TSA metadata XML
+    :param checksum: The checksum XML document
+    """
+    expected = ChecksumValue(checksum).lower()
+    if len(expected) not in METADATA_CHECKSUM_HASHES:
+        raise MetadataError("Unrecognized apcp.xml checksum " + expected)
+    if METADATA_CHECKSUM_HASHES[len(expected)](data).hexdigest() != expected:
+        raise MetadataError("Downloaded apcp.xml doesn't match its checksum " + expected)
+
+# Replaced airport indexes still open, as (time to close, AirportIndex) tuples
+retired_indexes = []
+retired_lock = threading.Lock()
+
+def RetireAirportIndex(index):
+    """
+    Closes a replaced airport index RETIRED_INDEX_DELAY seconds after the swap, once the requests that picked it up
+    before the swap have finished with it. Indexes retired earlier are closed now if their time has come.
+    :param index: The replaced AirportIndex
+    """
+    with retired_lock:
+        retired_indexes.append((time.time() + RETIRED_INDEX_DELAY, index))
+    CloseRetiredIndexes()
+
+def CloseRetiredIndexes():
+    """
+    Closes the retired airport indexes whose time has come.
+    :return: Returns the number closed
+    """
+    now = time.time()
+    with retired_lock:
+        due = [index for closeAt, index in retired_indexes if closeAt <= now]
+        retired_indexes[:] = [(closeAt, index) for closeAt, index in retired_indexes if closeAt > now]
+    for index in due:
+        index.close()
+    return len(due)
+
+def RefreshAirportMetadata(TSAairportDict=None, force=False, xml_fname=airport_fname, index_fname=airport_index_fname,
+                           checksum_fname=airport_checksum_fname):
+    """
+    Checks TSA's metadata checksum and, when it changed, downloads apcp.xml, checks it against the checksum and
+    applies the difference. The new apcp.xml and index are built under temporary names and only renamed into place once both are built,
+    with the checksum written last, so a refresh that fails part way is tried again at the next check.
+    The new metadata replaces the process-wide one when TSAairportDict is the process-wide one. A replaced index is
+    closed at the first refresh RETIRED_INDEX_DELAY seconds or more later, see RetireAirportIndex. Raises on failure, and with MetadataError if the download doesn't match
+    the checksum, leaving the live metadata and the files as they were.
+    :param TSAairportDict: The live airport metadata, defaults to the process-wide one
+    :param force: Download and compare the metadata even if the checksum hasn't changed
+    :param xml_fname: Local copy of apcp.xml
+    :param index_fname: File name of the compiled index
+    :param checksum_fname: Local copy of the checksum document
+    :return: Returns a tuple of the new airport metadata and the MetadataDiff, or (TSAairportDict, None) if the
+    checksum hasn't changed
+    """
+    shared = TSAairportDict is None
+    if shared:
+        TSAairportDict = AirportMetadata()
+
+    checksum = UpstreamGet("metadata", TSA_METADATA_CHECKSUM_URL, {}).content
+    if not force and os.path.exists(checksum_fname):
+        with open(checksum_fname, "rb") as fobj:
+            if ChecksumValue(fobj.read()) == ChecksumValue(checksum):
+                return (TSAairportDict, None)
+
+    data = UpstreamGet("metadata", TSA_METADATA_URL, {}).content
+    VerifyMetadataChecksum(data, checksum)
+    newRecords = AirportRecords(data)
+    diff = DiffAirportRecords(MetadataRecords(TSAairportDict, xml_fname), newRecords)
+
+    tmp_xml_fname = TemporaryName(xml_fname)
+    tmp_index_fname = TemporaryName(index_fname)
+    try:
+        with open(tmp_xml_fname, "wb") as fobj:
+            fobj.write(data)
+        newMetadata = ApplyMetadataDiff(TSAairportDict, diff, newRecords, tmp_xml_fname, tmp_index_fname)
+        os.rename(tmp_xml_fname, xml_fname)
+        if os.path.exists(tmp_index_fname):
+            os.rename(tmp_index_fname, index_fname)
+    except:
+        for fname in (tmp_xml_fname, tmp_index_fname):
+            if os.path.exists(fname):
+                os.remove(fname)
+        raise
+    WriteReplacing(checksum_fname, checksum)
+    if shared:
+        ReplaceAirportMetadata(newMetadata)
+    if isinstance(TSAairportDict, AirportIndex):
+        RetireAirportIndex(TSAairportDict)
+    return (newMetadata, diff)
+
+class MetadataRefresher(threading.Thread):
+    """
+    Background thread that refreshes the process-wide airport metadata every interval seconds.
+    Each new metadata is passed to onRefresh, e.g. to update a server's copy. Failed checks are counted and retried
+    at the next interval.
+    """
+    def __init__(self, interval=METADATA_REFRESH_INTERVAL, onRefresh=None):
+        threading.Thread.__init__(self, name="MetadataRefresher")
+        self.daemon = True
+        self.interval = interval
+        self.onRefresh = onRefresh
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.checks = 0
+        self.refreshes = 0
+        self.checkErrors = 0
+        self.lastDiff = None
+        self.lastRefresh = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            CloseRetiredIndexes()
+            self.check()
+
+    def stop(self):
+        self.stopped.set()
+
+    def check(self):
+        """
+        Runs one refresh, counting failures instead of raising.
+        """
+        try:
+            newMetadata, diff = RefreshAirportMetadata()
+        except Exception, e:
+            with self.lock:
+                self.checkErrors += 1
+            return
+        with self.lock:
+            self.checks += 1
+            if diff is not None:
+                self.refreshes += 1
+                self.lastDiff = diff.summary()
+                self.lastRefresh = time.time()
+        if diff is not None and self.onRefresh is not None:
+            self.onRefresh(newMetadata)
+
+    def stats(self):
+        """
+        :return: Returns a dictionary of the check, refresh and error counters, and the last diff applied
+        """
+        with self.lock:
+            return {"checks": self.checks, "refreshes": self.refreshes, "checkErrors": self.checkErrors,
+                    "lastRefresh": self.lastRefresh, "lastDiff": self.lastDiff}
+
+def MainRefreshMetadata(argv):
+    """
+    Refresh program entry point, e.g. python tsa-mashup.py refresh-metadata
+    :param argv: Command line arguments after "refresh-metadata"
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py refresh-metadata", description="Update apcp.xml from TSA if it changed.")
+    parser.add_argument("--force", action="store_true", help="Download and compare the metadata even if the checksum is unchanged")
+    args = parser.parse_args(argv)
+
+    newMetadata, diff = RefreshAirportMetadata(force=args.force)
+    if diff is None:
+        print "apcp.xml is up to date."
+        return
+    print "Updated apcp.xml: {} airports added, {} removed, {} changed.".format(len(diff.added), len(diff.removed), len(diff.changed))
+    for airportCode in diff.added:
+        print "  added   {}".format(airportCode)
+    for airportCode in diff.removed:
+        print "  removed {}".format(airportCode)
+    for airportCode, changes in sorted(diff.changed.items()):
+        print "  changed {} {}".format(airportCode, ", ".join(
+            changes["fields"] + ["checkpoint {} {}".format(chk, what) for what in ("added", "removed", "changed")
+                                 for chk in changes["checkpoints" + what.capitalize()]]))
+    return
@@ -0,0 +1,317 @@
+## IMPORT STATEMENTS
+
+# Json used for fixture and synthetic response bodies
+import json
+# Random, zlib, hashlib and datetime used for deterministic synthetic responses and metadata checksums
+import random
+import zlib
+import hashlib
+import datetime
+# Os and sys used for locating the fixture file and printing summaries
+import os
+import sys
+# Urlparse used for reading request query strings
+import urlparse
+# Argparse used for parsing replay command line options
+import argparse
+# Threading, BaseHTTPServer and SocketServer used for the stand-in server
+import threading
+import BaseHTTPServer
+import SocketServer
+
+from tsamashup import DATA_DIR
+from tsamashup import upstream
+from tsamashup import refresh
+from tsamashup.cache import ResponseCache, cacheKeyURL
+from tsamashup.metadata import AirportMetadata
+
+
+## RECORD AND REPLAY
+## Upstream responses are recorded to a fixture file, then served back by a local stand-in for the TSA and Google
+## REST APIs, so the whole program runs offline.
+
+fixture_fname = os.path.join(DATA_DIR, "fixtures.db")
+
+def FixtureKey(upstreamName, params):
+    """
+    :param upstreamName: tsa or google
+    :param params: Parameters dictionary for REST API
+    :return: Returns the key a response is recorded under, the same for any API key
+    """
+    return cacheKeyURL("http://{}/".format(upstreamName), params)
+
+def RecordUpstream(fixtures):
+    """
+    Saves every upstream response from now on to a fixture store.
+    :param fixtures: ResponseCache to record into
+    :return: Returns the recorder, remove it from upstream.upstream_recorders to stop recording
+    """
+    def recorder(upstreamName, params, text):
+        fixtures.put(FixtureKey(upstreamName, params), text)
+    upstream.upstream_recorders.append(recorder)
+    return recorder
+
+def SyntheticTSAFeed(airport, size=25, now=None):
+    """
+    Makes up a TSA Wait Times API response. The same airport and size always give the same reports.
+    :param airport: TSAAirport instance, its checkpoints get the reports
+    :param size: Number of reports
+    :param now: Newest report time in the airport's local time, defaults to the airport's current time
+    :return: Returns a response shaped like the TSA Wait Times API's
+    """
+    if now is None:
+        now = datetime.datetime.utcnow() + datetime.timedelta(hours=airport.utc)
+    generator = random.Random(zlib.crc32("{}:{}".format(airport.shortcode, size)))
+    checkpoints = [checkpoint.id for checkpoint in airport.checkpoints] or [0]
+    waitTimes = []
+    for num in range(size):
+        created = now - datetime.timedelta(seconds=generator.randint(0, 3600) * (1 + num // 25))
+        waitTimes.append({"CheckpointIndex": str(generator.choice(checkpoints)),
+                          "WaitTime": str(min(int(generator.expovariate(0.8)), 12)),
+                          "Created_Datetime": created.strftime("%m/%d/%Y %I:%M:%S %p")})
+    return {"WaitTimes": waitTimes}
+
+def SyntheticGeocode(address, TSAairportDict):
+    """
+    Makes up a Google Geocoding response, within about 15 miles of one of the airports. The same address always gets
+    the same coordinates.
+    :param address: Address to geocode
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :return: Returns a response shaped like the Geocoding API's
+    """
+    generator = random.Random(zlib.crc32(address))
+    airport = TSAairportDict[generator.choice(sorted(TSAairportDict.keys()))]
+    location = {"lat": round(airport.latitude + generator.uniform(-0.2, 0.2), 6),
+                "lng": round(airport.longitude + generator.uniform(-0.2, 0.2), 6)}
+    return {"status": "OK", "results": [{"formatted_address": address + ", USA", "geometry": {"location": location}}]}
+
+def SyntheticDistanceMatrix(origins, destinations):
+    """
+    Makes up a Google Distance Matrix response. The same origin and destination always get the same travel time.
+    :param origins: List of places where trips to the airport start
+    :param destinations: List of destinations
+    :return: Returns a response shaped like the Distance Matrix API's
+    """
+    rows = []
+    for origin in origins:
+        elements = []
+        for destination in destinations:
+            seconds = 600 + zlib.crc32(origin + "|" + destination) % 5400
+            elements.append({"status": "OK", "duration": {"value": seconds, "text": "{} mins".format(seconds / 60)},
+                             "distance": {"value": seconds * 15, "text": "{} mi".format(seconds * 15 / 1609)}})
+        rows.append({"elements": elements})
+    return {"status": "OK", "origin_addresses": [origin + ", USA" for origin in origins],
+            "destination_addresses": [destination + " Airport" for destination in destinations], "rows": rows}
+
+class ReplayRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    GET /tsa?ap=..            the recorded TSA Wait Times API response
+    GET /google?..            the recorded Google Distance Matrix or Geocoding response
+    GET /apcp.xml             the TSA airport metadata set with setMetadata
+    GET /apcp.checksum.xml    its checksum document
+    Requests without a fixture get a synthetic response if the server makes them up, otherwise a 404.
+    Requests to an upstream with an outage set wait and then fail, see ReplayServer.setOutage.
+    """
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, which would otherwise wait on delayed ACKs between keep-alive requests
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        upstreamName = url.path.strip("/")
+        params = dict(urlparse.parse_qsl(url.query))
+        server = self.server
+        with server.lock:
+            outage = server.outages.get(upstreamName)
+        if outage is not None:
+            status, delay = outage
+            if delay:
+                server.recovered.wait(delay)
+            if status is not None:
+                server.count("outage")
+                self.sendBody(status, json.dumps({"error": "Simulated {} outage".format(upstreamName)}))
+                return
+        if upstreamName in ("apcp.xml", "apcp.checksum.xml"):
+            self.sendMetadata(upstreamName)
+            return
+        body = None
+        if server.fixtures is not None:
+            body = server.fixtures.get(FixtureKey(upstreamName, params))
+        if body is not None:
+            server.count("replayed")
+        elif server.synthetic and upstreamName == "tsa" and params.get("ap", "").upper() in server.TSAairportDict:
+            body = json.dumps(SyntheticTSAFeed(server.TSAairportDict[params["ap"].upper()], server.feedSize))
+            server.count("synthetic")
+        elif server.synthetic and upstreamName == "google" and params.get("origins") and params.get("destinations"):
+            body = json.dumps(SyntheticDistanceMatrix(params["origins"].split("|"), params["destinations"].split("|")))
+            server.count("synthetic")
+        elif server.synthetic and upstreamName == "google" and params.get("address"):
+            body = json.dumps(SyntheticGeocode(params["address"], server.TSAairportDict))
+            server.count("synthetic")
+        else:
+            server.count("missing")
+            self.sendBody(404, json.dumps({"error": "No fixture for " + FixtureKey(upstreamName, params)}))
+            return
+        self.sendBody(200, body.encode("utf-8") if isinstance(body, unicode) else body)
+
+    def sendMetadata(self, name):
+        server = self.server
+        with server.lock:
+            document = server.metadata if name == "apcp.xml" else server.metadataChecksum
+        if document is None:
+            server.count("missing")
+            self.sendBody(404, json.dumps({"error": "No metadata set"}))
+            return
+        server.count("metadata")
+        self.sendBody(200, document, "application/xml")
+
+    def sendBody(self, status, body, contentType="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # every request would otherwise be printed to standard error
+        pass
+
+class ReplayServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded stand-in for the TSA and Google REST APIs, serving recorded fixtures and optionally synthetic responses.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    # a batch connects for every airport at once, more than the default listen backlog of 5
+    request_queue_size = 128
+
+    def __init__(self, address, fixtures=None, synthetic=False, feedSize=25, TSAairportDict=None):
+        BaseHTTPServer.HTTPServer.__init__(self, address, ReplayRequestHandler)
+        self.fixtures = fixtures
+        self.synthetic = synthetic
+        self.feedSize = feedSize
+        if TSAairportDict is None and synthetic:
+            TSAairportDict = AirportMetadata()
+        self.TSAairportDict = TSAairportDict or {}
+        self.counts = {"replayed": 0, "synthetic": 0, "metadata": 0, "missing": 0, "outage": 0}
+        self.lock = threading.Lock()
+        self.metadata = None
+        self.metadataChecksum = None
+        # upstream name to (status, delay), and set when the outages are over to release waiting requests
+        self.outages = {}
+        self.recovered = threading.Event()
+        host, port = self.server_address[:2]
+        self.tsaURL = "http://{}:{}/tsa".format(host, port)
+        self.googleURL = "http://{}:{}/google".format(host, port)
+        self.metadataURL = "http://{}:{}/apcp.xml".format(host, port)
+        self.metadataChecksumURL = "http://{}:{}/apcp.checksum.xml".format(host, port)
+
+    def setMetadata(self, data, checksum=None):
+        """
+        Serves a version of apcp.xml, e.g. a changed copy for testing refresh-metadata.
+        :param data: TSA metadata XML document
+        :param checksum: Checksum document to serve with it, defaults to one holding the document's sha1
+        """
+        if checksum is None:
+            checksum = "<checksum>{}</checksum>".format(hashlib.sha1(data).hexdigest())
+        with self.lock:
+            self.metadata = data
+            self.metadataChecksum = checksum
+
+    def setOutage(self, upstreamName, status=503, delay=0):
+        """
+        Makes one upstream fail or hang, e.g. to test degraded mode and the circuit breakers.
+        :param upstreamName: tsa, google, apcp.xml or apcp.checksum.xml
+        :param status: HTTP status to answer with, or None to answer as usual after the delay
+        :param delay: Seconds each request waits before it is answered, cut short by clearOutages
+        """
+        with self.lock:
+            self.recovered.clear()
+            self.outages[upstreamName] = (status, delay)
+
+    def clearOutages(self):
+        """
+        Ends every outage, answering the requests still waiting on one straight away.
+        """
+        with self.lock:
+            self.outages = {}
+            self.recovered.set()
+
+    def count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+def StartReplay(fixtures=None, synthetic=False, feedSize=25, port=0):
+    """
+    Starts a replay server on a background thread and points this process's upstream and metadata requests at it.
+    :param fixtures: Optional ResponseCache of recorded responses
+    :param synthetic: If requests without a fixture get a synthetic response instead of a 404
+    :param feedSize: Number of reports in each synthetic TSA response
+    :param port: Port to listen on, 0 picks a free one
+    :return: Returns the running ReplayServer, call shutdown() to stop it
+    """
+    server = ReplayServer(("127.0.0.1", port), fixtures, synthetic, feedSize)
+    thread = threading.Thread(target=server.serve_forever, name="ReplayServer")
+    thread.daemon = True
+    thread.start()
+    upstream.TSA_BASE_URL = server.tsaURL
+    upstream.GOOGLE_BASE_URL = server.googleURL
+    # Distance Matrix and Geocoding requests are told apart by their parameters
+    upstream.GOOGLE_GEOCODE_URL = server.googleURL
+    refresh.TSA_METADATA_URL = server.metadataURL
+    refresh.TSA_METADATA_CHECKSUM_URL = server.metadataChecksumURL
+    return server
+
+def MainRecord(argv, run):
+    """
+    Record program entry point, e.g. python tsa-mashup.py record fixtures.db batch trips.csv --key KEY
+    :param argv: Command line arguments after "record": the fixture file, then the command to record
+    :param run: Function running a command line, e.g. tsamashup.cli.main
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py record", description="Record upstream responses while running a command.")
+    parser.add_argument("fixtures", help="Fixture file to record into, created if missing")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="Command to run, e.g. batch trips.csv --key KEY")
+    args = parser.parse_args(argv)
+
+    fixtures = ResponseCache(args.fixtures)
+    RecordUpstream(fixtures)
+    run(args.command)
+    print >> sys.stderr, "{} responses in {}.".format(len(fixtures), args.fixtures)
+    return
+
+def MainReplay(argv, run):
+    """
+    Replay program entry point, e.g. python tsa-mashup.py replay --fixtures fixtures.db batch trips.csv --key KEY
+    Without a command, serves the fixtures until interrupted, for TSA_BASE_URL, GOOGLE_BASE_URL and GOOGLE_GEOCODE_URL
+    to point at.
+    :param argv: Command line arguments after "replay"
+    :param run: Function running a command line, e.g. tsamashup.cli.main
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py replay", description="Serve recorded upstream responses.")
+    parser.add_argument("--fixtures", default=fixture_fname, help="Recorded fixture file, defaults to " + fixture_fname)
+    parser.add_argument("--synthetic", action="store_true", help="Make up responses for requests without a fixture")
+    parser.add_argument("--feed-size", type=int, default=25, help="Reports in each synthetic TSA response")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on, defaults to a free port")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="Command to run against the replay server")
+    args = parser.parse_args(argv)
+
+    fixtures = ResponseCache(args.fixtures) if os.path.exists(args.fixtures) else None
+    if fixtures is None and not args.synthetic:
+        parser.error("no fixture file {}, record one or pass --synthetic".format(args.fixtures))
+
+    server = StartReplay(fixtures, args.synthetic, args.feed_size, args.port)
+    if args.command:
+        run(args.command)
+        print >> sys.stderr, "Replayed {replayed}, synthetic {synthetic}, missing {missing}.".format(**server.counts)
+    else:
+        print "Replaying on TSA_BASE_URL={} GOOGLE_BASE_URL={} GOOGLE_GEOCODE_URL={}".format(server.tsaURL, server.googleURL,
+                                                                                            server.googleURL)
+        try:
+            while True:
+                threading.Event().wait(3600)
+        except KeyboardInterrupt:
+            pass
+    server.shutdown()
+    return
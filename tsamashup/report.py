@@ -0,0 +1,191 @@
+## IMPORT STATEMENTS
+
+# Json used for writing and resuming JSONL reports
+import json
+# Csv used for writing and resuming CSV reports
+import csv
+# Os and sys used for checking and replacing the output file and printing progress
+import os
+import sys
+# Multiprocessing used for spreading airports over worker processes
+import multiprocessing
+# Argparse used for parsing report command line options
+import argparse
+
+from tsamashup.upstream import FetchAsync, AwaitUpstream, UpstreamDeadline, UpstreamUnavailable, ResetUpstreamAfterFork
+from tsamashup.history import StoredTSAWaitTimes, ParseAirportList
+from tsamashup.metadata import AirportMetadata
+from tsamashup.waittimes import WaitTimeSnapshot, WaitTimeStatsByAirport
+
+
+## NATIONWIDE REPORT
+## Every airport's checkpoint count, precheck and wait times. Airports are split into shards spread over a pool of
+## worker processes; each worker requests its shard's wait times concurrently on its fetch thread pool, and rows
+## are written as shards finish. The output file doubles as the progress record, so a stopped run can be resumed,
+## and airports whose wait times couldn't be loaded are tried again.
+
+REPORT_FIELDS = ["airport", "status", "name", "city", "state", "checkpoints", "precheck", "reports",
+                 "averageWait", "worstWait", "percentileWait"]
+# Airports per worker task, small enough that rows are written steadily and a stopped run loses little
+REPORT_SHARD_SIZE = 25
+REPORT_PERCENTILE = 90
+
+def InitReportWorker():
+    """
+    Worker process initializer: loads the airport metadata once per worker. Forked workers inherit the parent's
+    already loaded, read-only metadata, whose memory-mapped index pages are shared rather than copied.
+    The fetch pools, sessions and in-flight calls they inherit are dropped, as their threads stayed in the parent.
+    """
+    ResetUpstreamAfterFork()
+    AirportMetadata()
+
+def ReportShard(airportCodes):
+    """
+    Builds the report rows for one shard of airports, requesting their wait times concurrently and waiting at most
+    the TSA deadline for them.
+    :param airportCodes: List of 3-letter shortcodes
+    :return: Returns a list of row dictionaries with the REPORT_FIELDS keys
+    """
+    TSAairportDict = AirportMetadata()
+    pending = [(airportCode, FetchAsync("tsa", StoredTSAWaitTimes, airportCode)) for airportCode in airportCodes
+               if airportCode in TSAairportDict]
+    tsaDeadline = UpstreamDeadline("tsa", len(pending))
+
+    rows = []
+    snapshots = []
+    for airportCode in airportCodes:
+        if airportCode not in TSAairportDict:
+            rows.append(ReportRow(airportCode, "UNKNOWN_AIRPORT"))
+    for airportCode, pendingTSA in pending:
+        try:
+            snapshots.append(WaitTimeSnapshot(airportCode, AwaitUpstream("tsa", pendingTSA, tsaDeadline)))
+        except UpstreamUnavailable, e:
+            rows.append(ReportRow(airportCode, "TSA_UNAVAILABLE", TSAairportDict[airportCode]))
+
+    for airportCode, stats in WaitTimeStatsByAirport(snapshots, REPORT_PERCENTILE).items():
+        rows.append(ReportRow(airportCode, "OK", TSAairportDict[airportCode], stats))
+    return rows
+
+def ReportRow(airportCode, status, airport=None, stats=None):
+    """
+    :param airportCode: 3-letter shortcode of airport
+    :param status: OK, or the reason there are no wait times
+    :param airport: TSAAirport instance, if the airport is known
+    :param stats: The airport's statistics from WaitTimeStatsByAirport, if its wait times were loaded
+    :return: Returns a row dictionary with the REPORT_FIELDS keys
+    """
+    row = dict.fromkeys(REPORT_FIELDS)
+    row["airport"] = airportCode
+    row["status"] = status
+    if airport is not None:
+        row["name"] = airport.name
+        row["city"] = airport.city
+        row["state"] = airport.state
+        row["checkpoints"] = len(airport.checkpoints)
+        row["precheck"] = airport.precheck
+    if stats is not None:
+        row["reports"] = stats["count"]
+        row["averageWait"] = stats["avg"]
+        row["worstWait"] = stats["worst"]
+        row["percentileWait"] = stats["percentile"]
+    return row
+
+def CompletedAirports(fname, fmt="csv"):
+    """
+    Reads the airports an earlier, possibly interrupted, run already reported, and drops the rest of its rows so
+    they are tried again: rows without wait times, e.g. TSA_UNAVAILABLE, and a partly written last line.
+    The file is only rewritten when there are rows to drop, under a temporary name that is renamed into place.
+    :param fname: Report file
+    :param fmt: csv or jsonl
+    :return: Returns the set of shortcodes already in the file with status OK
+    """
+    with open(fname, "rb") as fobj:
+        data = fobj.read()
+    lines = data.splitlines(True)
+    if lines and not lines[-1].endswith("\n"):
+        lines.pop()
+    header = []
+    if fmt == "jsonl":
+        rows = [json.loads(line) if line.strip() else None for line in lines]
+    else:
+        header, lines = lines[:1], lines[1:]
+        rows = list(csv.DictReader(header + lines))
+
+    kept = [line for line, row in zip(lines, rows) if row is not None and row["status"] == "OK"]
+    if len(header) + len(kept) < len(data.splitlines(True)):
+        tmp_fname = "{}.{}.tmp".format(fname, os.getpid())
+        with open(tmp_fname, "wb") as fobj:
+            fobj.write("".join(header + kept))
+        os.rename(tmp_fname, fname)
+    return set(row["airport"] for row in rows if row is not None and row["status"] == "OK")
+
+def GenerateReport(airportCodes, fobj, fmt="csv", processes=None, shardSize=REPORT_SHARD_SIZE, header=True):
+    """
+    Writes a report row for each airport, in the order shards finish, flushing after each shard.
+    :param airportCodes: List of 3-letter shortcodes
+    :param fobj: Open file object to write to
+    :param fmt: csv or jsonl
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :param shardSize: Airports per worker task
+    :param header: If a CSV header row should be written first
+    :return: Returns a dictionary of the number of rows written by status
+    """
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(fobj, REPORT_FIELDS)
+        if header:
+            writer.writeheader()
+
+    # the parent loads the metadata before forking, so every worker starts with it
+    AirportMetadata()
+    shards = [airportCodes[start:start + shardSize] for start in range(0, len(airportCodes), shardSize)]
+    counts = {}
+    pool = multiprocessing.Pool(processes, InitReportWorker)
+    try:
+        for rows in pool.imap_unordered(ReportShard, shards):
+            for row in rows:
+                if writer is not None:
+                    writer.writerow(dict((k, v.encode("utf-8") if isinstance(v, unicode) else v) for k, v in row.items()))
+                else:
+                    fobj.write(json.dumps(row, sort_keys=True) + "\n")
+                counts[row["status"]] = counts.get(row["status"], 0) + 1
+            fobj.flush()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return counts
+
+def MainReport(argv):
+    """
+    Report program entry point, e.g. python tsa-mashup.py report --output report.csv --resume
+    :param argv: Command line arguments after "report"
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py report", description="Report every airport's wait times.")
+    parser.add_argument("--output", required=True, help="CSV or JSONL report file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Report format, defaults to the output file extension or csv")
+    parser.add_argument("--airports", help="Comma separated airport shortcodes, defaults to every airport in apcp.xml")
+    parser.add_argument("--processes", type=int, help="Worker processes, defaults to the number of CPUs")
+    parser.add_argument("--shard-size", type=int, default=REPORT_SHARD_SIZE, help="Airports per worker task")
+    parser.add_argument("--resume", action="store_true", help="Skip the airports already reported OK in the output file and append the rest")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("jsonl" if args.output.endswith(".jsonl") else "csv")
+    airportCodes = ParseAirportList(args.airports) or sorted(AirportMetadata().keys())
+
+    resuming = args.resume and os.path.exists(args.output) and os.path.getsize(args.output) > 0
+    if resuming:
+        completed = CompletedAirports(args.output, fmt)
+        airportCodes = [airportCode for airportCode in airportCodes if airportCode not in completed]
+        print >> sys.stderr, "Resuming, {} airports already reported.".format(len(completed))
+
+    # a resumed file may have lost everything, its header included, to a partly written first line
+    header = not resuming or os.path.getsize(args.output) == 0
+    with open(args.output, "ab" if resuming else "wb") as fobj:
+        counts = GenerateReport(airportCodes, fobj, fmt, args.processes, args.shard_size, header=header)
+    print >> sys.stderr, "Reported {} airports: {}.".format(
+        sum(counts.values()), ", ".join("{} {}".format(count, status) for status, count in sorted(counts.items())))
+    return
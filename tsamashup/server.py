@@ -0,0 +1,244 @@
+## IMPORT STATEMENTS
+
+# Json used for request and response bodies
+import json
+# Os used for the API key environment variable
+import os
+# Urlparse used for reading request paths and query strings
+import urlparse
+# Argparse used for parsing server command line options
+import argparse
+# BaseHTTPServer and SocketServer used for the threaded HTTP server
+import BaseHTTPServer
+import SocketServer
+# Traceback used for logging unexpected errors
+import traceback
+
+from tsamashup.cache import CacheStats
+from tsamashup.upstream import FetchAsync, GetTSAWaitTimes, FlightStats, BreakerStats, UpstreamUnavailable, TRAFFIC_MODELS, UNITS
+from tsamashup.metadata import AirportMetadata
+from tsamashup.waittimes import TSAWaitTimes
+from tsamashup.history import StoredTSAWaitTimes, WaitTimePoller, ParseAirportList, wait_time_store, POLL_INTERVAL, POLL_BUDGET
+from tsamashup.batch import BatchLeaveTimes, ParseYesNo, ParseTripOrigin, ParseTripTimes, BATCH_FLAG_FIELDS
+from tsamashup.metrics import instrumentation, FormatSnapshot
+from tsamashup.refresh import MetadataRefresher
+
+
+## HTTP SERVICE
+## Serves leave time estimates over HTTP/JSON from one long-running process, so the airport metadata,
+## response caches and connection pools stay warm between requests.
+
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8080
+
+# HTTP status for each batch result status that isn't OK
+ESTIMATE_ERROR_STATUS = {"BAD_ORIGIN": 400, "BAD_TIME": 400, "UNKNOWN_AIRPORT": 404, "TSA_UNAVAILABLE": 502, "DISTANCE_UNAVAILABLE": 502}
+
+def AirportSummary(airport):
+    """
+    :param airport: TSAAirport instance
+    :return: Returns the airport's metadata as a JSON-ready dictionary
+    """
+    return {"shortcode": airport.shortcode, "name": airport.name, "city": airport.city, "state": airport.state,
+            "latitude": airport.latitude, "longitude": airport.longitude, "utc": airport.utc, "dst": airport.dst,
+            "precheck": airport.precheck,
+            "checkpoints": [{"id": checkpoint.id, "name": checkpoint.longname} for checkpoint in airport.checkpoints]}
+
+def AirportWaitTimeStats(airportCode, TSAairportDict, pct=90, window=3600):
+    """
+    Summarizes an airport's current TSA wait times. Raises KeyError for an unknown airport.
+    :param airportCode: 3-letter shortcode of airport
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :param pct: Percentile to report, between 0 and 100
+    :param window: Length in seconds of the window for the windowed average
+    :return: Returns a JSON-ready dictionary of wait time statistics, in seconds
+    """
+    if airportCode not in TSAairportDict:
+        raise KeyError(airportCode)
+    waitTimes = TSAWaitTimes(airportCode, TSAairportDict, GetTSAWaitTimes(airportCode, FetchAsync("tsa", StoredTSAWaitTimes, airportCode)))
+    worstWaitDate, worstWaitTot = waitTimes.WorstWaitTime()
+    return {"airport": airportCode,
+            "reports": len(waitTimes.snapshot.records),
+            "slowestNow": waitTimes.slowestWaitTimeNow(),
+            "average": waitTimes.AvgAllWaitTime(),
+            "worst": worstWaitTot,
+            "worstAt": worstWaitDate,
+            "percentile": pct,
+            "percentileWait": waitTimes.WaitTimePercentile(pct),
+            "window": window,
+            "windowedAverage": waitTimes.WindowedAvgWaitTime(window),
+            "maxByCheckpoint": dict((str(chk), wait) for chk, wait in waitTimes.MaxWaitTimeByCheckpoint().items())}
+
+def EstimateLeaveTime(params, key, TSAairportDict):
+    """
+    Calculates one leave time estimate from request parameters. Raises ValueError when origin or airport is missing,
+    or traffic_model or units isn't one Google accepts.
+    :param params: Dictionary with origin and airport, and optionally precheck, international, checkedBags, rentalCar,
+    pessimistic (y/n), departure and arrival (airport local time, e.g. 2016-11-28T07:30), traffic_model and units
+    :param key: Google API key
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :return: Returns a batch result dictionary, see BatchLeaveTimes
+    """
+    if not params.get("origin") or not params.get("airport"):
+        raise ValueError("origin and airport are required")
+    trip = {"id": "1", "airport": params["airport"].strip().upper()}
+    ParseTripOrigin(trip, params)
+    for field in BATCH_FLAG_FIELDS:
+        trip[field] = ParseYesNo(params.get(field))
+    ParseTripTimes(trip, params)
+    traffic_model = params.get("traffic_model")
+    if traffic_model is not None and traffic_model not in TRAFFIC_MODELS:
+        raise ValueError("traffic_model must be one of " + ", ".join(TRAFFIC_MODELS))
+    units = params.get("units", "imperial")
+    if units not in UNITS:
+        raise ValueError("units must be one of " + ", ".join(UNITS))
+    return BatchLeaveTimes([trip], key, TSAairportDict, units, traffic_model)[0]
+
+class EstimateRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    GET /airports                      every airport's metadata
+    GET /airports/<CODE>/waittimes     an airport's wait time statistics, optional pct and window parameters
+    GET /estimate?origin=..&airport=.. a leave time estimate, optional precheck, international, checkedBags,
+                                       rentalCar, pessimistic (y/n), departure, arrival, traffic_model and units parameters,
+                                       with stale listing the inputs that fell back on what was last known
+    GET /stats                         response cache, origin alias, single-flight, circuit breaker, poller and metadata
+                                       refresh counters
+    GET /metrics                       stage timings, upstream latencies and payload sizes, counters and hit
+                                       ratios, as JSON or with format=text as lines of text
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        params = dict((name, values[-1]) for name, values in urlparse.parse_qs(url.query).items())
+        parts = [part for part in url.path.split("/") if part]
+        TSAairportDict = self.server.TSAairportDict
+        try:
+            if parts == ["airports"]:
+                self.sendJSON(200, self.server.airports())
+            elif len(parts) == 3 and parts[0] == "airports" and parts[2] == "waittimes":
+                airportCode = parts[1].upper()
+                if airportCode in TSAairportDict:
+                    self.sendJSON(200, AirportWaitTimeStats(airportCode, TSAairportDict, float(params.get("pct", 90)),
+                                                            int(params.get("window", 3600))))
+                else:
+                    self.sendJSON(404, {"error": "Unknown airport {}".format(airportCode)})
+            elif parts == ["estimate"]:
+                result = EstimateLeaveTime(params, self.server.key, TSAairportDict)
+                self.sendJSON(200 if result["status"] == "OK" else ESTIMATE_ERROR_STATUS.get(result["status"], 422), result)
+            elif parts == ["stats"]:
+                stats = {"caches": CacheStats(), "flights": FlightStats(), "breakers": BreakerStats()}
+                if self.server.poller is not None:
+                    stats["poller"] = self.server.poller.stats()
+                if self.server.refresher is not None:
+                    stats["metadata"] = self.server.refresher.stats()
+                self.sendJSON(200, stats)
+            elif parts == ["metrics"]:
+                snapshot = instrumentation.snapshot()
+                if params.get("format") == "text":
+                    self.sendText(200, FormatSnapshot(snapshot) + "\n")
+                else:
+                    self.sendJSON(200, snapshot)
+            else:
+                self.sendJSON(404, {"error": "Not found"})
+        except ValueError, e:
+            self.sendJSON(400, {"error": str(e)})
+        except UpstreamUnavailable, e:
+            self.sendJSON(502, {"error": str(e)})
+        except Exception, e:
+            # anything else is a bug, logged rather than passed off as the client's or an upstream's fault
+            self.log_error("%s", traceback.format_exc())
+            self.sendJSON(500, {"error": "Internal server error"})
+
+    def sendJSON(self, status, body):
+        self.sendText(status, json.dumps(body, sort_keys=True), "application/json")
+
+    def sendText(self, status, payload, contentType="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class EstimateServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded HTTP server holding the warm state shared by every request: the airport metadata, and through the
+    tsamashup modules, the response caches and connection pools.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, key, TSAairportDict=None, poller=None, refresher=None):
+        BaseHTTPServer.HTTPServer.__init__(self, address, EstimateRequestHandler)
+        self.key = key
+        self.poller = poller
+        self.refresher = refresher
+        # (TSAairportDict, airport summaries), see airports
+        self.airportList = None
+        self.setMetadata(TSAairportDict if TSAairportDict is not None else AirportMetadata())
+
+    def setMetadata(self, TSAairportDict):
+        """
+        Switches to new airport metadata, e.g. after a refresh. Requests already running finish with the old metadata.
+        :param TSAairportDict: Dictionary of TSA metadata airport instances
+        """
+        self.TSAairportDict = TSAairportDict
+
+    def airports(self):
+        """
+        Builds the airport list on the first GET /airports for each metadata, so starting or refreshing the metadata
+        doesn't build every airport.
+        :return: Returns every airport's summary, sorted by shortcode, see AirportSummary
+        """
+        TSAairportDict = self.TSAairportDict
+        airportList = self.airportList
+        if airportList is None or airportList[0] is not TSAairportDict:
+            airportList = (TSAairportDict, [AirportSummary(airport) for airport in
+                                            sorted(TSAairportDict.values(), key=lambda airport: airport.shortcode)])
+            self.airportList = airportList
+        return airportList[1]
+
+def MainServe(argv):
+    """
+    Server program entry point, e.g. python tsa-mashup.py serve --port 8080 --key KEY
+    :param argv: Command line arguments after "serve"
+    :return: end of program
+    """
+    parser = argparse.ArgumentParser(prog="tsa-mashup.py serve", description="Serve leave time estimates over HTTP/JSON.")
+    parser.add_argument("--host", default=DEFAULT_SERVE_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVE_PORT)
+    parser.add_argument("--key", default=os.environ.get("GOOGLE_API_KEY"), help="Google API key, defaults to $GOOGLE_API_KEY")
+    parser.add_argument("--collect", help="Comma separated airport shortcodes to poll in the background, e.g. DCA,IAD,BWI")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Seconds between polls of each collected airport")
+    parser.add_argument("--budget", type=int, default=POLL_BUDGET, help="Most TSA polls in any hour")
+    parser.add_argument("--metrics", action="store_true", help="Collect the stage timings and counters served on /metrics")
+    parser.add_argument("--refresh-metadata", type=float, metavar="SECONDS",
+                        help="Check TSA for a new apcp.xml every SECONDS and apply it without restarting")
+    args = parser.parse_args(argv)
+
+    if not args.key:
+        parser.error("a Google API key is required, pass --key or set GOOGLE_API_KEY")
+    if args.metrics:
+        instrumentation.enable()
+
+    # collected airports are answered from the wait time store, keeping TSA requests off the request path
+    poller = None
+    if args.collect:
+        poller = WaitTimePoller(wait_time_store, ParseAirportList(args.collect), args.interval, budget=args.budget)
+        poller.start()
+
+    refresher = None
+    if args.refresh_metadata:
+        refresher = MetadataRefresher(args.refresh_metadata)
+
+    server = EstimateServer((args.host, args.port), args.key, poller=poller, refresher=refresher)
+    if refresher is not None:
+        refresher.onRefresh = server.setMetadata
+        refresher.start()
+    print "Serving leave time estimates on http://{}:{}/".format(args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return
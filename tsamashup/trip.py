@@ -0,0 +1,297 @@
+## IMPORT STATEMENTS
+
+# Time used for the age of fallback wait times and travel times
+import time
+
+from tsamashup.upstream import FetchAsync, FetchDistanceMatrix, GetTSAWaitTimes, GetDistance, UpstreamUnavailable
+from tsamashup.upstream import LastKnownTravelTime, UpstreamDeadline
+from tsamashup.waittimes import TSAWaitTimes
+from tsamashup.history import StoredTSAWaitTimes, LastKnownTSAWaitTimes
+from tsamashup.forecast import ForecastModel
+from tsamashup.metrics import instrumentation, Instrumented
+from tsamashup.payloads import ParseDistanceMatrix, TSAWaitTimesFeed
+
+
+## AIRPORT CLASS
+
+class Airport:
+    """
+    Combines TSA Airport metadata data with TSA wait times.
+    stale is set when TSA was unavailable and the wait times are the last ones known, see DegradedAirport.
+    """
+    def __init__(self, airportCode, TSAairportDict, feed=None):
+        self.stale = False
+        self.staleAge = None
+        self.airportCode = airportCode
+        self.name = TSAairportDict[airportCode].name
+        self.shortcode = TSAairportDict[airportCode].shortcode
+        self.city = TSAairportDict[airportCode].city
+        self.state = TSAairportDict[airportCode].state
+        self.latitude = TSAairportDict[airportCode].latitude
+        self.longitude = TSAairportDict[airportCode].longitude
+        self.utc = TSAairportDict[airportCode].utc
+        self.dst = TSAairportDict[airportCode].dst
+        self.precheck = TSAairportDict[airportCode].precheck
+        self.checkpoints = TSAWaitTimes(airportCode, TSAairportDict, feed)
+
+## GOOGLEDISTANCE CLASS
+
+class GoogleDistance:
+    """
+    Used to create instances of trip distances from origin address to airport with Google Distance Matrix API.
+    matrix is a single origin, single destination DistanceMatrix, or the json response it's parsed from.
+    elementStatus is OK, or why there is no travel time, e.g. ZERO_RESULTS when there's no route, for the caller to report.
+    stale is set when Google was unavailable and the travel time is the last one known, see DegradedDistance.
+    """
+    def __init__(self, origin, airportCode, key, units="imperial", matrix=None):
+        self.origin = origin
+        self.airportCode = airportCode
+        self.key = key
+        self.units = units
+        self.stale = False
+        self.staleAge = None
+
+        if matrix is None:
+            matrix = GetDistance(origin, airportCode, key)
+        elif isinstance(matrix, dict):
+            matrix = ParseDistanceMatrix(matrix)
+        self.matrix = matrix
+        self.status = matrix.status
+        self.elementStatus = matrix.element(0, 0).status if matrix.status == "OK" else matrix.status
+
+        if self.elementStatus == "OK":
+            element = matrix.element(0, 0)
+            self.durationText = element.durationText
+            self.durationValue = element.durationValue
+            self.distanceText = element.distanceText
+            self.distanceValue = element.distanceValue
+        else:
+            self.durationText = ""
+            self.durationValue = 0
+            self.distanceText = ""
+            self.distanceValue = 0
+
+        self.originAddress = matrix.originAddresses[0] if matrix.originAddresses else ""
+        self.destinationAddress = matrix.destinationAddresses[0] if matrix.destinationAddresses else ""
+
+    def __str__(self):
+        returnStr = "Origin: " + self.originAddress +  "\nDestination: " + self.destinationAddress + "\nDuration: " + self.durationText + "\nDistance: " + self.distanceText
+        return returnStr
+
+    def PessimisticDuration(self):
+        #just for laughs
+        return int(self.durationValue * 1.25)
+
+
+## TRIP CLASS
+class Trip:
+    """
+    Creates a master class of the trip, including airport, security wait times, and distance with traffic data.
+    Pass departure_time (seconds since 1970 UTC) and optionally traffic_model to plan for the traffic expected then.
+    Raises KeyError for an airport that isn't in TSAairportDict. Nothing is printed, see distance.elementStatus for
+    whether Google found a route.
+    """
+    def __init__(self, origin, airportCode, key, TSAairportDict, units="imperial", airport=None, distance=None,
+                 departure_time=None, traffic_model=None):
+        self.origin = origin
+        self.airportCode = airportCode
+        self.key = key
+        self.units = units
+        self.TSAairportDict = TSAairportDict
+
+        # Start the TSA and Google requests together, so the trip takes as long as the slower of the two
+        pendingTSA = None
+        if airport is None and airportCode in TSAairportDict:
+            pendingTSA = FetchAsync("tsa", StoredTSAWaitTimes, airportCode)
+        pendingDistance = None
+        if distance is None:
+            pendingDistance = FetchAsync("google", FetchDistanceMatrix, [origin], [airportCode], key, units, departure_time, traffic_model)
+        tsaDeadline = UpstreamDeadline("tsa")
+        googleDeadline = UpstreamDeadline("google")
+
+        # Already fetched airport and distance instances can be passed in, e.g. from batch mode
+        # When TSA or Google is unavailable, the trip falls back on what's known, and raises UpstreamUnavailable
+        # if that's nothing
+        if airport is not None:
+            self.airport = airport
+        elif pendingTSA is not None:
+            self.airport = AwaitAirport(airportCode, TSAairportDict, pendingTSA, tsaDeadline)
+        else:
+            self.airport = Airport(airportCode, TSAairportDict)
+
+        try:
+            if distance is not None:
+                self.distance = distance
+            else:
+                self.distance = GoogleDistance(origin, airportCode, key, units,
+                                               GetDistance(origin, airportCode, key, units, pendingDistance,
+                                                           deadlineAt=googleDeadline))
+        except UpstreamUnavailable, e:
+            self.distance = DegradedDistance(origin, airportCode, key, units)
+
+    def StaleInputs(self):
+        """
+        :return: Returns a dictionary of the inputs that aren't current, waitTime and/or travelTime, to the age in
+        seconds of what was used instead, None for a wait time predicted because none was known
+        """
+        stale = {}
+        if self.airport.stale:
+            stale["waitTime"] = self.airport.staleAge
+        if self.distance.stale:
+            stale["travelTime"] = self.distance.staleAge
+        return stale
+
+
+## DEGRADED MODE
+## When TSA or Google fails, misses its deadline or has its circuit breaker open, an estimate falls back on the
+## last wait times and travel times known, or on the wait time forecast, and says which inputs are stale.
+
+def AwaitAirport(airportCode, TSAairportDict, pending, deadlineAt=None):
+    """
+    Waits for an airport's pending wait times, falling back on DegradedAirport if TSA is unavailable.
+    :param airportCode: 3-letter shortcode of airport
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :param pending: Pending FetchAsync result of the airport's wait times
+    :param deadlineAt: Optional time to stop waiting, see UpstreamDeadline
+    :return: Returns the Airport, raises UpstreamUnavailable if there is nothing to fall back on
+    """
+    try:
+        feed = GetTSAWaitTimes(airportCode, pending, deadlineAt)
+    except UpstreamUnavailable, e:
+        return DegradedAirport(airportCode, TSAairportDict)
+    return Airport(airportCode, TSAairportDict, feed)
+
+def DegradedAirport(airportCode, TSAairportDict):
+    """
+    Builds an airport from the last wait times known for it. Without any, its wait times are left empty, and the
+    wait time forecast stands in for them if it has history for the airport, see CheckpointWaitTime.
+    :param airportCode: 3-letter shortcode of airport
+    :param TSAairportDict: Dictionary of TSA metadata airport instances
+    :return: Returns the stale Airport, raises UpstreamUnavailable if there is nothing to fall back on
+    """
+    lastKnown = LastKnownTSAWaitTimes(airportCode)
+    if lastKnown is not None:
+        airport = Airport(airportCode, TSAairportDict, lastKnown[0])
+        airport.staleAge = time.time() - lastKnown[1]
+        if instrumentation.enabled:
+            instrumentation.count("degraded.waitTime.lastKnown")
+    else:
+        model = ForecastModel()
+        if model is None or not model.checkpoints(airportCode):
+            raise UpstreamUnavailable("tsa", "no wait times known")
+        airport = Airport(airportCode, TSAairportDict, TSAWaitTimesFeed())
+        if instrumentation.enabled:
+            instrumentation.count("degraded.waitTime.predicted")
+    airport.stale = True
+    return airport
+
+def DegradedDistance(origin, airportCode, key, units="imperial"):
+    """
+    Builds a trip distance from the last travel time known from the origin's location to the airport.
+    :param origin: Where the trip to the airport starts
+    :param airportCode: 3-letter shortcode of airport
+    :param key: Google API key
+    :param units: Measurement return from Google API, can also be metric
+    :return: Returns the stale GoogleDistance, raises UpstreamUnavailable if there is nothing to fall back on
+    """
+    lastKnown = LastKnownTravelTime(origin, airportCode, units)
+    if lastKnown is None:
+        raise UpstreamUnavailable("google", "no travel time known")
+    distance = GoogleDistance(origin, airportCode, key, units, lastKnown[0])
+    distance.stale = True
+    distance.staleAge = time.time() - lastKnown[1]
+    if instrumentation.enabled:
+        instrumentation.count("degraded.travelTime.lastKnown")
+    return distance
+
+
+## LEAVE TIME CALCULATIONS
+
+def CheckpointWaitTime(UserTrip, arrival_time=None):
+    """
+    The security wait to plan for. When the user says when they'll get to security and the wait time forecast
+    has history for the airport, that's the wait predicted for then, otherwise it's the slowest wait right now.
+    When TSA was unavailable, that's the slowest of the last wait times known, or without any the wait predicted
+    for now.
+    :param arrival_time: Optional datetime in the airport's local time when the user gets to security
+    :return: Returns a tuple of the wait time in seconds and where it came from, predicted, current or lastKnown
+    """
+    if arrival_time is None and UserTrip.airport.stale and UserTrip.airport.staleAge is None:
+        arrival_time = UserTrip.TSAairportDict[UserTrip.airportCode].localTime(time.time())
+    if arrival_time is not None:
+        model = ForecastModel()
+        if model is not None:
+            predicted = model.predict(UserTrip.airportCode, None, arrival_time)
+            if predicted is not None:
+                return (predicted, "predicted")
+    return (UserTrip.airport.checkpoints.slowestWaitTimeNow(), "lastKnown" if UserTrip.airport.stale else "current")
+
+@Instrumented
+def CalcBuffer(UserTrip, trip_precheck, trip_international, trip_checkedBags, trip_rentalCar, arrival_time=None):
+    """
+    Calculates the total buffer based on user responses.
+    :param trip_precheck: If the user has TSA Precheck
+    :param trip_international: If it's an international flight (otherwise, assume domestic)
+    :param trip_checkedBags: If the user will be checking in bags
+    :param trip_rentalCar: If the user will be returning a rental car
+    :param arrival_time: Optional datetime in the airport's local time when the user gets to security, see CheckpointWaitTime
+    :return: Return total trip buffer in seconds (time to allow besides trip time and security checkpoint delays)
+    """
+    ## All default buffer values expressed in seconds
+    domestic_buffer = 4500
+    international_buffer = 10800
+    checkedBags_buffer = 900
+    returnRentalCar_buffer = 1800
+
+    total_buffer = 0
+    if trip_precheck:
+        if not UserTrip.airport.precheck:
+            total_buffer += CheckpointWaitTime(UserTrip, arrival_time)[0]
+    else:
+        total_buffer += CheckpointWaitTime(UserTrip, arrival_time)[0]
+
+    if trip_international:
+        total_buffer += international_buffer
+    else:
+        total_buffer += domestic_buffer
+
+    if trip_checkedBags:
+        total_buffer += checkedBags_buffer
+
+    if trip_rentalCar:
+        total_buffer += returnRentalCar_buffer
+
+    return total_buffer
+
+def CalcTotalTime(UserTrip, trip_precheck, trip_international, trip_checkedBags, trip_rentalCar, trip_pessimistic,
+                  arrival_time=None):
+    """
+    Calculates how long before the scheduled departure the user should leave.
+    :param trip_pessimistic: If the user is a pessimist, pads the travel time
+    :param arrival_time: Optional datetime in the airport's local time when the user gets to security, see CheckpointWaitTime
+    :return: Returns a tuple of the total time, buffer time and travel time, in seconds
+    """
+    total_buffer = CalcBuffer(UserTrip, trip_precheck, trip_international, trip_checkedBags, trip_rentalCar, arrival_time)
+
+    if trip_pessimistic:
+        total_traveltime = UserTrip.distance.PessimisticDuration()
+    else:
+        total_traveltime = UserTrip.distance.durationValue
+
+    return (total_buffer + total_traveltime, total_buffer, total_traveltime)
+
+def LeaveTimeMessage(total_time):
+    """
+    Phrases the total time as departure advice.
+    :param total_time: Total time in seconds, from CalcTotalTime
+    :return: Returns the advice string shown to the user
+    """
+    if total_time > 3600:
+        total_hours = total_time / 3600
+        total_min = (total_time % 3600) / 60
+        return "Leave for the airport {} hours and {} minutes before the scheduled departure.".format(total_hours, total_min)
+    elif total_time > 60:
+        total_min = total_time / 60
+        return "Leave for the airport {} minutes before the scheduled departure.".format(total_min)
+    else:
+        return "Total time is less than a minute. Did you put the airport as your departure address?"
@@ -0,0 +1,429 @@
+## IMPORT STATEMENTS
+
+# Requests used to pull REST API results
+import requests
+# Retry used for retrying failed REST API requests on pooled connections
+from requests.packages.urllib3.util.retry import Retry
+# Threading and ThreadPool used for running REST API requests concurrently, TimeoutError for deadlines on them
+import threading
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+# Os used for reading upstream url overrides from the environment
+import os
+# Time used for bucketing departure times
+import time
+
+from tsamashup.cache import tsa_cache, distance_cache, last_travel_times, DISTANCE_DEPARTURE_BUCKET, LAST_KNOWN_TRAVEL_AGE
+from tsamashup.cache import SingleFlight, cacheKeyURL
+from tsamashup.breaker import CircuitBreaker
+from tsamashup.geo import OriginCell, origin_aliases
+from tsamashup.metrics import instrumentation, Instrumented
+from tsamashup.payloads import DecodeJSON, ParseTSAWaitTimes, ParseDistanceMatrix, DistanceMatrix, PayloadError
+from tsamashup.payloads import ParseGeocode, Geocode
+
+
+## UPSTREAM CONNECTIONS
+## One pooled keep-alive session and one bounded thread pool per REST API, so a hanging API can only tie up its
+## own threads and connections (a bulkhead). Each REST API has a circuit breaker, and an estimate waits at most the
+## API's deadline for it.
+
+# (connect, read) timeouts in seconds, retries for connection errors and 5xx responses, and the seconds between
+# retries after the first. Every attempt, retries included, gives up within the deadline, see UpstreamAttemptTime.
+# metadata is TSA's apcp.xml and its checksum, kept apart from the wait times so a slow download can't trip their breaker
+UPSTREAM_TIMEOUT = {"tsa": (1.05, 2.5), "google": (1.05, 2.5), "metadata": (3.05, 25)}
+UPSTREAM_RETRIES = {"tsa": 0, "google": 0, "metadata": 1}
+UPSTREAM_BACKOFF = 0.3
+# Threads running each REST API's requests, and the connections kept open to it
+UPSTREAM_POOL_SIZE = {"tsa": 16, "google": 8, "metadata": 1}
+# Seconds an estimate waits for each REST API before falling back, responses slower than this count as failures
+UPSTREAM_DEADLINE = {"tsa": 4, "google": 4, "metadata": 60}
+# What each REST API provides, for error messages
+UPSTREAM_DESCRIPTIONS = {"tsa": "TSA wait times", "google": "distance to airport from Google Distance Matrix",
+                         "metadata": "TSA airport metadata"}
+
+upstream_sessions = {}
+upstream_lock = threading.Lock()
+fetch_pools = {}
+# identical requests in flight at the same time, e.g. many users checking one airport, share one upstream call
+upstream_flight = SingleFlight("upstream")
+# functions called with (upstream, params, response text) for every upstream response, e.g. to record fixtures
+upstream_recorders = []
+upstream_breakers = {"tsa": CircuitBreaker("tsa"), "google": CircuitBreaker("google"), "metadata": CircuitBreaker("metadata")}
+
+class UpstreamUnavailable(Exception):
+    """
+    A REST API failed, didn't answer within its deadline, or has its circuit breaker open.
+    """
+    def __init__(self, upstream, reason):
+        Exception.__init__(self, "{} unavailable: {}".format(upstream, reason))
+        self.upstream = upstream
+        self.reason = reason
+
+def UpstreamSession(upstream):
+    """
+    Returns the shared session for one REST API, creating it on first use.
+    The session keeps connections open between requests and retries connection errors and 5xx responses.
+    :param upstream: tsa, google or metadata
+    :return: Returns a requests Session
+    """
+    session = upstream_sessions.get(upstream)
+    if session is None:
+        with upstream_lock:
+            session = upstream_sessions.get(upstream)
+            if session is None:
+                retries = Retry(total=UPSTREAM_RETRIES[upstream], backoff_factor=UPSTREAM_BACKOFF,
+                                status_forcelist=[500, 502, 503, 504])
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=UPSTREAM_POOL_SIZE[upstream],
+                                                        max_retries=retries)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                upstream_sessions[upstream] = session
+    return session
+
+def UpstreamGet(upstream, url, params):
+    """
+    Makes a GET request on the upstream's shared session, with the upstream's timeout. Raises on failure, and with
+    CircuitOpenError without making the request while the upstream's circuit breaker is open.
+    Errors, 5xx responses and responses slower than the upstream's deadline count against the breaker, once per
+    request however many estimates are waiting on it.
+    :param upstream: tsa, google or metadata
+    :param url: REST API root url
+    :param params: Parameters dictionary for REST API
+    :return: Returns the response
+    """
+    breaker = upstream_breakers[upstream]
+    generation = breaker.allow()
+    start = time.time()
+    try:
+        response = UpstreamSession(upstream).get(url, params=params, timeout=UPSTREAM_TIMEOUT[upstream])
+        response.raise_for_status()
+    except Exception, e:
+        # a 4xx is the request's fault, not the upstream's
+        if isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code < 500:
+            breaker.success(generation)
+        else:
+            breaker.failure(generation)
+        if instrumentation.enabled:
+            instrumentation.count("errors.upstream.{}.{}".format(upstream, type(e).__name__))
+            instrumentation.observe("upstream", upstream, time.time() - start)
+        raise
+
+    elapsed = time.time() - start
+    if elapsed > UPSTREAM_DEADLINE[upstream]:
+        breaker.failure(generation)
+    else:
+        breaker.success(generation)
+    if instrumentation.enabled:
+        instrumentation.observe("upstream", upstream, elapsed)
+        instrumentation.observe("payload", upstream, len(response.content))
+    return response
+
+def UpstreamAttemptTime(upstream):
+    """
+    :param upstream: tsa, google or metadata
+    :return: Returns the longest a request can take to fail in seconds, when every try times out connecting and
+    reading, ignoring slowly trickled responses
+    """
+    connect, read = UPSTREAM_TIMEOUT[upstream]
+    retries = UPSTREAM_RETRIES[upstream]
+    # the first retry is immediate, then the wait doubles
+    backoff = sum(UPSTREAM_BACKOFF * 2 ** (retry - 1) for retry in range(2, retries + 1))
+    return (connect + read) * (retries + 1) + backoff
+
+def UpstreamGetJSON(upstream, url, params):
+    """
+    Makes a GET request like UpstreamGet and parses the json body straight from the bytes received. Concurrent calls
+    for the same request URL wait for one request and share its parsed result, so treat the result as read-only.
+    Raises on failure.
+    :param upstream: tsa or google
+    :param url: REST API root url
+    :param params: Parameters dictionary for REST API
+    :return: Returns the parsed json response
+    """
+    def fetch():
+        response = UpstreamGet(upstream, url, params)
+        for recorder in upstream_recorders:
+            recorder(upstream, params, response.text)
+        return DecodeJSON(response.content)
+
+    return upstream_flight.do(cacheKeyURL(url, params), fetch)
+
+def FlightStats():
+    """
+    :return: Returns the call and collapsed call counters of the upstream single-flight layer
+    """
+    return [upstream_flight.stats()]
+
+def BreakerStats():
+    """
+    :return: Returns the state and counters of every upstream's circuit breaker
+    """
+    return [upstream_breakers[upstream].stats() for upstream in sorted(upstream_breakers)]
+
+instrumentation.addSource("breakers", BreakerStats)
+
+def FetchAsync(upstream, func, *args):
+    """
+    Runs func(*args) on the REST API's own fetch thread pool, creating the pool on first use.
+    :param upstream: tsa or google, the REST API func calls
+    :return: Returns a pending result, call .get() to wait for the value or re-raise the error
+    """
+    pool = fetch_pools.get(upstream)
+    if pool is None:
+        with upstream_lock:
+            pool = fetch_pools.get(upstream)
+            if pool is None:
+                pool = fetch_pools[upstream] = ThreadPool(UPSTREAM_POOL_SIZE[upstream])
+    return pool.apply_async(func, args)
+
+def ResetUpstreamAfterFork():
+    """
+    Drops the fetch pools, sessions and in-flight calls a forked child process inherits from its parent, e.g. a
+    report worker. The pools' threads don't survive a fork, so work handed to an inherited pool would never run, and
+    a call in flight at the fork would never finish. Each is created again on first use in the child.
+    """
+    global upstream_lock
+    upstream_lock = threading.Lock()
+    fetch_pools.clear()
+    upstream_sessions.clear()
+    upstream_flight.resetAfterFork()
+    for ttlCache in (tsa_cache, distance_cache, last_travel_times):
+        ttlCache.resetAfterFork()
+
+def UpstreamDeadline(upstream, started=1):
+    """
+    Requests started together share one deadline, so waiting on one after another doesn't add their deadlines up.
+    :param upstream: tsa or google
+    :param started: Number of requests to the upstream just started together on its fetch pool, which runs
+    UPSTREAM_POOL_SIZE of them at a time
+    :return: Returns when to stop waiting for the upstream's requests, seconds since 1970
+    """
+    size = UPSTREAM_POOL_SIZE[upstream]
+    return time.time() + UPSTREAM_DEADLINE[upstream] * ((started + size - 1) // size)
+
+def AwaitUpstream(upstream, pending, deadlineAt=None):
+    """
+    Waits for a pending FetchAsync result from one REST API until its deadline. A request still running then
+    carries on in the background and fills the caches for later estimates. It counts against the breaker once,
+    when it fails or its timeout runs out, not once for each estimate that stopped waiting for it.
+    Raises UpstreamUnavailable if the request failed or missed the deadline, or Google reported an outage.
+    :param upstream: tsa or google
+    :param pending: Pending result from FetchAsync
+    :param deadlineAt: When to stop waiting, see UpstreamDeadline, defaults to the upstream's deadline from now
+    :return: Returns the result
+    """
+    if deadlineAt is None:
+        deadlineAt = UpstreamDeadline(upstream)
+    try:
+        result = pending.get(max(deadlineAt - time.time(), 0))
+    except TimeoutError:
+        if instrumentation.enabled:
+            instrumentation.count("deadlines.{}.exceeded".format(upstream))
+        raise UpstreamUnavailable(upstream, "no response within the deadline")
+    except Exception, e:
+        raise UpstreamUnavailable(upstream, str(e) or type(e).__name__)
+    # Google reports an outage or a used up quota in the response status, rather than with an HTTP error
+    if isinstance(result, (DistanceMatrix, Geocode)) and result.status in GOOGLE_UNAVAILABLE_STATUSES:
+        raise UpstreamUnavailable(upstream, result.status)
+    return result
+
+
+## REST API REQUESTS
+
+# REST API root urls, can be pointed at a local stand-in server for offline testing
+TSA_BASE_URL = os.environ.get("TSA_BASE_URL", "http://apps.tsa.dhs.gov/MyTSAWebService/GetTSOWaitTimes.ashx")
+GOOGLE_BASE_URL = os.environ.get("GOOGLE_BASE_URL", "https://maps.googleapis.com/maps/api/distancematrix/json")
+GOOGLE_GEOCODE_URL = os.environ.get("GOOGLE_GEOCODE_URL", "https://maps.googleapis.com/maps/api/geocode/json")
+
+def FetchTSAWaitTimes(airportCode):
+    """
+    Returns wait times for a particular airport shortcode from the TSA response cache, requesting them on a miss.
+    :param airportCode: 3-letter shortcode of airport
+    :return: Returns the TSAWaitTimesFeed from TSA Wait Times API
+    """
+    return tsa_cache.get(airportCode, lambda: RequestTSAWaitTimes(airportCode))
+
+def RequestTSAWaitTimes(airportCode):
+    """
+    Requests wait times from the TSA Wait Times API for a particular airport shortcode. Raises on failure.
+    :param airportCode: 3-letter shortcode of airport
+    :return: Returns the TSAWaitTimesFeed from TSA Wait Times API, see ParseTSAWaitTimes
+    """
+    params_tsa_d = {}
+    params_tsa_d['ap'] = airportCode
+    params_tsa_d['output'] = 'json'
+    return ParseTSAWaitTimes(UpstreamGetJSON("tsa", TSA_BASE_URL, params_tsa_d))
+
+@Instrumented
+def GetTSAWaitTimes(airportCode, pending=None, deadlineAt=None):
+    """
+    Returns data from the TSA Wait Times API for a particular airport shortcode, waiting at most the TSA deadline.
+    Raises UpstreamUnavailable when TSA can't be loaded, see AwaitUpstream.
+    :param airportCode: 3-letter shortcode of airport
+    :param pending: Optional pending FetchAsync result of the airport's wait times to wait for instead
+    :param deadlineAt: Optional time to stop waiting, see UpstreamDeadline
+    :return: Returns the TSAWaitTimesFeed from TSA Wait Times API
+    """
+    if pending is None:
+        pending = FetchAsync("tsa", FetchTSAWaitTimes, airportCode)
+    return AwaitUpstream("tsa", pending, deadlineAt)
+
+
+# Traffic models Google accepts along with a departure time, best_guess is Google's default
+TRAFFIC_MODELS = ["best_guess", "pessimistic", "optimistic"]
+# Unit systems Google reports distances in
+UNITS = ["imperial", "metric"]
+# Response statuses Google answers with when it can't serve any request for now
+GOOGLE_UNAVAILABLE_STATUSES = ["OVER_QUERY_LIMIT", "UNKNOWN_ERROR"]
+
+def FetchDistanceMatrix(origins, destinations, key, units="imperial", departure_time=None, traffic_model=None):
+    """
+    Returns a Google Distance Matrix, assembled from the travel time matrix cache where possible and requesting only
+    the origins and destinations with missing cells. Cells are cached by origin location (see OriginCell), destination,
+    units, traffic model and DISTANCE_DEPARTURE_BUCKET, so nearby origins and trips departing in the same time slot
+    share one lookup. Only OK elements are cached, and a response that isn't OK is returned as it is.
+    Raises on failure, and with PayloadError if Google's response is malformed or doesn't have one row per origin and
+    one element per destination requested, so no trip is ever given another origin's travel time.
+    :param origins: List of places where trips to the airport start
+    :param destinations: List of destinations, usually 3-letter airport shortcodes
+    :param key: Google API key
+    :param units: Measurement return from Google API, can also be metric
+    :param departure_time: Optional departure, seconds since 1970 UTC, for travel times in the traffic expected then
+    :param traffic_model: Optional traffic model from TRAFFIC_MODELS, only used with a departure_time
+    :return: Returns a DistanceMatrix, with one row per origin and one element per destination
+    """
+    departureBucket = int((time.time() if departure_time is None else departure_time) // DISTANCE_DEPARTURE_BUCKET)
+    trafficKey = (traffic_model or "best_guess") if departure_time is not None else None
+    cellKeys = [[(OriginCell(origin), destination, units, departureBucket, trafficKey) for destination in destinations]
+                for origin in origins]
+    # each cell is (origin address, destination address, DistanceElement)
+    cells = [[distance_cache.lookup(cellKey) for cellKey in rowKeys] for rowKeys in cellKeys]
+
+    missingRows = [row for row in range(len(origins)) if None in cells[row]]
+    if missingRows:
+        missingCols = [col for col in range(len(destinations)) if any(cells[row][col] is None for row in missingRows)]
+        matrix = RequestDistanceMatrix([origins[row] for row in missingRows], [destinations[col] for col in missingCols],
+                                       key, units, departure_time, traffic_model)
+        if matrix.status != "OK":
+            return matrix
+        if len(matrix.originAddresses) != len(missingRows) or len(matrix.destinationAddresses) != len(missingCols):
+            raise PayloadError("Distance Matrix response has {} origins and {} destinations for {} and {} requested".format(
+                len(matrix.originAddresses), len(matrix.destinationAddresses), len(missingRows), len(missingCols)))
+        for requestRow, row in enumerate(missingRows):
+            # the address Google resolved the origin to becomes its location id, so other spellings of it hit these cells
+            origin_aliases.learn(origins[row], matrix.originAddresses[requestRow])
+            originCell = OriginCell(origins[row])
+            for requestCol, col in enumerate(missingCols):
+                if cells[row][col] is None:
+                    cell = (matrix.originAddresses[requestRow], matrix.destinationAddresses[requestCol],
+                            matrix.element(requestRow, requestCol))
+                    if cell[2].status == "OK":
+                        distance_cache.put((originCell,) + cellKeys[row][col][1:], cell)
+                        last_travel_times.put((originCell, destinations[col], units), cell)
+                    cells[row][col] = cell
+
+    return DistanceMatrix("OK", [rowCells[0][0] for rowCells in cells], [colCell[1] for colCell in cells[0]],
+                          [[rowCell[2] for rowCell in rowCells] for rowCells in cells])
+
+def IsValidPlace(place):
+    """
+    :param place: Origin or destination of a Distance Matrix request
+    :return: Returns True if the place isn't empty and has no |, which separates places in a request
+    """
+    return bool(place and place.strip()) and "|" not in place
+
+def RequestDistanceMatrix(origins, destinations, key, units="imperial", departure_time=None, traffic_model=None):
+    """
+    Requests one Google Distance Matrix covering every origin to every destination. Raises on failure, and with
+    ValueError for an empty place or one containing |, which Google would read as more than one place.
+    Google allows up to 25 origins, 25 destinations and 100 elements per request.
+    :param origins: List of places where trips to the airport start
+    :param destinations: List of destinations, usually 3-letter airport shortcodes
+    :param key: Google API key
+    :param units: Measurement return from Google API, can also be metric
+    :param departure_time: Optional departure, seconds since 1970 UTC, see FetchDistanceMatrix
+    :param traffic_model: Optional traffic model from TRAFFIC_MODELS, only used with a departure_time
+    :return: Returns a DistanceMatrix, with one row per origin and one element per destination, see ParseDistanceMatrix
+    """
+    for place in origins + destinations:
+        if not IsValidPlace(place):
+            raise ValueError("Not a single place: {!r}".format(place))
+    params_google_d = {}
+    params_google_d['units'] = units
+    params_google_d['origins'] = "|".join(origins)
+    params_google_d['destinations'] = "|".join(destinations)
+    params_google_d['key'] = key
+    if departure_time is not None:
+        # Google rejects departures in the past, so the rest of the current bucket is asked for as now
+        bucketStart = int(departure_time // DISTANCE_DEPARTURE_BUCKET * DISTANCE_DEPARTURE_BUCKET)
+        params_google_d['departure_time'] = bucketStart if bucketStart > time.time() else "now"
+        if traffic_model:
+            params_google_d['traffic_model'] = traffic_model
+    return ParseDistanceMatrix(UpstreamGetJSON("google", GOOGLE_BASE_URL, params_google_d))
+
+def FetchGeocode(address, key):
+    """
+    Returns where Google places an address, from the origin alias table when it was geocoded before, otherwise
+    requesting it and recording the resolved address and coordinates there, see OriginAliases.
+    :param address: Address, e.g. where a trip to the airport starts
+    :param key: Google API key
+    :return: Returns a Geocode
+    """
+    coordinates = origin_aliases.locateCoordinates(address)
+    if coordinates is not None:
+        return Geocode("OK", origin_aliases.locate(address), coordinates[0], coordinates[1])
+    geocode = RequestGeocode(address, key)
+    if geocode.status == "OK":
+        origin_aliases.learn(address, geocode.address, (geocode.latitude, geocode.longitude))
+    return geocode
+
+def RequestGeocode(address, key):
+    """
+    Requests an address's best match from the Google Geocoding API. Raises on failure, and with ValueError for an
+    empty address or one containing |.
+    :param address: Address, e.g. where a trip to the airport starts
+    :param key: Google API key
+    :return: Returns a Geocode, see ParseGeocode
+    """
+    if not IsValidPlace(address):
+        raise ValueError("Not a single place: {!r}".format(address))
+    params_geocode_d = {}
+    params_geocode_d['address'] = address
+    params_geocode_d['key'] = key
+    return ParseGeocode(UpstreamGetJSON("google", GOOGLE_GEOCODE_URL, params_geocode_d))
+
+@Instrumented
+def GetDistance(origin, airportCode, key, units="imperial", pending=None, departure_time=None, traffic_model=None,
+                deadlineAt=None):
+    """
+    Gets and returns the travel time from the Google Distance Matrix API, waiting at most the Google deadline.
+    Raises UpstreamUnavailable when Google can't be loaded, see AwaitUpstream.
+    :param origin: Where the trip to the airport starts
+    :param airportCode: 3-letter shortcode of airport
+    :param key: Google API key
+    :param units: Measurement return from Google API, can also be metric
+    :param pending: Optional pending result of FetchAsync("google", FetchDistanceMatrix, ...) to wait for instead
+    :param departure_time: Optional departure, seconds since 1970 UTC, see FetchDistanceMatrix
+    :param traffic_model: Optional traffic model from TRAFFIC_MODELS, only used with a departure_time
+    :param deadlineAt: Optional time to stop waiting, see UpstreamDeadline
+    :return: Returns a single origin, single destination DistanceMatrix
+    """
+    if pending is None:
+        pending = FetchAsync("google", FetchDistanceMatrix, [origin], [airportCode], key, units, departure_time, traffic_model)
+    return AwaitUpstream("google", pending, deadlineAt)
+
+def LastKnownTravelTime(origin, airportCode, units="imperial"):
+    """
+    Returns the travel time Google last gave from the origin's location to the airport, for any departure time.
+    :param origin: Where the trip to the airport starts
+    :param airportCode: 3-letter shortcode of airport
+    :param units: Measurement return from Google API, can also be metric
+    :return: Returns a tuple of a single origin, single destination DistanceMatrix and when Google returned it,
+    seconds since 1970, or None if there's none from the last LAST_KNOWN_TRAVEL_AGE seconds
+    """
+    lastKnown = last_travel_times.lastKnown((OriginCell(origin), airportCode, units), LAST_KNOWN_TRAVEL_AGE)
+    if lastKnown is None:
+        return None
+    (originAddress, destinationAddress, element), storedAt = lastKnown
+    return (DistanceMatrix("OK", [originAddress], [destinationAddress], [[element]]), storedAt)
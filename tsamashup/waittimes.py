@@ -0,0 +1,242 @@
+## IMPORT STATEMENTS
+
+# Math used for rounding up
+import math
+# Calendar used for comparing TSA wait time report times
+import calendar
+# Numpy, used for computing wait time statistics over whole feeds at once, is imported by the functions that use it,
+# so importing a module that only needs trips doesn't pay for loading numpy
+
+from tsamashup.upstream import GetTSAWaitTimes
+
+
+## TSAWAITTIMES CLASS
+
+def LocalEpoch(created):
+    """
+    :param created: Datetime in the airport's local time
+    :return: Returns seconds since 1970 on the airport's local clock, for comparing report times
+    """
+    return calendar.timegm(created.timetuple())
+
+class WaitTimeSnapshot(object):
+    """
+    Read-only view of one TSA Wait Times API response, built in a single pass over the feed's records.
+    Records are sorted newest first and grouped by checkpoint number.
+    The same records are also kept as numpy arrays (checkpoint number, wait time increment, local epoch) for the statistics.
+    """
+    __slots__ = ["airportCode", "records", "byCheckpoint", "checkpointArray", "waitArray", "epochArray"]
+
+    def __init__(self, airportCode, feed):
+        import numpy
+        records = sorted(feed.records, key=lambda record: record.created, reverse=True)
+
+        # grouping the sorted records keeps each checkpoint's records newest first
+        byCheckpoint = {}
+        for record in records:
+            byCheckpoint.setdefault(record.checkpoint, []).append(record)
+
+        self.airportCode = airportCode
+        self.records = tuple(records)
+        self.byCheckpoint = dict((chk, tuple(chkRecords)) for chk, chkRecords in byCheckpoint.items())
+        self.checkpointArray = numpy.array([record.checkpoint for record in records], dtype=numpy.int32)
+        self.waitArray = numpy.array([record.waitTime for record in records], dtype=numpy.int32)
+        self.epochArray = numpy.array([LocalEpoch(record.created) for record in records], dtype=numpy.int64)
+        for array in (self.checkpointArray, self.waitArray, self.epochArray):
+            array.setflags(write=False)
+
+    def checkpointRecords(self, chk):
+        """
+        :param chk: The Security Checkpoint ID
+        :return: Returns the checkpoint's records, newest first
+        """
+        return self.byCheckpoint.get(chk, ())
+
+    def checkpointWaits(self, chk=None):
+        """
+        :param chk: The Security Checkpoint ID, or None for every checkpoint
+        :return: Returns the wait time increments as a numpy array, newest first
+        """
+        if chk is None:
+            return self.waitArray
+        return self.waitArray[self.checkpointArray == chk]
+
+class TSAWaitTimes:
+    """
+    Combines TSA metadata on checkpoints and TSA wait times.
+    The shared metadata in TSAairportDict is only read, so one loaded TSAairportDict can serve many threads.
+    """
+    def __init__(self, airportCode, TSAairportDict, feed=None):
+        if feed is None:
+            feed = GetTSAWaitTimes(airportCode)
+        self.airportCode = airportCode
+        self.AllWaitTimes = feed
+        self.TSAairportDict = TSAairportDict
+        self.snapshot = WaitTimeSnapshot(airportCode, feed)
+        # pair each checkpoint with its bucket of wait times, newest first
+        self.CheckpointWaitTimes = []
+        for checkpoint in TSAairportDict[airportCode].checkpoints:
+            checkpointDict = {}
+            checkpointDict["id"] = checkpoint.id
+            checkpointDict["longname"] = checkpoint.longname
+            checkpointDict["shortname"] = checkpoint.shortname
+            checkpointDict["WaitTimes"] = self.snapshot.checkpointRecords(checkpoint.id)
+            self.CheckpointWaitTimes.append(checkpointDict)
+
+    def AllCheckpointWaitTimes(self):
+        """
+        Returns airport security checkpoint wait times as reported by TSA Wait Times REST API
+        :return: Returns all wait times, sorted by checkpoint
+        """
+        return self.CheckpointWaitTimes
+
+    def OneCheckpointWaitTimes(self, chk):
+        """
+        Returns all wait times for one security checkpoint
+        :param chk: The Security Checkpoint ID being passed
+        :return: (index starts at zero, TSA IDs start at 1, hence the -1)
+        """
+        return self.CheckpointWaitTimes[chk-1]
+
+    def AvgAllWaitTime(self, rng=5):
+        """
+        Averages the last X (rng) wait times regardless of checkpoint. It rounds up to be conservative.
+        TSA wait times are in 10-minute increments, so 0 = no wait time, 1 = 1 to 10 minutes wait, etc.
+        :param rng: The number of Wait Time records to take into account, starting from the newest. Defaults to last 5 wait times.
+        :return: Returns average in seconds.
+        """
+        recent = self.snapshot.waitArray[:rng]
+        if not recent.size:
+            return 0
+        return WaitIncrementsToSeconds(recent.mean())
+
+    def WorstWaitTime(self):
+        """
+        Provides the worst time in the entire TSA Wait Time response.
+        Ties are sorted by newest reported time first.
+        :return: Returns a tuple of the datestamp and longest checkpoint wait time.
+        """
+        import numpy
+        if not self.snapshot.waitArray.size:
+            return (None, 0)
+        # records are newest first, so argmax picks the newest of any ties
+        worst = int(numpy.argmax(self.snapshot.waitArray))
+        return (self.snapshot.records[worst].createdText, int(self.snapshot.waitArray[worst]) * 600)
+
+    def AvgOneWaitTime(self, chk, rng=5):
+        """
+        Averages the last rng wait times for chk checkpoint. Rounds up to be conservative.
+        Takes into account there may not be enough wait times for that checkpoint listed, and averages the amount it gets.
+        :param chk: The Security Checkpoint ID being passed
+        :param rng: The number of Wait Time records to take into account, starting from the newest. Defaults to last 5 wait times.
+        :return: Returns average in seconds.
+        """
+        recent = self.snapshot.checkpointWaits(self.CheckpointWaitTimes[chk-1]["id"])[:rng]
+        if not recent.size:
+            # print "Not enough wait times reported by TSA for that checkpoint"
+            return 0
+        return WaitIncrementsToSeconds(recent.mean())
+
+    def slowestWaitTimeNow(self, rng=5):
+        """
+        Checks the newest wait time for each checkpoint and provides the slowest one.
+        :param rng: The number of Wait Time records to take into account, starting from the newest. Defaults to last 5 wait times.
+        :return: Returns slowest current wait time in seconds.
+        """
+        import numpy
+        ids = numpy.array([checkpoint["id"] for checkpoint in self.CheckpointWaitTimes], dtype=numpy.int32)
+        # records are newest first, so each checkpoint's first occurrence is its newest wait time
+        reported, newest = numpy.unique(self.snapshot.checkpointArray, return_index=True)
+        if not ids.size or not numpy.in1d(ids, reported).all():
+            # print "one or more checkpoints did not have any wait times reported"
+            return 0
+        return int(self.snapshot.waitArray[newest[numpy.in1d(reported, ids)]].max()) * 600
+
+    def WaitTimePercentile(self, pct, chk=None):
+        """
+        Percentile of the reported wait times. Rounds up to be conservative.
+        :param pct: Percentile between 0 and 100, e.g. 90
+        :param chk: The Security Checkpoint ID, or None for every checkpoint
+        :return: Returns the percentile in seconds.
+        """
+        import numpy
+        waits = self.snapshot.checkpointWaits(chk)
+        if not waits.size:
+            return 0
+        return WaitIncrementsToSeconds(numpy.percentile(waits, pct))
+
+    def WindowedAvgWaitTime(self, window=3600, chk=None, now=None):
+        """
+        Averages the wait times reported in the window seconds up to now. Rounds up to be conservative.
+        :param window: Length of the window in seconds. Defaults to one hour.
+        :param chk: The Security Checkpoint ID, or None for every checkpoint
+        :param now: End of the window as a datetime in the airport's local time. Defaults to the newest report.
+        :return: Returns average in seconds.
+        """
+        epochs = self.snapshot.epochArray
+        if not epochs.size:
+            return 0
+        end = epochs[0] if now is None else LocalEpoch(now)
+        mask = (epochs > end - window) & (epochs <= end)
+        if chk is not None:
+            mask &= self.snapshot.checkpointArray == chk
+        if not mask.any():
+            return 0
+        return WaitIncrementsToSeconds(self.snapshot.waitArray[mask].mean())
+
+    def MaxWaitTimeByCheckpoint(self):
+        """
+        Provides the worst reported wait time at each checkpoint.
+        :return: Returns a dictionary of Security Checkpoint ID to wait time in seconds, for checkpoints with reports.
+        """
+        import numpy
+        reported, inverse = numpy.unique(self.snapshot.checkpointArray, return_inverse=True)
+        worst = numpy.zeros(reported.size, dtype=numpy.int32)
+        numpy.maximum.at(worst, inverse, self.snapshot.waitArray)
+        return dict(zip(reported.tolist(), (worst * 600).tolist()))
+
+def WaitIncrementsToSeconds(increments):
+    """
+    Rounds a number of TSA 10-minute wait time increments up and converts it to seconds.
+    :param increments: Wait time in 10-minute increments, may be fractional
+    :return: Returns wait time in seconds
+    """
+    # Multiply TSA values by 10 minute increments, in seconds (10*60=600)
+    return int(math.ceil(increments) * 600)
+
+def WaitTimeStatsByAirport(snapshots, pct=90):
+    """
+    Computes wait time statistics for many airports at once, over the concatenated arrays of their snapshots.
+    :param snapshots: List of WaitTimeSnapshot instances, e.g. TSAWaitTimes(...).snapshot for each airport
+    :param pct: Percentile to report, between 0 and 100
+    :return: Returns a dictionary of airport shortcode to a dictionary of count, and average, worst and percentile wait time in seconds
+    """
+    import numpy
+    lengths = numpy.array([snapshot.waitArray.size for snapshot in snapshots], dtype=numpy.int64)
+    airports = numpy.repeat(numpy.arange(len(snapshots)), lengths)
+    waits = numpy.concatenate([snapshot.waitArray for snapshot in snapshots] or [numpy.zeros(0, dtype=numpy.int32)])
+
+    counts = numpy.bincount(airports, minlength=len(snapshots))
+    sums = numpy.bincount(airports, weights=waits, minlength=len(snapshots))
+    worst = numpy.zeros(len(snapshots), dtype=numpy.int32)
+    numpy.maximum.at(worst, airports, waits)
+
+    # sort each airport's waits, then interpolate between the two nearest ranks like numpy.percentile does
+    ordered = waits[numpy.lexsort((waits, airports))]
+    starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1])) if len(snapshots) else counts
+    rank = (numpy.maximum(counts, 1) - 1) * (pct / 100.0)
+    low = numpy.floor(rank).astype(numpy.int64)
+    high = numpy.ceil(rank).astype(numpy.int64)
+    padded = numpy.append(ordered, 0)
+    lowValue = padded[numpy.where(counts > 0, starts + low, ordered.size)]
+    highValue = padded[numpy.where(counts > 0, starts + high, ordered.size)]
+    percentiles = lowValue + (highValue - lowValue) * (rank - low)
+
+    means = sums / numpy.maximum(counts, 1)
+    stats = {}
+    for num, snapshot in enumerate(snapshots):
+        stats[snapshot.airportCode] = {"count": int(counts[num]),
+                                       "avg": WaitIncrementsToSeconds(means[num]),
+                                       "worst": int(worst[num]) * 600,
+                                       "percentile": WaitIncrementsToSeconds(percentiles[num])}
+    return stats